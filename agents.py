@@ -0,0 +1,230 @@
+"""
+AI agent / chatbot widget detection.
+
+SIGNATURES lists literal strings that give a vendor away: the host or path
+of its embed script or iframe ("src"), the global it configures ("global")
+and the elements it renders ("marker"). They are compiled once into a
+single automaton that finds every occurrence of every signature in one scan
+of the HTML, in time that depends on the document, not the number of
+signatures: a trie of all patterns, emitted as one regular expression so
+the walk runs in the re engine. The search restarts one character after
+each hit, and each hit also reports the patterns that are prefixes of it,
+so overlapping and nested signatures are all found (Aho-Corasick output
+semantics). Hits are rare, so the Python side of the loop costs nothing.
+
+Signatures only match at a token boundary (after a character other than
+[A-Za-z0-9_]): the re engine then skips runs of word characters without
+trying the trie, which halves the scan, and "xdrift.load" is not Drift.
+
+A vendor's confidence combines its distinct hits: 1 - prod(1 - weight).
+More signatures can be loaded from a JSON file of
+[vendor, category, kind, pattern] rows named by AGENT_SIGNATURES.
+"""
+import json, os, re
+from typing import NamedTuple
+
+AGENT_SIGNATURES = os.getenv("AGENT_SIGNATURES")     # extra signatures (JSON), merged with the built-ins
+
+class Signature(NamedTuple):
+    vendor: str
+    category: str       # ai_assistant | live_chat
+    kind: str           # src | global | marker, see KIND_WEIGHT
+    pattern: str        # literal, case-sensitive
+
+# how much a single hit of each kind says on its own
+KIND_WEIGHT = {"src": 0.9, "global": 0.7, "marker": 0.5}
+
+_AI, _CHAT = "ai_assistant", "live_chat"
+
+SIGNATURES: tuple[Signature, ...] = (
+    # AI assistants and bot builders
+    Signature("Chatbase", _AI, "src", "chatbase.co/embed.min.js"),
+    Signature("Chatbase", _AI, "src", "chatbase.co/chatbot-iframe/"),
+    Signature("Chatbase", _AI, "global", "chatbaseConfig"),
+    Signature("Voiceflow", _AI, "src", "cdn.voiceflow.com/widget"),
+    Signature("Voiceflow", _AI, "global", "voiceflow.chat.load"),
+    Signature("Botpress", _AI, "src", "cdn.botpress.cloud/webchat"),
+    Signature("Botpress", _AI, "global", "botpressWebChat"),
+    Signature("Ada", _AI, "src", "static.ada.support/embed"),
+    Signature("Ada", _AI, "global", "adaEmbed"),
+    Signature("Ada", _AI, "global", "adaSettings"),
+    Signature("Landbot", _AI, "src", "static.landbot.io"),
+    Signature("Landbot", _AI, "global", "Landbot.Livechat"),
+    Signature("Landbot", _AI, "global", "Landbot.Popup"),
+    Signature("Kommunicate", _AI, "src", "widget.kommunicate.io"),
+    Signature("Kommunicate", _AI, "global", "kommunicateSettings"),
+    Signature("Dialogflow Messenger", _AI, "src", "gstatic.com/dialogflow-console/fast/messenger"),
+    Signature("Dialogflow Messenger", _AI, "marker", "<df-messenger"),
+    Signature("Microsoft Bot Framework", _AI, "src", "cdn.botframework.com/botframework-webchat"),
+    Signature("Microsoft Bot Framework", _AI, "global", "WebChat.renderWebChat"),
+    Signature("IBM watsonx Assistant", _AI, "src", "web-chat.global.assistant.watson.appdomain.cloud"),
+    Signature("IBM watsonx Assistant", _AI, "global", "watsonAssistantChatOptions"),
+    Signature("Amazon Lex", _AI, "src", "lex-web-ui-loader"),
+    Signature("Amazon Lex", _AI, "global", "ChatBotUiLoader"),
+    Signature("Kapa.ai", _AI, "src", "widget.kapa.ai"),
+    Signature("Inkeep", _AI, "src", "@inkeep/"),
+    Signature("Inkeep", _AI, "global", "Inkeep.ChatButton"),
+    Signature("Inkeep", _AI, "global", "Inkeep.EmbeddedChat"),
+    Signature("DocsBot", _AI, "src", "widget.docsbot.ai"),
+    Signature("DocsBot", _AI, "global", "DocsBotAI.init"),
+    Signature("CustomGPT", _AI, "src", "cdn.customgpt.ai"),
+    Signature("SiteGPT", _AI, "src", "sitegpt.ai/widget"),
+    Signature("Chatling", _AI, "src", "chatling.ai/js/embed.js"),
+    Signature("Chatling", _AI, "global", "chtlConfig"),
+    Signature("Dante AI", _AI, "src", "dante-ai.com/"),
+    Signature("Forethought", _AI, "src", "solve-widget.forethought.ai"),
+    Signature("Yellow.ai", _AI, "src", "cdn.yellowmessenger.com"),
+    Signature("Yellow.ai", _AI, "global", "ymConfig"),
+    Signature("Haptik", _AI, "src", "toolassets.haptikapi.com"),
+    Signature("Haptik", _AI, "global", "haptikInitSettings"),
+    # live chat and support widgets (most ship an AI agent tier)
+    Signature("Intercom", _CHAT, "src", "widget.intercom.io"),
+    Signature("Intercom", _CHAT, "src", "js.intercomcdn.com"),
+    Signature("Intercom", _CHAT, "global", "intercomSettings"),
+    Signature("Intercom", _CHAT, "marker", "intercom-frame"),
+    Signature("Drift", _CHAT, "src", "js.driftt.com"),
+    Signature("Drift", _CHAT, "global", "drift.load"),
+    Signature("Drift", _CHAT, "marker", "drift-frame-controller"),
+    Signature("Zendesk", _CHAT, "src", "static.zdassets.com/ekr/snippet.js"),
+    Signature("Zendesk", _CHAT, "global", "zESettings"),
+    Signature("Zendesk", _CHAT, "marker", 'id="ze-snippet"'),
+    Signature("LiveChat", _CHAT, "src", "cdn.livechatinc.com"),
+    Signature("LiveChat", _CHAT, "global", "__lc.license"),
+    Signature("Tidio", _CHAT, "src", "code.tidio.co"),
+    Signature("Tidio", _CHAT, "global", "tidioChatApi"),
+    Signature("Crisp", _CHAT, "src", "client.crisp.chat"),
+    Signature("Crisp", _CHAT, "global", "CRISP_WEBSITE_ID"),
+    Signature("Crisp", _CHAT, "global", "$crisp"),
+    Signature("HubSpot Chat", _CHAT, "src", "js.usemessages.com"),
+    Signature("HubSpot Chat", _CHAT, "global", "HubSpotConversations"),
+    Signature("HubSpot Chat", _CHAT, "marker", "hubspot-messages-iframe-container"),
+    Signature("Freshchat", _CHAT, "src", "wchat.freshchat.com"),
+    Signature("Freshchat", _CHAT, "global", "fcWidget"),
+    Signature("Tawk.to", _CHAT, "src", "embed.tawk.to"),
+    Signature("Tawk.to", _CHAT, "global", "Tawk_API"),
+    Signature("Olark", _CHAT, "src", "static.olark.com"),
+    Signature("Olark", _CHAT, "global", "olark.identify"),
+    Signature("Gorgias", _CHAT, "src", "config.gorgias.chat"),
+    Signature("Gorgias", _CHAT, "marker", "gorgias-chat-container"),
+    Signature("Qualified", _CHAT, "src", "js.qualified.com"),
+    Signature("Help Scout Beacon", _CHAT, "src", "beacon-v2.helpscout.net"),
+    Signature("Help Scout Beacon", _CHAT, "global", "Beacon('init'"),
+    Signature("Salesforce Messaging", _CHAT, "global", "embeddedservice_bootstrap"),
+    Signature("Salesforce Messaging", _CHAT, "global", "embedded_svc.init"),
+    Signature("LivePerson", _CHAT, "src", "lptag.liveperson.net"),
+    Signature("LivePerson", _CHAT, "global", "lpTag.site"),
+    Signature("Genesys", _CHAT, "src", "apps.mypurecloud.com/genesys-bootstrap"),
+    Signature("Podium", _CHAT, "src", "connect.podium.com/widget.js"),
+    Signature("Userlike", _CHAT, "src", "userlike-cdn-widgets"),
+    Signature("Smartsupp", _CHAT, "src", "smartsuppchat.com"),
+    Signature("Smartsupp", _CHAT, "global", "_smartsupp"),
+    Signature("Chatra", _CHAT, "src", "call.chatra.io"),
+    Signature("Chatra", _CHAT, "global", "ChatraID"),
+    Signature("JivoChat", _CHAT, "src", "code.jivosite.com"),
+    Signature("JivoChat", _CHAT, "global", "jivo_api"),
+    Signature("Re:amaze", _CHAT, "src", "cdn.reamaze.com"),
+    Signature("Sprinklr", _CHAT, "src", "prod-live-chat.sprinklr.com"),
+    Signature("Sprinklr", _CHAT, "global", "sprChatSettings"),
+    Signature("ManyChat", _CHAT, "src", "widget.manychat.com"),
+    Signature("Kustomer", _CHAT, "src", "cdn.kustomerapp.com/chat-web"),
+    Signature("Kustomer", _CHAT, "global", "Kustomer.start"),
+    Signature("Front Chat", _CHAT, "src", "chat-assets.frontapp.com"),
+    Signature("Front Chat", _CHAT, "global", "FrontChat("),
+    Signature("Gladly", _CHAT, "src", "cdn.gladly.com/chat-sdk"),
+    Signature("Trengo", _CHAT, "src", "static.widget.trengo.eu"),
+    Signature("Chaport", _CHAT, "src", "app.chaport.com/javascript/insite"),
+    Signature("Chaport", _CHAT, "global", "chaportConfig"),
+    Signature("Pipedrive LeadBooster", _CHAT, "src", "leadbooster-chat.pipedrive.com"),
+)
+
+_BOUNDARY = r"[^A-Za-z0-9_]"      # consumed with the match, see module docstring
+
+def _trie_pattern(node: dict) -> str:
+    """Regex for a trie node; `None` keys mark the end of a pattern. Longest match wins."""
+    alts = [re.escape(ch) + _trie_pattern(child) for ch, child in node.items() if ch is not None]
+    if not alts:
+        return ""
+    if None in node:
+        return "(?:" + "|".join(alts) + ")?"
+    return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+class AgentMatcher:
+    """The compiled automaton. Stateless; use scanner() per document."""
+
+    def __init__(self, signatures: tuple[Signature, ...] | list[Signature]) -> None:
+        self.signatures = tuple(signatures)
+        trie: dict = {}
+        for sig in self.signatures:
+            if sig.kind not in KIND_WEIGHT or not sig.pattern:
+                raise ValueError(f"Bad agent signature: {sig!r}")
+            node = trie
+            for ch in sig.pattern:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, []).append(sig)
+        # pattern -> its signatures plus those of every pattern that is a prefix of it
+        self.outputs: dict[str, tuple[Signature, ...]] = {}
+        for pattern in {sig.pattern for sig in self.signatures}:
+            node, hits = trie, []
+            for ch in pattern:
+                node = node[ch]
+                hits += node.get(None, ())
+            self.outputs[pattern] = tuple(hits)
+        self.longest = max((len(p) for p in self.outputs), default=0)
+        self.regex = re.compile(_BOUNDARY + _trie_pattern(trie)) if trie else None
+
+    def scanner(self) -> "AgentScanner":
+        return AgentScanner(self)
+
+    def detect(self, html: str) -> list[dict]:
+        scan = self.scanner()
+        scan.feed(html)
+        return scan.result()
+
+class AgentScanner:
+    """Feed text in chunks; matches that span a chunk boundary are still found."""
+
+    def __init__(self, matcher: AgentMatcher) -> None:
+        self.matcher = matcher
+        self.hits: set[Signature] = set()
+        self._tail = "\n"          # the start of the document is a boundary
+
+    def feed(self, text: str) -> None:
+        regex = self.matcher.regex
+        if regex is None or not text:
+            return
+        # re-scan the end of the previous chunk with this one, so matches that
+        # span the boundary are found; repeat hits fall into the set
+        text = self._tail + text
+        search, outputs, pos = regex.search, self.matcher.outputs, 0
+        while (m := search(text, pos)) is not None:
+            self.hits.update(outputs[m.group()[1:]])
+            pos = m.start() + 1
+        self._tail = text[-self.matcher.longest:]
+
+    def result(self) -> list[dict]:
+        """Detected vendors, most certain first."""
+        vendors: dict[str, dict] = {}
+        for sig in sorted(self.hits):
+            agent = vendors.setdefault(sig.vendor, {"vendor": sig.vendor, "category": sig.category,
+                                                    "confidence": 0.0, "evidence": []})
+            agent["confidence"] = 1 - (1 - agent["confidence"]) * (1 - KIND_WEIGHT[sig.kind])
+            agent["evidence"].append(f"{sig.kind}:{sig.pattern}")
+        for agent in vendors.values():
+            agent["confidence"] = round(agent["confidence"], 3)
+        return sorted(vendors.values(), key=lambda a: (-a["confidence"], a["vendor"]))
+
+_matcher: AgentMatcher | None = None
+
+def matcher() -> AgentMatcher:
+    """The built-in signatures plus AGENT_SIGNATURES, compiled on first use."""
+    global _matcher
+    if _matcher is None:
+        signatures = list(SIGNATURES)
+        if AGENT_SIGNATURES:
+            with open(AGENT_SIGNATURES, encoding="utf-8") as f:
+                signatures += [Signature(*row) for row in json.load(f)]
+        _matcher = AgentMatcher(signatures)
+    return _matcher
+
+def detect_agents(html: str) -> list[dict]:
+    return matcher().detect(html)
@@ -0,0 +1,48 @@
+"""
+The analyzer behind /api/analyze_html and bulk.py: extract the signals of
+an HTML document and score them.
+
+Kept apart from server.py so that offline tools and worker processes can
+import it without building the app, its caches or its stores.
+"""
+from urllib.parse import urljoin
+
+from html_signals import extract_signals
+from scoring import score
+
+def score_html(html: str, base_url: str | None = None) -> dict:
+    """The /api/analyze payload of a document that was not fetched (status 200)."""
+    sig = extract_signals(html)
+    title = sig["title"]
+    desc  = sig["meta_description"]
+    h1s   = sig["h1"]
+    canonical = sig["canonical"]
+    if canonical and base_url:
+        canonical = urljoin(base_url, canonical)
+    payload = {
+        "ok": True,
+        "status": 200,                       # HTML came from user, not fetched
+        "final_url": base_url or None,
+        "title": title,
+        "title_length": len(title),
+        "meta_description": desc,
+        "meta_description_length": len(desc),
+        "h1": h1s,
+        "multiple_h1": len(h1s) > 1,
+        "canonical": canonical,
+        "robots": sig["robots"] or None,
+        "noindex": sig["noindex"],
+        "nofollow": sig["nofollow"],
+        "viewport": sig["viewport"],
+        "og_count": sig["og_count"],
+        "twitter_count": sig["twitter_count"],
+        "jsonld_count": sig["jsonld_count"],
+        "jsonld_types": sig["jsonld_types"],
+        "text_words": sig["text_words"],
+        "ai_agents": sig["ai_agents"],
+        "score": 0,
+        "recommendations": [],
+        "partial": False,
+    }
+    payload["score"], payload["recommendations"] = score(payload)
+    return payload
@@ -0,0 +1,11 @@
+"""
+Benchmarks for the analyze pipeline (run from the repository root):
+
+    python -m bench.micro              extraction, scoring, JSON microbenchmarks
+    python -m bench.load               end-to-end /api/analyze load against a local stub
+    python -m bench.startup            cold start: import + first request, with a budget
+    python -m bench.stub               the upstream stub on its own
+    python -m bench.report A.json B.json   compare two runs, exit 1 on regressions
+
+Results land in bench/results/ as JSON.
+"""
@@ -0,0 +1,86 @@
+"""
+Deterministic synthetic HTML corpus for the benchmarks.
+
+Documents are built from a seeded RNG, so the same (name, seed) is byte for
+byte identical across machines and runs. Sizes go from a few KB to just
+under the 2.5MB fetch limit; the mixes stress what the extractor and scorer
+care about: many JSON-LD blocks (some invalid), many <h1>s, and malformed
+markup (unclosed and stray tags, broken attributes, bare ampersands).
+"""
+import json, random
+
+MAX_FETCH_BYTES = 2_500_000
+
+# name -> (target bytes, jsonld blocks, h1s, malformed fragments per KB)
+PROFILES: dict[str, tuple[int, int, int, float]] = {
+    "small":       (4_000, 1, 1, 0.0),
+    "medium":      (100_000, 3, 1, 0.2),
+    "jsonld-heavy": (400_000, 400, 1, 0.0),
+    "h1-heavy":    (400_000, 1, 2_000, 0.0),
+    "malformed":   (400_000, 5, 3, 4.0),
+    "large":       (1_000_000, 10, 2, 0.5),
+    "max":         (MAX_FETCH_BYTES - 4_096, 20, 2, 0.5),
+}
+
+_WORDS = ("seo", "calculator", "analysis", "page", "speed", "content", "schema", "index",
+          "ranking", "search", "crawl", "mobile", "title", "meta", "link", "lorem", "ipsum",
+          "dolor", "sit", "amet", "naïve", "café", "über", "日本語")
+
+_MALFORMED = (
+    "<div><p>unclosed paragraph", "</span></div>", "<b><i>crossed</b></i>", "<p class=>x",
+    "<a href=\"/x>broken quote</a>", "Tom & Jerry &copy &#x110000; &bogus;", "<br/></br>",
+    "<img src=x alt='a\"b'>", "<h2>heading<h3>nested</h2></h3>", "<!-- unterminated comment ->",
+    "<table><td>cell</table>", "<li>item<li>item", "<<p>>", "<p =x>",
+)
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n))
+
+def _jsonld(rng: random.Random, i: int) -> str:
+    if i % 7 == 6:      # every seventh block is invalid JSON
+        return '<script type="application/ld+json">{"@type": "Broken", </script>'
+    data = {
+        "@context": "https://schema.org",
+        "@type": rng.choice(("Organization", "WebSite", "Product", "BreadcrumbList", "FAQPage")),
+        "name": _sentence(rng, 3),
+        "description": _sentence(rng, 12),
+        "offers": [{"@type": "Offer", "price": rng.randint(1, 999)} for _ in range(rng.randint(0, 3))],
+    }
+    return f'<script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+
+def document(name: str, seed: int = 0) -> bytes:
+    """One UTF-8 document for profile `name`."""
+    size, jsonld, h1s, malformed = PROFILES[name]
+    rng = random.Random(f"{name}:{seed}")
+    head = [
+        "<!DOCTYPE html><html lang=en><head><meta charset=utf-8>",
+        f"<title>{_sentence(rng, 6)}</title>",
+        f'<meta name="description" content="{_sentence(rng, 18)}">',
+        '<meta name="viewport" content="width=device-width, initial-scale=1">',
+        '<link rel="canonical" href="/canonical">',
+        '<meta property="og:title" content="x"><meta property="og:type" content="website">',
+        '<meta name="twitter:card" content="summary">',
+    ]
+    head += [_jsonld(rng, i) for i in range(jsonld)]
+    head.append("</head><body>")
+    parts = ["".join(head)]
+    length = len(parts[0])
+    h1_every = max(1, (size // 300) // max(h1s, 1))
+    placed_h1 = 0
+    block = 0
+    while length < size - 32:
+        if placed_h1 < h1s and block % h1_every == 0:
+            piece = f"<h1>{_sentence(rng, 4)}</h1>"
+            placed_h1 += 1
+        elif malformed and rng.random() < malformed * 0.3:
+            piece = rng.choice(_MALFORMED)
+        else:
+            piece = f"<div class=c{block % 9}><h2>{_sentence(rng, 3)}</h2><p>{_sentence(rng, 40)}</p></div>\n"
+        parts.append(piece)
+        length += len(piece.encode())
+        block += 1
+    parts.append("</body></html>")
+    return "".join(parts).encode()[:MAX_FETCH_BYTES]
+
+def corpus(seed: int = 0) -> dict[str, bytes]:
+    return {name: document(name, seed) for name in PROFILES}
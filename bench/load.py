@@ -0,0 +1,154 @@
+"""
+End-to-end load harness: runs the API under uvicorn (bench.serve) and the
+upstream stub (bench.stub) locally, drives /api/analyze with a fixed number
+of concurrent clients, and reports throughput and latency percentiles for
+the analyze calls and for /api/health probes sent alongside them (event
+loop responsiveness).
+
+    python -m bench.load --mix small:70,medium:25,max:5 --concurrency 32 \
+        --duration 20 --latency 50 --chunk 16384 --chunk-delay 2 --redirects 1
+
+Every request gets a unique URL unless --hit-ratio says otherwise, so by
+default the result cache never answers.
+"""
+import argparse, asyncio, os, random, socket, subprocess, sys, threading, time
+
+import httpx
+
+from bench.report import percentiles, save
+from bench.stub import Stub
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _start_stub() -> int:
+    """Stub on its own loop in a thread, so its writes do not skew the client timings."""
+    ready: list[int] = []
+    loop = asyncio.new_event_loop()
+
+    def run() -> None:
+        asyncio.set_event_loop(loop)
+        ready.append(loop.run_until_complete(Stub().start()))
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    while not ready:
+        time.sleep(0.01)
+    return ready[0]
+
+def _start_api(port: int, workers: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.serve", "--port", str(port), "--workers", str(workers)],
+        env={**os.environ, **env},
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("API did not come up within 30s")
+
+def _mix(spec: str) -> tuple[list[str], list[float]]:
+    names, weights = [], []
+    for part in spec.split(","):
+        name, _, weight = part.partition(":")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+async def drive(api: str, stub: str, args) -> dict:
+    names, weights = _mix(args.mix)
+    rng = random.Random(args.seed)
+    params = f"latency={args.latency}&chunk={args.chunk}&chunk_delay={args.chunk_delay}&redirects={args.redirects}"
+    latencies: list[float] = []
+    health: list[float] = []
+    statuses: dict[str, int] = {}
+    counter = 0
+    limits = httpx.Limits(max_connections=args.concurrency + 1, max_keepalive_connections=args.concurrency + 1)
+
+    def next_url() -> str:
+        nonlocal counter
+        counter += 1
+        name = rng.choices(names, weights)[0]
+        n = rng.randrange(max(1, counter // 10)) if rng.random() < args.hit_ratio else counter
+        return f"{stub}/doc/{name}?{params}&n={n}"
+
+    async with httpx.AsyncClient(base_url=api, timeout=120, limits=limits) as client:
+        for _ in range(args.warmup):
+            await client.get("/api/analyze", params={"url": next_url()})
+
+        stop = time.perf_counter() + args.duration
+
+        async def worker() -> None:
+            while time.perf_counter() < stop:
+                t = time.perf_counter()
+                try:
+                    r = await client.get("/api/analyze", params={"url": next_url()})
+                    key = str(r.status_code)
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                latencies.append(time.perf_counter() - t)
+                statuses[key] = statuses.get(key, 0) + 1
+
+        async def probe() -> None:
+            while time.perf_counter() < stop:
+                t = time.perf_counter()
+                await client.get("/api/health")
+                health.append(time.perf_counter() - t)
+                await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        await asyncio.gather(probe(), *(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = statuses.get("200", 0)
+    return {
+        "analyze": {**percentiles(latencies), "rps": ok / elapsed, "requests": len(latencies),
+                    "errors": len(latencies) - ok, "statuses": statuses},
+        "health": percentiles(health),
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Load /api/analyze against a local upstream stub.")
+    ap.add_argument("--mix", default="small:70,medium:25,large:5", help="profile:weight,... from bench.corpus")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=15, help="seconds of measured load")
+    ap.add_argument("--warmup", type=int, default=20, help="unmeasured requests first")
+    ap.add_argument("--latency", type=float, default=20, help="stub time to first byte, ms")
+    ap.add_argument("--chunk", type=int, default=16384, help="stub write size, bytes")
+    ap.add_argument("--chunk-delay", type=float, default=0, help="stub pause between chunks, ms")
+    ap.add_argument("--redirects", type=int, default=0, help="302 hops before each document")
+    ap.add_argument("--hit-ratio", type=float, default=0.0, help="share of requests reusing an earlier URL")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    ap.add_argument("--api", help="use a running API at this base URL instead of starting one")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--name", default="default", help="scenario name in the result file")
+    ap.add_argument("--out", help="result file (default bench/results/load-<timestamp>.json)")
+    args = ap.parse_args()
+
+    stub = f"http://127.0.0.1:{_start_stub()}"
+    proc = None
+    api = args.api
+    if not api:
+        port = _free_port()
+        proc = _start_api(port, args.workers, {"RESULT_CACHE": "memory"})
+        api = f"http://127.0.0.1:{port}"
+    try:
+        result = asyncio.run(drive(api, stub, args))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(10)
+    a, h = result["analyze"], result["health"]
+    print(f"{args.name}: {a['rps']:.1f} req/s  p50 {a['p50']:.1f}ms  p95 {a['p95']:.1f}ms  "
+          f"p99 {a['p99']:.1f}ms  errors {a['errors']}  | health p99 {h.get('p99', 0):.1f}ms")
+    results = {args.name: a, f"{args.name}/health": h, f"{args.name}/config": vars(args)}
+    print(f"saved {save('load', results, args.out)}")
+
+if __name__ == "__main__":
+    main()
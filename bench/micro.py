@@ -0,0 +1,117 @@
+"""
+Microbenchmarks: extraction + scoring (analysis.score_html) per corpus
+profile, the scorer alone (single payload and columnar), response JSON
+serialization, and a cached /api/analyze request driven through ASGI
+(identity, gzip, brotli and If-None-Match). Also checks the streaming extractor against the
+BeautifulSoup reference on every corpus document before timing anything.
+
+    python -m bench.micro [--quick] [--filter extract] [--out results.json]
+"""
+import argparse, asyncio, gc, json, os, time
+
+os.environ.setdefault("RESULT_CACHE", "memory")     # time the serving path, not SQLite
+os.environ.setdefault("PARSE_WORKERS", "0")
+
+from bench.corpus import corpus
+from bench.report import percentiles, save
+
+def timeit(fn, *, repeat: int, min_time: float = 0.0) -> list[float]:
+    """Per-call seconds for at least `repeat` calls and `min_time` seconds."""
+    fn()                                    # warm caches and lazy imports
+    samples: list[float] = []
+    gc.collect()
+    start = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - start < min_time:
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return samples
+
+def _metrics(samples: list[float], nbytes: int | None = None, per_call: int = 1) -> dict:
+    out = percentiles(samples)
+    mean = sum(samples) / len(samples)
+    out["ops_s"] = per_call / mean
+    if nbytes:
+        out["mb_s"] = nbytes / mean / 1e6
+    out["runs"] = len(samples)
+    return out
+
+def asgi_get(app, path: str, query: str, headers: dict[str, str]):
+    """Blocking GET against an ASGI app; returns a callable that repeats it."""
+    loop = asyncio.new_event_loop()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+             "query_string": query.encode(), "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] not in (200, 304):
+            raise RuntimeError(f"{path}?{query}: HTTP {message['status']}")
+
+    return lambda: loop.run_until_complete(app(scope, receive, send))
+
+def check_parity(docs: dict[str, bytes]) -> list[str]:
+    from html_signals import extract_signals, extract_signals_soup
+    return [name for name, body in docs.items()
+            if extract_signals(body.decode()) != extract_signals_soup(body.decode())]
+
+def run(quick: bool = False, only: str = "") -> dict:
+    import server, scoring
+    from analysis import score_html
+    from fastapi.responses import JSONResponse
+
+    repeat, min_time = (3, 0.2) if quick else (15, 1.0)
+    docs = corpus()
+    results: dict[str, dict] = {}
+
+    def bench(name: str, fn, **kw) -> None:
+        if only and only not in name:
+            return
+        results[name] = _metrics(timeit(fn, repeat=repeat, min_time=min_time), **kw)
+        r = results[name]
+        print(f"{name:32} p50 {r['p50']:9.3f}ms  p99 {r['p99']:9.3f}ms"
+              + (f"  {r['mb_s']:7.1f} MB/s" if "mb_s" in r else f"  {r['ops_s']:12.0f} ops/s"), flush=True)
+
+    for name, body in docs.items():
+        html = body.decode()
+        bench(f"extract/{name}", lambda html=html: score_html(html, "https://example.com/"),
+              nbytes=len(body))
+
+    payloads = [score_html(b.decode(), "https://example.com/") for b in docs.values()]
+    batch = payloads * 1_000
+    bench("score/single", lambda: [scoring.score(p) for p in batch], per_call=len(batch))
+    columns = scoring.to_columns(payloads * (20_000 if quick else 200_000))
+    rows = len(columns["status"])
+    bench(f"score/columns-{rows}", lambda: scoring.score_columns(columns), per_call=rows)
+
+    payload = max(payloads, key=lambda p: len(json.dumps(p)))
+    bench("json/dumps", lambda: json.dumps(payload, ensure_ascii=False), per_call=1)
+    bench("json/jsonresponse", lambda: JSONResponse(content=payload).body, per_call=1)
+
+    # cache hits: the stored entry is answered without touching upstream
+    url = "https://example.com/cached"
+    asyncio.run(server._store(url, url, {**payload, "final_url": url}, None, None, None))
+    query = f"url={url}"
+    etag = server._encoded(asyncio.run(server._cached(url))).etag
+    for name, headers in (("identity", {}), ("gzip", {"Accept-Encoding": "gzip"}),
+                          ("br", {"Accept-Encoding": "gzip, deflate, br"}),
+                          ("not-modified", {"If-None-Match": etag})):
+        bench(f"serve/hit-{name}", asgi_get(server.app, "/api/analyze", query, headers), per_call=1)
+    return results
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Extraction, scoring and JSON microbenchmarks.")
+    ap.add_argument("--quick", action="store_true", help="fewer repetitions (smoke run)")
+    ap.add_argument("--filter", default="", help="only benchmarks whose name contains this")
+    ap.add_argument("--no-parity", action="store_true", help="skip the BeautifulSoup parity check")
+    ap.add_argument("--out", help="result file (default bench/results/micro-<timestamp>.json)")
+    args = ap.parse_args()
+    if not args.no_parity:
+        bad = check_parity(corpus())
+        if bad:
+            raise SystemExit(f"extractor disagrees with the BeautifulSoup reference on: {', '.join(bad)}")
+        print("parity with BeautifulSoup reference: ok")
+    print(f"saved {save('micro', run(args.quick, args.filter), args.out)}")
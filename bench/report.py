@@ -0,0 +1,85 @@
+"""
+Result files shared by the benchmarks, and comparison between two runs.
+
+Every run is one JSON document: {"kind", "created", "env", "results"} where
+results maps a benchmark name to its metrics. Latency metrics are in
+milliseconds; "rps" and "mb_s" are throughputs (higher is better).
+
+    python -m bench.report old.json new.json [--threshold 0.10]
+
+exits 1 when any metric regressed by more than the threshold.
+"""
+import argparse, json, os, platform, subprocess, sys, time
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+HIGHER_IS_BETTER = {"rps", "mb_s", "ops_s"}
+NOT_COMPARED = {"runs", "requests"}
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """min/p50/p95/p99/max/mean of seconds, reported in ms."""
+    if not samples:
+        return {}
+    xs = sorted(samples)
+    def at(q: float) -> float:
+        # nearest-rank, so p99 of 100 samples is the 99th, not an interpolation
+        return xs[min(len(xs) - 1, max(0, round(q * len(xs)) - 1))]
+    return {
+        "min": xs[0] * 1e3, "p50": at(0.50) * 1e3, "p95": at(0.95) * 1e3,
+        "p99": at(0.99) * 1e3, "max": xs[-1] * 1e3, "mean": sum(xs) / len(xs) * 1e3,
+    }
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+        "commit": commit,
+    }
+
+def save(kind: str, results: dict, path: str | None = None) -> Path:
+    doc = {"kind": kind, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "env": environment(),
+           "results": results}
+    out = Path(path) if path else RESULTS_DIR / f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2))
+    return out
+
+def compare(old: dict, new: dict, threshold: float = 0.10) -> list[str]:
+    """Regressions worse than `threshold` (relative) between two result documents."""
+    regressions = []
+    for name, metrics in new["results"].items():
+        base = old["results"].get(name)
+        if name.endswith("/config") or not isinstance(base, dict) or not isinstance(metrics, dict):
+            continue
+        for metric, value in metrics.items():
+            if metric in NOT_COMPARED:
+                continue
+            was = base.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(was, (int, float)) or not was:
+                continue
+            change = (value - was) / was
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            line = f"{name:32} {metric:6} {was:12.3f} -> {value:12.3f}  {change:+7.1%}"
+            print(line + ("  REGRESSION" if worse > threshold else ""))
+            if worse > threshold:
+                regressions.append(line)
+    return regressions
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    args = ap.parse_args()
+    old, new = (json.loads(Path(p).read_text()) for p in (args.old, args.new))
+    if old["kind"] != new["kind"]:
+        sys.exit(f"cannot compare a {old['kind']} run with a {new['kind']} run")
+    sys.exit(1 if compare(old, new, args.threshold) else 0)
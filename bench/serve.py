@@ -0,0 +1,38 @@
+"""
+Runs server.app under uvicorn for the load harness. The only difference
+from production is that the SSRF guard lets loopback through, so the
+service can fetch from the local stub.
+
+    python -m bench.serve --port 8000
+"""
+import argparse, ipaddress
+
+import uvicorn
+
+import server
+
+_guard = server._resolve_and_block
+
+async def _allow_loopback(host: str) -> tuple[str, ...]:
+    try:
+        if ipaddress.ip_address(host).is_loopback:
+            return (host,)
+    except ValueError:
+        if host == "localhost":
+            return ("127.0.0.1",)
+    return await _guard(host)
+
+server._resolve_and_block = _allow_loopback
+app = server.app
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve the API for benchmarking.")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+    if args.workers > 1:
+        # workers re-import this module by name, which re-applies the patch
+        uvicorn.run("bench.serve:app", port=args.port, workers=args.workers, log_level="warning")
+    else:
+        uvicorn.run(server.app, port=args.port, log_level="warning")
+
@@ -0,0 +1,101 @@
+"""
+Cold-start benchmark: each run is a fresh interpreter that imports server,
+builds the app, runs the lifespan startup and serves one /api/analyze_html
+request. The request is driven straight through ASGI, so no HTTP client is
+imported into the measurement. Each run starts in an empty directory, so
+the stores the lifespan opens are created from scratch.
+
+Runs the default configuration (the environment as given) and the shared
+SQLite result cache (RESULT_CACHE=sqlite). Reports per-phase latency of
+both, and fails when the median import + first request of the default
+exceeds the budget, or when import pulls in a module that is meant to load
+on first use.
+
+    python -m bench.startup [--runs 10] [--budget 2500] [--warm]
+"""
+import argparse, json, os, subprocess, sys, tempfile, time
+
+from bench.report import percentiles, save
+
+LAZY = ("httpx", "httpcore", "bs4", "multiprocessing", "numpy")    # must not load on import
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = {"": {}, "-sqlite-cache": {"RESULT_CACHE": "sqlite"}}    # name suffix -> env
+
+_CHILD = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import server
+t1 = time.perf_counter()
+loaded = [m for m in LAZY if m in sys.modules]
+app = server.create_app()
+t2 = time.perf_counter()
+
+async def first_request():
+    body = json.dumps({"html": "<title>Cold start</title><h1>Hello</h1>"}).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": "POST", "scheme": "http", "path": "/api/analyze_html",
+             "raw_path": b"/api/analyze_html", "query_string": b"", "root_path": "",
+             "headers": [(b"content-type", b"application/json")],
+             "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)}
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    async def send(message):
+        sent.append(message)
+    async with app.router.lifespan_context(app):
+        t3 = time.perf_counter()
+        await app(scope, receive, send)
+        t4 = time.perf_counter()
+    return t3, t4, sent[0]["status"]
+
+t3, t4, status = asyncio.run(first_request())
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "startup": t3 - t2,
+                  "first_request": t4 - t3, "status": status, "loaded": loaded}))
+"""
+
+def run_once(env: dict) -> dict:
+    code = f"LAZY = {LAZY!r}\n{_CHILD}"
+    path = os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH"))))
+    with tempfile.TemporaryDirectory() as cwd:
+        t = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], env={**os.environ, "PYTHONPATH": path, **env},
+                             cwd=cwd, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - t
+    return result
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Import + first-request latency of a fresh process.")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--budget", type=float, default=2500, help="ms allowed for p50 import + first request")
+    ap.add_argument("--warm", action="store_true", help="run with WARMUP=1")
+    ap.add_argument("--name", default="default", help="scenario name in the result file")
+    ap.add_argument("--out", help="result file (default bench/results/startup-<timestamp>.json)")
+    args = ap.parse_args()
+
+    results, colds, loaded = {}, {}, set()
+    for suffix, scenario in SCENARIOS.items():
+        env = {"WARMUP": "1" if args.warm else "0", **scenario}
+        runs = [run_once(env) for _ in range(args.runs)]
+        if any(r["status"] != 200 for r in runs):
+            raise SystemExit(f"first request failed: {[r['status'] for r in runs]}")
+        name = args.name + suffix
+        for phase in ("import", "create_app", "startup", "first_request", "process"):
+            results[f"{name}/{phase}"] = percentiles([r[phase] for r in runs])
+        colds[name] = percentiles([r["import"] + r["create_app"] + r["startup"] + r["first_request"]
+                                   for r in runs])
+        results[name] = {**colds[name], "runs": len(runs)}
+        loaded.update(m for r in runs for m in r["loaded"])
+    for name, r in results.items():
+        print(f"{name:36} p50 {r['p50']:9.1f}ms  p95 {r['p95']:9.1f}ms")
+    print(f"saved {save('startup', results, args.out)}")
+
+    if loaded:
+        raise SystemExit(f"imported at module load, expected lazy: {', '.join(sorted(loaded))}")
+    cold = colds[args.name]
+    if cold["p50"] > args.budget:
+        raise SystemExit(f"cold start p50 {cold['p50']:.0f}ms over the {args.budget:.0f}ms budget")
+    print(f"cold start p50 {cold['p50']:.0f}ms within the {args.budget:.0f}ms budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Local upstream stub for the load harness: a small asyncio HTTP/1.1 server
+(keep-alive, Content-Length) serving the synthetic corpus.
+
+    GET /doc/<profile>?latency=50&chunk=16384&chunk_delay=2&redirects=2&seed=0
+
+latency      ms before the response headers (time to first byte)
+chunk        body write size in bytes (default: whole body at once)
+chunk_delay  ms between chunks (a slow or trickling upstream)
+redirects    302 hops before the document
+seed         corpus seed; any other query parameter is ignored (cache busting)
+
+Run standalone with `python -m bench.stub --port 8765`.
+"""
+import argparse, asyncio
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from bench.corpus import PROFILES, document
+
+class Stub:
+    def __init__(self) -> None:
+        self._docs: dict[tuple[str, int], bytes] = {}
+        self.requests = 0
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._serve, host, port, backlog=1024)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _doc(self, name: str, seed: int) -> bytes:
+        key = (name, seed)
+        if key not in self._docs:
+            self._docs[key] = document(name, seed)
+        return self._docs[key]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                target = head.split(b" ", 2)[1].decode("latin-1")
+                await self._respond(writer, target)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, target: str) -> None:
+        url = urlsplit(target)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        name = url.path.rsplit("/", 1)[-1]
+        if not url.path.startswith("/doc/") or name not in PROFILES:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            return
+        if float(q.get("latency", 0)):
+            await asyncio.sleep(float(q["latency"]) / 1000)
+        hops = int(q.get("redirects", 0))
+        if hops > 0:
+            q["redirects"] = str(hops - 1)
+            location = f"{url.path}?{urlencode(q)}"
+            writer.write(f"HTTP/1.1 302 Found\r\nLocation: {location}\r\nContent-Length: 0\r\n\r\n".encode())
+            await writer.drain()
+            return
+        body = self._doc(name, int(q.get("seed", 0)))
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+        )
+        chunk = int(q.get("chunk", 0)) or len(body)
+        delay = float(q.get("chunk_delay", 0)) / 1000
+        for i in range(0, len(body), chunk):
+            writer.write(body[i:i + chunk])
+            await writer.drain()
+            if delay and i + chunk < len(body):
+                await asyncio.sleep(delay)
+
+async def _main(port: int) -> None:
+    stub = Stub()
+    port = await stub.start(port=port)
+    print(f"stub listening on http://127.0.0.1:{port}/doc/<{'|'.join(PROFILES)}>", flush=True)
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--port", type=int, default=8765)
+    asyncio.run(_main(ap.parse_args().port))
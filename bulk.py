@@ -0,0 +1,394 @@
+"""
+Offline bulk analysis of crawl dumps: HTML files under a directory, in a
+tarball or in WARC files, scored by the same analyzer as /api/analyze_html
+(`analysis.score_html`) in a process pool.
+
+    python -m bulk mirror/ --base-url https://example.com/ --out results.jsonl
+    python -m bulk crawl.warc.gz pages.tar.gz --out results.jsonl --workers 8
+    python -m bulk crawl.warc.gz --out results/ --format parquet
+    python -m bulk crawl.warc.gz --out results.jsonl --resume
+
+Inputs are read lazily and sent to the workers in batches, with at most a
+few batches per worker in flight, so memory does not grow with the dump.
+Workers serialize their own results; the parent only reads inputs and
+writes bytes. Output is in input order, one record per document:
+{"index", "source", "url", "result"} or {"index", "source", "url", "error"}
+(the /api/analyze/batch item shape). A WARC response record that cannot be
+decoded gets an error record too. Inputs are enumerated in a fixed order
+(sorted directory walk, archive order), so --resume skips the documents an
+earlier run already wrote and carries on.
+
+Parquet output (--format parquet, needs pyarrow) goes to a directory of
+part files, each written whole and renamed into place.
+"""
+import argparse, gzip, json, os, sys, tarfile, time, zlib
+from collections import deque
+from collections.abc import Callable, Iterator
+from urllib.parse import urljoin
+
+from analysis import score_html
+from html_signals import decode_document
+
+BULK_BATCH_DOCS  = int(os.getenv("BULK_BATCH_DOCS", "32"))
+BULK_BATCH_BYTES = int(os.getenv("BULK_BATCH_BYTES", str(4 * 1024 * 1024)))
+BULK_IN_FLIGHT   = int(os.getenv("BULK_IN_FLIGHT", "4"))          # batches per worker
+BULK_MAX_BYTES   = int(os.getenv("BULK_MAX_BYTES", str(10 * 1024 * 1024)))   # per document
+BULK_PART_ROWS   = int(os.getenv("BULK_PART_ROWS", "50000"))      # parquet rows per part file
+
+HTML_SUFFIXES = (".html", ".htm", ".xhtml", ".shtml")
+_READ_CHUNK   = 1 << 20
+
+# A document: (source, url, read). read() returns (body, charset, status) and
+# must be called before the next document is taken from the iterator.
+Document = tuple[str, str | None, Callable[[], tuple[bytes, str | None, int]]]
+
+class TooLarge(Exception):
+    pass
+
+class BadRecord(Exception):
+    """A WARC response whose HTTP message cannot be decoded."""
+
+# ---- inputs ----------------------------------------------------------------
+def _under(base_url: str | None, name: str) -> str | None:
+    return urljoin(base_url, name.replace(os.sep, "/").lstrip("/")) if base_url else None
+
+def _read_file(path: str) -> tuple[bytes, None, int]:
+    if os.path.getsize(path) > BULK_MAX_BYTES:
+        raise TooLarge
+    with open(path, "rb") as f:
+        return f.read(), None, 200
+
+def _iter_dir(root: str, base_url: str | None) -> Iterator[Document]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(HTML_SUFFIXES):
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, root)
+                yield path, _under(base_url, rel), lambda path=path: _read_file(path)
+
+def _iter_tar(path: str, base_url: str | None) -> Iterator[Document]:
+    # streaming mode: members are read in archive order with no seeking
+    with tarfile.open(path, "r|*") as tar:
+        for member in tar:
+            if member.isfile() and member.name.lower().endswith(HTML_SUFFIXES):
+                def read(member=member) -> tuple[bytes, None, int]:
+                    if member.size > BULK_MAX_BYTES:
+                        raise TooLarge
+                    return tar.extractfile(member).read(), None, 200
+                yield f"{path}:{member.name}", _under(base_url, member.name), read
+
+def _read_headers(f) -> dict[str, str]:
+    headers = {}
+    for line in iter(f.readline, b""):
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+def _skip(f, n: int) -> None:
+    while n > 0:
+        got = len(f.read(min(n, _READ_CHUNK)))
+        if not got:
+            return
+        n -= got
+
+def _dechunk(body: bytes) -> bytes:
+    out, pos = bytearray(), 0
+    while True:
+        eol = body.find(b"\r\n", pos)
+        if eol < 0:
+            return bytes(out)
+        size = int(body[pos:eol].split(b";")[0] or b"0", 16)
+        if not size:
+            return bytes(out)
+        out += body[eol + 2:eol + 2 + size]
+        pos = eol + 4 + size
+
+def _http_response(block: bytes) -> tuple[int, dict[str, str], bytes]:
+    """Split a recorded HTTP/1.x response into status, headers and the decoded body."""
+    head, _, body = block.partition(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = _dechunk(body)
+    encoding = headers.get("content-encoding", "").lower()
+    if encoding in ("gzip", "x-gzip", "deflate"):
+        body = zlib.decompress(body, 47)          # gzip or zlib wrapper
+    elif encoding == "br":
+        import brotli
+        body = brotli.decompress(body)
+    return status, headers, body
+
+def _charset(content_type: str) -> str | None:
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            return value.strip().strip('"') or None
+    return None
+
+def _too_large():
+    raise TooLarge
+
+def _bad_record(error: Exception) -> Callable[[], tuple[bytes, str | None, int]]:
+    def read():
+        raise BadRecord(f"{type(error).__name__}: {error}")
+    return read
+
+def _iter_warc(path: str) -> Iterator[Document]:
+    """HTML `response` records; requests, metadata, revisits and non-2xx responses are passed over."""
+    with open(path, "rb") as raw:
+        gzipped = raw.read(2) == b"\x1f\x8b"
+    # one gzip member per record is the norm; GzipFile reads across members
+    with (gzip.open(path, "rb") if gzipped else open(path, "rb")) as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            if not line.startswith(b"WARC/"):
+                raise ValueError(f"{path}: not a WARC record: {line[:40]!r}")
+            headers = _read_headers(f)
+            length = int(headers.get("content-length", "0"))
+            if (headers.get("warc-type") != "response"
+                    or not headers.get("content-type", "").startswith("application/http")):
+                _skip(f, length)
+                continue
+            source = f"{path}:{headers.get('warc-record-id', '').strip('<>')}"
+            url = headers.get("warc-target-uri")
+            if length > BULK_MAX_BYTES:
+                _skip(f, length)
+                yield source, url, _too_large
+                continue
+            block = f.read(length)
+            try:
+                status, http, body = _http_response(block)
+            except Exception as e:      # cut or garbled message, bad chunking or compression
+                yield source, url, _bad_record(e)
+                continue
+            content_type = http.get("content-type", "")
+            if not 200 <= status < 300 or "html" not in content_type.lower():
+                continue
+            yield source, url, lambda r=(body, _charset(content_type), status): r
+
+def documents(paths: list[str], base_url: str | None = None) -> Iterator[Document]:
+    for path in paths:
+        if os.path.isdir(path):
+            yield from _iter_dir(path, base_url)
+        elif ".warc" in os.path.basename(path).lower():
+            yield from _iter_warc(path)
+        elif tarfile.is_tarfile(path):
+            yield from _iter_tar(path, base_url)
+        else:
+            yield path, _under(base_url, os.path.basename(path)), lambda path=path: _read_file(path)
+
+# ---- workers ---------------------------------------------------------------
+# (index, source, url, body, charset, status, error)
+Job = tuple[int, str, str | None, bytes | None, str | None, int, str | None]
+
+def _record(job: Job) -> dict:
+    index, source, url, body, charset, status, error = job
+    record = {"index": index, "source": source, "url": url}
+    if error is None:
+        try:
+            result = score_html(decode_document(body, charset), url)
+            result["status"] = status
+            record["result"] = result
+            return record
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    record["error"] = error
+    return record
+
+def analyze_batch(jobs: list[Job], fmt: str) -> tuple[list, int]:
+    """Worker entry point: (JSON lines or flat parquet rows, number of errors)."""
+    records = [_record(job) for job in jobs]
+    errors = sum(1 for r in records if "error" in r)
+    if fmt == "jsonl":
+        return [json.dumps(r, ensure_ascii=False).encode() + b"\n" for r in records], errors
+    return [_flatten(r) for r in records], errors
+
+def _batches(docs: Iterator[Document], skip: int, expect: str | None) -> Iterator[list[Job]]:
+    batch: list[Job] = []
+    size = 0
+    count = 0
+    for index, (source, url, read) in enumerate(docs):
+        count = index + 1
+        if index < skip:
+            # the last record already written must be this same document
+            if index == skip - 1 and source != expect:
+                raise SystemExit(f"--resume: output ends with {expect!r} but input document "
+                                 f"{index} is {source!r}; the inputs changed since the first run")
+            continue
+        try:
+            body, charset, status = read()
+            error = None
+        except TooLarge:
+            body, charset, status, error = None, None, 0, f"Document too large ({BULK_MAX_BYTES} byte limit)"
+        except BadRecord as e:
+            body, charset, status, error = None, None, 0, f"Unreadable WARC record ({e})"
+        except OSError as e:
+            body, charset, status, error = None, None, 0, f"{type(e).__name__}: {e}"
+        batch.append((index, source, url, body, charset, status, error))
+        size += len(body or b"")
+        if len(batch) >= BULK_BATCH_DOCS or size >= BULK_BATCH_BYTES:
+            yield batch
+            batch, size = [], 0
+    if count < skip:
+        raise SystemExit(f"--resume: the output holds {skip} records but the inputs only {count} documents")
+    if batch:
+        yield batch
+
+# ---- outputs ---------------------------------------------------------------
+class JsonlSink:
+    def __init__(self, path: str, resume: bool) -> None:
+        self.done, self.last = 0, None
+        if resume and os.path.exists(path):
+            self.done, self.last, end = self._scan(path)
+            with open(path, "r+b") as f:
+                f.truncate(end)         # drop a line cut short by the previous run
+        self.f = open(path, "ab" if resume else "wb")
+
+    @staticmethod
+    def _scan(path: str) -> tuple[int, str | None, int]:
+        count, last, end = 0, None, 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                count += 1
+                end += len(line)
+                last = line
+        return count, json.loads(last)["source"] if last else None, end
+
+    def write(self, rows: list[bytes]) -> None:
+        self.f.writelines(rows)
+        self.f.flush()
+
+    def close(self) -> None:
+        self.f.close()
+
+# payload fields stored as parquet columns; "list" columns hold strings and
+# "agents" the ai_agents records
+_COLUMNS = (
+    ("index", "int64"), ("source", "string"), ("url", "string"), ("error", "string"),
+    ("status", "int32"), ("final_url", "string"), ("score", "int32"),
+    ("title", "string"), ("title_length", "int32"),
+    ("meta_description", "string"), ("meta_description_length", "int32"),
+    ("h1", "list"), ("multiple_h1", "bool"), ("canonical", "string"), ("robots", "string"),
+    ("noindex", "bool"), ("nofollow", "bool"), ("viewport", "bool"),
+    ("og_count", "int32"), ("twitter_count", "int32"),
+    ("jsonld_count", "int32"), ("jsonld_types", "list"), ("text_words", "int32"),
+    ("ai_agents", "agents"), ("recommendations", "list"),
+)
+
+def _flatten(record: dict) -> dict:
+    row = {**record.get("result", {}), **record}
+    return {name: row.get(name) for name, _ in _COLUMNS}
+
+class ParquetSink:
+    def __init__(self, path: str, resume: bool) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("--format parquet needs pyarrow (pip install pyarrow)") from None
+        self.pa, self.pq = pa, pq
+        agent = pa.struct([("vendor", pa.string()), ("category", pa.string()),
+                           ("confidence", pa.float64()), ("evidence", pa.list_(pa.string()))])
+        types = {"int64": pa.int64(), "int32": pa.int32(), "string": pa.string(),
+                 "bool": pa.bool_(), "list": pa.list_(pa.string()), "agents": pa.list_(agent)}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in _COLUMNS])
+        self.dir = path
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(n for n in os.listdir(path) if n.startswith("part-") and n.endswith(".parquet"))
+        for name in os.listdir(path):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(path, name))
+        if not resume:
+            for name in parts:
+                os.remove(os.path.join(path, name))
+            parts = []
+        self.part = len(parts)
+        self.done = sum(pq.read_metadata(os.path.join(path, n)).num_rows for n in parts)
+        self.last = None
+        if parts:
+            sources = pq.read_table(os.path.join(path, parts[-1]), columns=["source"]).column(0)
+            self.last = sources[len(sources) - 1].as_py() if len(sources) else None
+        self.rows: list[dict] = []
+
+    def write(self, rows: list[dict]) -> None:
+        self.rows += rows
+        while len(self.rows) >= BULK_PART_ROWS:
+            self._flush(self.rows[:BULK_PART_ROWS])
+            del self.rows[:BULK_PART_ROWS]
+
+    def _flush(self, rows: list[dict]) -> None:
+        final = os.path.join(self.dir, f"part-{self.part:05d}.parquet")
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        self.pq.write_table(table, final + ".tmp", compression="zstd")
+        os.replace(final + ".tmp", final)
+        self.part += 1
+
+    def close(self) -> None:
+        if self.rows:
+            self._flush(self.rows)
+            self.rows = []
+
+# ---- driver ----------------------------------------------------------------
+def run(paths: list[str], out: str, fmt: str = "jsonl", workers: int = os.cpu_count() or 1,
+        base_url: str | None = None, resume: bool = False) -> dict:
+    sink = JsonlSink(out, resume) if fmt == "jsonl" else ParquetSink(out, resume)
+    start = time.perf_counter()
+    written = errors = 0
+
+    def emit(done: tuple[list, int]) -> None:
+        nonlocal written, errors
+        rows, failed = done
+        sink.write(rows)
+        written += len(rows)
+        errors += failed
+
+    batches = _batches(documents(paths, base_url), sink.done, sink.last)
+    try:
+        if workers <= 0:
+            for batch in batches:
+                emit(analyze_batch(batch, fmt))
+        else:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            ctx = multiprocessing.get_context(os.getenv("PARSE_START_METHOD") or None)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                # bounded and ordered: results are taken oldest first, and no
+                # new batch is read until one of BULK_IN_FLIGHT * workers is done
+                pending: deque = deque()
+                for batch in batches:
+                    if len(pending) >= workers * BULK_IN_FLIGHT:
+                        emit(pending.popleft().result())
+                    pending.append(pool.submit(analyze_batch, batch, fmt))
+                while pending:
+                    emit(pending.popleft().result())
+    finally:
+        sink.close()
+    elapsed = time.perf_counter() - start
+    return {"skipped": sink.done, "written": written, "errors": errors,
+            "seconds": round(elapsed, 2), "docs_per_s": round(written / elapsed, 1) if elapsed else None}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Analyze HTML dumps (directories, tarballs, WARC) offline.")
+    ap.add_argument("inputs", nargs="+", help="directories, .tar[.gz|.bz2|.xz] files, .warc[.gz] files or HTML files")
+    ap.add_argument("--out", required=True, help="JSONL file, or directory for --format parquet")
+    ap.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="0 = analyze in this process")
+    ap.add_argument("--base-url", help="URL that directory and tarball paths are relative to")
+    ap.add_argument("--resume", action="store_true", help="keep existing output and continue after it")
+    args = ap.parse_args()
+    stats = run(args.inputs, args.out, args.format, args.workers, args.base_url, args.resume)
+    print(json.dumps(stats), file=sys.stderr)
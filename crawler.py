@@ -0,0 +1,608 @@
+"""
+Site crawler: sitemap and same-origin link discovery feeding the analyze
+pipeline, with a site-level aggregate over the per-page results.
+
+The frontier, the seen set and every page result live in SQLite, so memory
+stays flat however large the site is, and a crawl picks up where it left
+off after a restart. Fetches honour robots.txt and a per-host crawl delay.
+
+Several workers can share one database. Each crawl is run by one worker at
+a time, which holds a lease on it (crawls.owner / crawls.lease) and renews
+it while running. A crawl whose owner stopped or died is adopted by
+another worker once the lease lapses; only then are its in-flight pages
+queued again.
+"""
+import asyncio, json, os, re, secrets, socket, sqlite3, threading, time, zlib
+import xml.etree.ElementTree as ET
+from array import array
+from collections.abc import AsyncIterator, Awaitable, Callable
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+from linkgraph import LinkGraph, passes_equity
+
+CRAWL_DB          = os.getenv("CRAWL_DB", "crawls.sqlite3")
+CRAWL_DB_CACHE_KB = int(os.getenv("CRAWL_DB_CACHE_KB", "16384"))   # SQLite page cache
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))       # fetches per crawl
+CRAWL_MAX_ACTIVE  = int(os.getenv("CRAWL_MAX_ACTIVE", "4"))        # crawls running at once
+CRAWL_DELAY       = float(os.getenv("CRAWL_DELAY", "1.0"))         # per host; robots.txt may ask for more
+CRAWL_MAX_PAGES   = int(os.getenv("CRAWL_MAX_PAGES", "500000"))
+CRAWL_LEASE       = float(os.getenv("CRAWL_LEASE", "60"))          # owner silent this long: crawl is adopted
+
+ROBOTS_MAX_BYTES  = 500_000
+SITEMAP_MAX_BYTES = 50_000_000     # uncompressed, per the sitemaps protocol
+SITEMAP_MAX_FILES = 1_000
+_ADD_BATCH        = 1_000
+_LOOKUP_BATCH     = 500          # bound parameters per IN (...) query
+
+# page states
+QUEUED, ACTIVE, DONE, FAILED, SKIPPED = range(5)
+STATE_NAMES = ("queued", "active", "done", "failed", "skipped")
+
+_TRACKING = re.compile(r"^(utm_[a-z]+|gclid|fbclid|msclkid)$", re.I)
+
+def normalize_url(url: str, base: str | None = None) -> str | None:
+    """
+    Canonical form used for dedup: absolute http(s), lowercase scheme and
+    host, no default port, userinfo, fragment or tracking parameters, and
+    "/" for an empty path. Returns None for anything not crawlable.
+    """
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in ("http", "https") or not host:
+        return None
+    if ":" in host:
+        host = f"[{host}]"
+    if port and port != (443 if scheme == "https" else 80):
+        host = f"{host}:{port}"
+    query = "&".join(
+        p for p in parts.query.split("&")
+        if p and not _TRACKING.match(p.split("=", 1)[0])
+    )
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+def _site_hosts(url: str) -> frozenset[str]:
+    # www and the bare domain count as the same site
+    host = urlsplit(url).hostname or ""
+    bare = host[4:] if host.startswith("www.") else host
+    return frozenset((bare, "www." + bare))
+
+# ---- persistent state ----------------------------------------------------
+class CrawlStore:
+    """SQLite-backed crawls, frontier and results. Pages are keyed by (crawl, url)."""
+
+    def __init__(self, path: str = CRAWL_DB) -> None:
+        self.path = path
+        self._local = threading.local()
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS crawls (
+                id INTEGER PRIMARY KEY,
+                root TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                discovered INTEGER NOT NULL DEFAULT 0,
+                seeded INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                finished REAL,
+                error TEXT,
+                summary TEXT,
+                owner TEXT,                               -- worker running it
+                lease REAL NOT NULL DEFAULT 0             -- owner's lease expires
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                crawl_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                state INTEGER NOT NULL DEFAULT 0,
+                status INTEGER,
+                score INTEGER,
+                error TEXT,
+                recos TEXT,
+                result TEXT,
+                UNIQUE (crawl_id, url)
+            );
+            CREATE INDEX IF NOT EXISTS pages_frontier ON pages (crawl_id, state, depth);
+            -- out-links of a page as packed int64 pages.rowid targets, negated when
+            -- the link passes no equity (nofollow); see linkgraph.py
+            CREATE TABLE IF NOT EXISTS page_links (
+                page_id INTEGER PRIMARY KEY,
+                crawl_id INTEGER NOT NULL,
+                links BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS page_links_crawl ON page_links (crawl_id);
+        """)
+        columns = {r["name"] for r in self.db.execute("PRAGMA table_info(crawls)")}
+        for column in ("owner TEXT", "lease REAL NOT NULL DEFAULT 0"):
+            if column.split()[0] not in columns:    # databases from before leases
+                try:
+                    self.db.execute(f"ALTER TABLE crawls ADD COLUMN {column}")
+                except sqlite3.OperationalError:
+                    pass                            # another worker added it first
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """
+        This thread's connection. The crawler writes from the event loop and
+        the read endpoints run in the threadpool; separate connections keep
+        a read from landing inside the loop's open transaction.
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.executescript(f"""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA busy_timeout=5000;
+                PRAGMA cache_size=-{CRAWL_DB_CACHE_KB};
+            """)
+        return db
+
+    def _transaction(self, fn, *args):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(*args)
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return out
+
+    def create(self, root: str, options: dict, owner: str) -> int:
+        now = time.time()
+        cur = self.db.execute(
+            "INSERT INTO crawls (root, options, status, created, owner, lease) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (root, json.dumps(options), now, owner, now + CRAWL_LEASE),
+        )
+        return cur.lastrowid
+
+    def get(self, crawl_id: int) -> dict | None:
+        row = self.db.execute("SELECT * FROM crawls WHERE id = ?", (crawl_id,)).fetchone()
+        if row is None:
+            return None
+        crawl = dict(row)
+        crawl["options"] = json.loads(crawl["options"])
+        crawl["summary"] = json.loads(crawl["summary"]) if crawl["summary"] else None
+        return crawl
+
+    def orphaned(self) -> list[int]:
+        """Unfinished crawls no worker holds a live lease on."""
+        rows = self.db.execute("SELECT id FROM crawls WHERE status IN ('queued', 'running') AND lease < ?",
+                               (time.time(),))
+        return [r["id"] for r in rows]
+
+    def acquire(self, crawl_id: int, owner: str) -> bool:
+        """
+        Take (or keep) the lease on an unfinished crawl; False while another
+        worker's lease is live. Pages the previous owner left in flight are
+        queued again.
+        """
+        now = time.time()
+
+        def run() -> bool:
+            row = self.db.execute(
+                "UPDATE crawls SET owner = ?, lease = ? WHERE id = ? AND status IN ('queued', 'running') "
+                "AND (owner = ? OR owner IS NULL OR lease < ?) RETURNING owner",
+                (owner, now + CRAWL_LEASE, crawl_id, owner, now)).fetchone()
+            if row is None:
+                return False
+            self.db.execute("UPDATE pages SET state = ? WHERE crawl_id = ? AND state = ?",
+                            (QUEUED, crawl_id, ACTIVE))
+            return True
+
+        return self._transaction(run)
+
+    def renew(self, crawl_id: int, owner: str) -> bool:
+        """Extend the lease; False if it was lost or the crawl was cancelled meanwhile."""
+        return self.db.execute(
+            "UPDATE crawls SET lease = ? WHERE id = ? AND owner = ? AND status IN ('queued', 'running')",
+            (time.time() + CRAWL_LEASE, crawl_id, owner)).rowcount > 0
+
+    def release(self, crawl_id: int, owner: str) -> None:
+        self.db.execute("UPDATE crawls SET owner = NULL, lease = 0 WHERE id = ? AND owner = ?",
+                        (crawl_id, owner))
+
+    def set_status(self, crawl_id: int, status: str, error: str | None = None) -> None:
+        finished = time.time() if status in ("done", "failed", "cancelled") else None
+        self.db.execute(
+            "UPDATE crawls SET status = ?, error = ?, finished = ? WHERE id = ?",
+            (status, error, finished, crawl_id),
+        )
+
+    def mark_seeded(self, crawl_id: int) -> None:
+        self.db.execute("UPDATE crawls SET seeded = 1 WHERE id = ?", (crawl_id,))
+
+    def save_summary(self, crawl_id: int, summary: dict) -> None:
+        self.db.execute("UPDATE crawls SET summary = ? WHERE id = ?", (json.dumps(summary), crawl_id))
+
+    def add(self, crawl_id: int, urls: list[tuple[str, int]], limit: int) -> bool:
+        """Queue unseen URLs up to the crawl's page limit; False once the limit is reached."""
+        def run() -> bool:
+            room = limit - self.db.execute(
+                "SELECT discovered FROM crawls WHERE id = ?", (crawl_id,)).fetchone()[0]
+            added = 0
+            for url, depth in urls:
+                if added >= room:
+                    break
+                added += self.db.execute(
+                    "INSERT OR IGNORE INTO pages (crawl_id, url, depth) VALUES (?, ?, ?)",
+                    (crawl_id, url, depth),
+                ).rowcount
+            self.db.execute("UPDATE crawls SET discovered = discovered + ? WHERE id = ?", (added, crawl_id))
+            return added < room
+
+        return self._transaction(run)
+
+    def claim(self, crawl_id: int) -> tuple[str, int] | None:
+        """Next queued URL, shallowest first, in discovery order."""
+        row = self.db.execute(
+            "UPDATE pages SET state = ? WHERE rowid = ("
+            "  SELECT rowid FROM pages WHERE crawl_id = ? AND state = ? ORDER BY depth, rowid LIMIT 1) "
+            "RETURNING url, depth", (ACTIVE, crawl_id, QUEUED)).fetchone()
+        return (row["url"], row["depth"]) if row else None
+
+    def finish(self, crawl_id: int, url: str, state: int, status: int | None = None,
+               error: str | None = None, result: dict | None = None) -> None:
+        self.db.execute(
+            "UPDATE pages SET state = ?, status = ?, score = ?, error = ?, recos = ?, result = ? "
+            "WHERE crawl_id = ? AND url = ?",
+            (
+                state, status,
+                result["score"] if result else None,
+                error,
+                json.dumps(result["recommendations"], ensure_ascii=False) if result else None,
+                json.dumps(result, ensure_ascii=False) if result else None,
+                crawl_id, url,
+            ),
+        )
+
+    def save_links(self, crawl_id: int, url: str, links: list[tuple[str, bool]]) -> None:
+        """Record a page's internal out-links as (url, passes equity); unknown targets are dropped."""
+        ids: dict[str, int] = {}
+        urls = list({u for u, _ in links})
+        for i in range(0, len(urls), _LOOKUP_BATCH):
+            chunk = urls[i:i + _LOOKUP_BATCH]
+            ids.update(self.db.execute(
+                f"SELECT url, rowid FROM pages WHERE crawl_id = ? AND url IN ({','.join('?' * len(chunk))})",
+                (crawl_id, *chunk)).fetchall())
+        packed = array("q", (ids[u] if follow else -ids[u] for u, follow in links if u in ids))
+        self.db.execute(
+            "INSERT OR REPLACE INTO page_links (page_id, crawl_id, links) "
+            "SELECT rowid, crawl_id, ? FROM pages WHERE crawl_id = ? AND url = ?",
+            (packed.tobytes(), crawl_id, url))
+
+    def link_graph(self, crawl_id: int) -> tuple[list[str], LinkGraph]:
+        """The crawl's internal link graph: node URLs (in discovery order) and the CSR graph."""
+        import numpy as np
+        rows = self.db.execute("SELECT rowid, url FROM pages WHERE crawl_id = ? ORDER BY rowid",
+                               (crawl_id,)).fetchall()
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        src, dst = [], []
+        for page_id, blob in self.db.execute("SELECT page_id, links FROM page_links WHERE crawl_id = ?",
+                                             (crawl_id,)):
+            targets = np.frombuffer(blob, dtype=np.int64)
+            src.append(np.full(len(targets), page_id, dtype=np.int64))
+            dst.append(targets)
+        src = np.concatenate(src) if src else np.zeros(0, dtype=np.int64)
+        dst = np.concatenate(dst) if dst else np.zeros(0, dtype=np.int64)
+        follow = dst > 0
+        dst = np.abs(dst)
+        # rowids -> node numbers (ids is sorted); edges to rows no longer present are dropped
+        last = max(len(ids) - 1, 0)
+        si = np.minimum(np.searchsorted(ids, src), last)
+        di = np.minimum(np.searchsorted(ids, dst), last)
+        ok = (ids[si] == src) & (ids[di] == dst) if len(ids) else np.zeros(len(src), dtype=bool)
+        return [r[1] for r in rows], LinkGraph(len(ids), si[ok], di[ok], follow[ok])
+
+    def pages(self, crawl_id: int, offset: int = 0, limit: int = 100, detail: bool = False) -> list[dict]:
+        rows = self.db.execute(
+            "SELECT url, depth, state, status, score, error, recos, result FROM pages "
+            "WHERE crawl_id = ? ORDER BY rowid LIMIT ? OFFSET ?", (crawl_id, limit, offset))
+        out = []
+        for r in rows:
+            page = {
+                "url": r["url"], "depth": r["depth"], "state": STATE_NAMES[r["state"]],
+                "status": r["status"], "score": r["score"], "error": r["error"],
+                "recommendations": json.loads(r["recos"]) if r["recos"] else [],
+            }
+            if detail:
+                page["result"] = json.loads(r["result"]) if r["result"] else None
+            out.append(page)
+        return out
+
+    def summary(self, crawl_id: int) -> dict:
+        """Site-level aggregate, computed in SQL so it never loads the pages."""
+        q = self.db.execute
+        states = dict.fromkeys(STATE_NAMES, 0)
+        for r in q("SELECT state, COUNT(*) AS n FROM pages WHERE crawl_id = ? GROUP BY state", (crawl_id,)):
+            states[STATE_NAMES[r["state"]]] = r["n"]
+        agg = q("SELECT AVG(score) AS avg, MIN(score) AS lo, MAX(score) AS hi FROM pages "
+                "WHERE crawl_id = ? AND state = ?", (crawl_id, DONE)).fetchone()
+        buckets = {f"{b * 10}-{b * 10 + 9}": 0 for b in range(10)}
+        for r in q("SELECT MIN(score / 10, 9) AS b, COUNT(*) AS n FROM pages "
+                   "WHERE crawl_id = ? AND state = ? GROUP BY b", (crawl_id, DONE)):
+            buckets[f"{r['b'] * 10}-{r['b'] * 10 + 9}"] = r["n"]
+        issues = {
+            r["reco"]: r["n"] for r in q(
+                "SELECT j.value AS reco, COUNT(*) AS n FROM pages, json_each(pages.recos) AS j "
+                "WHERE crawl_id = ? AND state = ? GROUP BY j.value ORDER BY n DESC",
+                (crawl_id, DONE))
+        }
+        return {
+            "pages": states,
+            "score": round(agg["avg"]) if agg["avg"] is not None else None,
+            "score_min": agg["lo"],
+            "score_max": agg["hi"],
+            "score_histogram": buckets,
+            "issues": issues,
+        }
+
+# ---- politeness ----------------------------------------------------------
+class _Pacer:
+    """Spaces fetches to one host at least `delay` seconds apart."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.delay
+
+# ---- crawler -------------------------------------------------------------
+Analyze = Callable[[str, bool, list | None], Awaitable[dict]]
+
+class Crawler:
+    """
+    Runs crawls as background tasks on the event loop.
+
+    `analyze(url, head_only, links)` is the service's analyze pipeline; when
+    `links` is a list it is filled with the page's (absolute <a href>, rel)
+    pairs.
+    `client()` returns the shared upstream client used for robots.txt and
+    sitemaps.
+    """
+
+    def __init__(self, store: CrawlStore, client: Callable, analyze: Analyze, user_agent: str) -> None:
+        self.store = store
+        self.client = client
+        self.analyze = analyze
+        self.user_agent = user_agent
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self.tasks: dict[int, asyncio.Task] = {}
+        self._pacers: dict[str, _Pacer] = {}
+        self._active = asyncio.Semaphore(CRAWL_MAX_ACTIVE)
+        self._adopter: asyncio.Task | None = None
+
+    def start(self, root: str, options: dict) -> int:
+        crawl_id = self.store.create(root, options, self.owner)
+        self._spawn(crawl_id)
+        return crawl_id
+
+    def resume_all(self) -> None:
+        """
+        Run the crawls no worker holds, now and then every CRAWL_LEASE
+        seconds, so the crawls of a worker that dies are picked up.
+        """
+        if self._adopter is None:
+            self._adopter = asyncio.create_task(self._adopt())
+
+    async def _adopt(self) -> None:
+        while True:
+            for crawl_id in self.store.orphaned():
+                if crawl_id not in self.tasks:
+                    self._spawn(crawl_id)
+            await asyncio.sleep(CRAWL_LEASE)
+
+    async def cancel(self, crawl_id: int) -> None:
+        # a crawl running in another worker stops when its lease renewal fails
+        self.store.set_status(crawl_id, "cancelled")
+        task = self.tasks.get(crawl_id)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        # state is already on disk; released crawls are adopted by other
+        # workers, or resumed on next start
+        tasks = list(self.tasks.values())
+        if self._adopter is not None:
+            tasks.append(self._adopter)
+            self._adopter = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, crawl_id: int) -> None:
+        task = asyncio.create_task(self._run(crawl_id))
+        self.tasks[crawl_id] = task
+        task.add_done_callback(lambda _t: self.tasks.pop(crawl_id, None))
+
+    async def _keep_lease(self, crawl_id: int, run: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(CRAWL_LEASE / 3)
+            if not self.store.renew(crawl_id, self.owner):
+                run.cancel()            # adopted elsewhere, or cancelled
+                return
+
+    async def _run(self, crawl_id: int) -> None:
+        async with self._active:
+            if not self.store.acquire(crawl_id, self.owner):
+                return                  # another worker runs it
+            keeper = asyncio.create_task(self._keep_lease(crawl_id, asyncio.current_task()))
+            try:
+                await self._crawl(crawl_id)
+            finally:
+                keeper.cancel()
+                self.store.release(crawl_id, self.owner)
+
+    async def _crawl(self, crawl_id: int) -> None:
+        crawl = self.store.get(crawl_id)
+        opts = crawl["options"]
+        root = crawl["root"]
+        self.store.set_status(crawl_id, "running")
+        try:
+            robots = await self._robots(root)
+            if robots is None:
+                self.store.set_status(crawl_id, "failed", "robots.txt unavailable")
+                return
+            host = urlsplit(root).hostname or ""
+            delay = max(CRAWL_DELAY, float(robots.crawl_delay(self.user_agent) or 0))
+            pacer = self._pacers.setdefault(host, _Pacer(delay))
+            pacer.delay = max(pacer.delay, delay)
+
+            if not crawl["seeded"]:
+                self.store.add(crawl_id, [(root, 0)], opts["max_pages"])
+                if opts["use_sitemap"]:
+                    await self._seed_from_sitemaps(crawl_id, root, robots, opts["max_pages"])
+                self.store.mark_seeded(crawl_id)
+
+            inflight = 0
+
+            async def worker() -> None:
+                nonlocal inflight
+                while True:
+                    claimed = self.store.claim(crawl_id)
+                    if claimed is None:
+                        if not inflight:
+                            return
+                        await asyncio.sleep(0.2)     # other workers may still add links
+                        continue
+                    inflight += 1
+                    try:
+                        await self._crawl_page(crawl_id, claimed, opts, robots, pacer, root)
+                    finally:
+                        inflight -= 1
+
+            await asyncio.gather(*(worker() for _ in range(CRAWL_CONCURRENCY)))
+            self.store.save_summary(crawl_id, self.store.summary(crawl_id))
+            self.store.set_status(crawl_id, "done")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.store.set_status(crawl_id, "failed", f"{type(e).__name__}: {e}")
+
+    async def _crawl_page(self, crawl_id: int, claimed: tuple[str, int], opts: dict,
+                          robots: RobotFileParser, pacer: _Pacer, root: str) -> None:
+        url, depth = claimed
+        if not robots.can_fetch(self.user_agent, url):
+            self.store.finish(crawl_id, url, SKIPPED, error="Disallowed by robots.txt")
+            return
+        follow = opts["follow_links"] and depth < opts["max_depth"]
+        # links are collected for the link graph even when they are not followed
+        links = [] if follow or not opts["head_only"] else None
+        await pacer.wait()
+        try:
+            result = await self.analyze(url, opts["head_only"], links)
+        except Exception as e:
+            # HTTPException from the pipeline carries the upstream status
+            status = getattr(e, "status_code", None)
+            self.store.finish(crawl_id, url, FAILED, status=status,
+                              error=str(getattr(e, "detail", None) or e))
+            return
+        self.store.finish(crawl_id, url, DONE, status=result["status"], result=result)
+        if links:
+            hosts = _site_hosts(root)
+            found = []
+            edges = []
+            page_nofollow = result.get("nofollow", False)
+            for link, rel in links:
+                u = normalize_url(link)
+                if u and urlsplit(u).hostname in hosts:
+                    found.append((u, depth + 1))
+                    edges.append((u, not page_nofollow and passes_equity(rel)))
+            if follow:
+                self.store.add(crawl_id, found, opts["max_pages"])
+            self.store.save_links(crawl_id, url, edges)
+
+    async def _robots(self, root: str) -> RobotFileParser | None:
+        """Parsed robots.txt; allow-all on 4xx, None when it cannot be fetched (5xx, network)."""
+        rp = RobotFileParser(urljoin(root, "/robots.txt"))
+        try:
+            async with self.client().stream("GET", rp.url) as r:
+                if r.status_code >= 500:
+                    return None
+                if r.status_code >= 400:
+                    rp.allow_all = True
+                    return rp
+                body = bytearray()
+                async for chunk in r.aiter_bytes():
+                    body += chunk
+                    if len(body) >= ROBOTS_MAX_BYTES:
+                        break
+        except Exception:
+            return None
+        rp.parse(body[:ROBOTS_MAX_BYTES].decode("utf-8", "replace").splitlines())
+        return rp
+
+    async def _seed_from_sitemaps(self, crawl_id: int, root: str, robots: RobotFileParser, limit: int) -> None:
+        hosts = _site_hosts(root)
+        todo = list(robots.site_maps() or []) or [urljoin(root, "/sitemap.xml")]
+        seen: set[str] = set()
+        while todo and len(seen) < SITEMAP_MAX_FILES:
+            sitemap = todo.pop()
+            if sitemap in seen:
+                continue
+            seen.add(sitemap)
+            batch: list[tuple[str, int]] = []
+            try:
+                async for kind, loc in self._sitemap_locs(sitemap):
+                    if kind == "sitemap":
+                        todo.append(loc)
+                        continue
+                    u = normalize_url(loc)
+                    if u and urlsplit(u).hostname in hosts:
+                        batch.append((u, 0))
+                    if len(batch) >= _ADD_BATCH:
+                        if not self.store.add(crawl_id, batch, limit):
+                            return
+                        batch = []
+            except Exception:
+                pass            # a broken sitemap does not stop the crawl
+            if batch and not self.store.add(crawl_id, batch, limit):
+                return
+
+    async def _sitemap_locs(self, url: str) -> AsyncIterator[tuple[str, str]]:
+        """
+        Stream ("url" | "sitemap", loc) pairs out of a sitemap or sitemap
+        index, gunzipping on the fly, without holding the document.
+        """
+        async with self.client().stream("GET", url) as r:
+            if r.status_code != 200:
+                return
+            parser = ET.XMLPullParser(events=("start", "end"))
+            inflate = None
+            size = 0
+            root = None
+            async for chunk in r.aiter_bytes():
+                if inflate is None:
+                    # .xml.gz served as a file rather than with Content-Encoding
+                    inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b"\x1f\x8b" else False
+                if inflate:
+                    chunk = inflate.decompress(chunk, SITEMAP_MAX_BYTES + 1 - size)
+                size += len(chunk)
+                if size > SITEMAP_MAX_BYTES:
+                    return
+                parser.feed(chunk)
+                for event, el in parser.read_events():
+                    if root is None:
+                        root = el
+                    if event != "end":
+                        continue
+                    kind = el.tag.rsplit("}", 1)[-1]
+                    if kind in ("url", "sitemap"):
+                        for child in el:
+                            if child.tag.rsplit("}", 1)[-1] == "loc" and child.text:
+                                yield kind, child.text.strip()
+                        root.clear()     # drop parsed entries
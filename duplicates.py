@@ -0,0 +1,304 @@
+"""
+Duplicate and near-duplicate pages within a site.
+
+Every analyzed page is indexed three ways:
+
+- title and meta description, normalized and hashed. Pages of one site
+  with the same hash are exact duplicates, found through an index on
+  (site, hash).
+- body text as a MinHash signature: NUM_PERM minimum hashes over the set
+  of SHINGLE-word shingles. The share of positions where two signatures
+  agree estimates the Jaccard similarity of the two texts.
+- the signature cut into BANDS bands of ROWS values (LSH). Each band is
+  hashed with the site into a bucket key. Pages sharing any bucket are
+  candidates, and their signatures are then compared against
+  DUPES_THRESHOLD. With 16 x 8, pages at 0.8 similarity collide in some
+  band 94% of the time; below 0.5 they rarely do.
+
+Everything lives in SQLite, so lookups are B-tree probes (no scan of the
+site) and memory is the page cache however many pages are indexed. The
+oldest pages are dropped past DUPES_MAX_PAGES.
+
+NumPy is imported on first use.
+"""
+import hashlib, os, re, sqlite3, time, zlib
+from urllib.parse import urlsplit
+
+DUPES_ENABLED      = os.getenv("DUPES", "1") not in ("0", "false", "no")
+DUPES_DB           = os.getenv("DUPES_DB", "duplicates.sqlite3")
+DUPES_DB_CACHE_KB  = int(os.getenv("DUPES_DB_CACHE_KB", "65536"))
+DUPES_MAX_PAGES    = int(os.getenv("DUPES_MAX_PAGES", "5000000"))
+DUPES_THRESHOLD    = float(os.getenv("DUPES_THRESHOLD", "0.8"))    # estimated Jaccard
+DUPES_MAX_CANDIDATES = 1_000      # per lookup; a huge bucket is a template, not news
+
+NUM_PERM = 128
+BANDS    = 16
+ROWS     = NUM_PERM // BANDS
+SHINGLE  = 5                      # words per shingle
+_CHUNK   = 4096                   # shingles per hashing block (bounds the temporary matrix)
+_TRIM    = 300                    # chars of title/description kept for reports
+_EVICT_EVERY = 1_000              # pages added between size checks
+_FLUSH_PAGES = 64                 # per transaction; a flush runs on the caller's thread
+_FLUSH_SECONDS = 1.0
+
+_WORD = re.compile(r"\w+")
+_perms = None
+
+def _permutations():
+    global _perms
+    if _perms is None:
+        import numpy as np
+        # fixed seed: signatures must agree across processes and restarts
+        rng = np.random.default_rng(0x5E0D0)
+        # x -> a*x + b (mod 2**32) with odd a is a permutation of the 32-bit hashes
+        _perms = (rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint32)[:, None] | np.uint32(1),
+                  rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint32)[:, None])
+    return _perms
+
+def minhash(text: str) -> bytes | None:
+    """NUM_PERM x uint32 signature of the text's word shingles; None without words."""
+    import numpy as np
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    h = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint32, count=len(words))
+    # shingle hash: polynomial over the word hashes, wrapping at 32 bits
+    n = max(1, len(h) - SHINGLE + 1)
+    sh = np.zeros(n, dtype=np.uint32)
+    for i in range(min(SHINGLE, len(h))):
+        sh = sh * np.uint32(1_000_003) + h[i:i + n]
+    sh = np.unique(sh)
+    a, b = _permutations()
+    sig = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+    for i in range(0, len(sh), _CHUNK):
+        block = np.multiply(a, sh[i:i + _CHUNK])
+        block += b
+        np.minimum(sig, block.min(axis=1), out=sig)
+    return sig.astype("<u4").tobytes()
+
+def similarity(sig_a: bytes, sig_b: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    import numpy as np
+    return float(np.mean(np.frombuffer(sig_a, "<u4") == np.frombuffer(sig_b, "<u4")))
+
+def similarities(sig: bytes, others: list[bytes]) -> list[float]:
+    """similarity() of sig against each of others, in one pass."""
+    import numpy as np
+    table = np.frombuffer(b"".join(others), "<u4").reshape(len(others), NUM_PERM)
+    return (table == np.frombuffer(sig, "<u4")).mean(axis=1).tolist()
+
+def site_of(url: str) -> str:
+    # www and the bare domain count as the same site
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+def _key(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big", signed=True)
+
+def _text_key(text: str) -> int | None:
+    norm = " ".join(text.lower().split())
+    return _key(norm.encode()) if norm else None
+
+def _band_keys(site: str, sig: bytes) -> list[int]:
+    # LSH bucket per band, scoped to the site
+    prefix = site.encode() + b"\0"
+    width = ROWS * 4
+    return [_key(prefix + bytes((band,)) + sig[band * width:(band + 1) * width]) for band in range(BANDS)]
+
+# ---- index -----------------------------------------------------------------
+class DuplicateIndex:
+    """SQLite-backed exact (title, description) and near-duplicate (LSH) index."""
+
+    def __init__(self, path: str = DUPES_DB) -> None:
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(f"""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            PRAGMA cache_size=-{DUPES_DB_CACHE_KB};
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                site TEXT NOT NULL,
+                title TEXT,
+                title_key INTEGER,
+                description TEXT,
+                description_key INTEGER,
+                minhash BLOB,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_title ON pages (site, title_key);
+            CREATE INDEX IF NOT EXISTS pages_description ON pages (site, description_key);
+            CREATE INDEX IF NOT EXISTS pages_updated ON pages (updated);
+            CREATE TABLE IF NOT EXISTS bands (
+                key INTEGER NOT NULL,
+                page_id INTEGER NOT NULL,
+                PRIMARY KEY (key, page_id)
+            ) WITHOUT ROWID;
+        """)
+        self._added = 0
+        self._pending: dict[str, tuple] = {}       # url -> (site, title, description, sig, time)
+        self._flushed = time.time()
+
+    def _transaction(self, fn, *args):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(*args)
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return out
+
+    def _drop_bands(self, page_id: int, site: str, sig: bytes | None) -> None:
+        # band keys are recomputed from the stored signature: no index on page_id needed
+        if sig:
+            self.db.executemany("DELETE FROM bands WHERE key = ? AND page_id = ?",
+                                [(k, page_id) for k in _band_keys(site, sig)])
+
+    def add(self, url: str, title: str, description: str, sig: bytes | None) -> None:
+        """
+        Index (or re-index) one page. Writes are batched: pending pages go
+        to disk together every _FLUSH_PAGES pages or _FLUSH_SECONDS, and
+        before any query.
+        """
+        now = time.time()
+        self._pending[url] = (site_of(url), title[:_TRIM], description[:_TRIM], sig, now)
+        if len(self._pending) >= _FLUSH_PAGES or now - self._flushed > _FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        self._flushed = time.time()
+
+        def run() -> None:
+            bands = []
+            for url, (site, title, description, sig, updated) in pending.items():
+                old = self.db.execute("SELECT id, site, minhash FROM pages WHERE url = ?", (url,)).fetchone()
+                unchanged = old is not None and old["minhash"] == sig
+                if old is not None and not unchanged:
+                    self._drop_bands(old["id"], old["site"], old["minhash"])
+                row = self.db.execute(
+                    "INSERT INTO pages (url, site, title, title_key, description, description_key, minhash, "
+                    "updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                    "title = excluded.title, title_key = excluded.title_key, description = excluded.description, "
+                    "description_key = excluded.description_key, minhash = excluded.minhash, "
+                    "updated = excluded.updated RETURNING id",
+                    (url, site, title, _text_key(title), description, _text_key(description), sig, updated),
+                ).fetchone()
+                if sig and not unchanged:
+                    bands += [(k, row["id"]) for k in _band_keys(site, sig)]
+            # in key order: neighbouring keys share B-tree pages within the batch
+            bands.sort()
+            self.db.executemany("INSERT OR IGNORE INTO bands (key, page_id) VALUES (?, ?)", bands)
+
+        self._transaction(run)
+        self._added += len(pending)
+        if self._added >= _EVICT_EVERY:
+            self._added = 0
+            self.evict()
+
+    def evict(self, max_pages: int = DUPES_MAX_PAGES) -> int:
+        """Drop the least recently indexed pages beyond max_pages (plus 1% headroom)."""
+        self.flush()
+        over = self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0] - max_pages
+        if over <= 0:
+            return 0
+        over += max_pages // 100
+
+        def run() -> int:
+            rows = self.db.execute("SELECT id, site, minhash FROM pages ORDER BY updated LIMIT ?",
+                                   (over,)).fetchall()
+            for r in rows:
+                self._drop_bands(r["id"], r["site"], r["minhash"])
+            self.db.executemany("DELETE FROM pages WHERE id = ?", [(r["id"],) for r in rows])
+            return len(rows)
+
+        return self._transaction(run)
+
+    def duplicates(self, url: str, limit: int = 100) -> dict | None:
+        """Pages of the same site sharing url's title or description, or with near-identical text."""
+        self.flush()
+        page = self.db.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+        if page is None:
+            return None
+        q = self.db.execute
+        out = {"url": url, "site": page["site"], "title": page["title"],
+               "meta_description": page["description"], "duplicate_title": [],
+               "duplicate_description": [], "near_duplicates": []}
+        for field, column in (("duplicate_title", "title_key"), ("duplicate_description", "description_key")):
+            if page[column] is not None:
+                out[field] = [r["url"] for r in q(
+                    f"SELECT url FROM pages WHERE site = ? AND {column} = ? AND id != ? ORDER BY id LIMIT ?",
+                    (page["site"], page[column], page["id"], limit))]
+        sig = page["minhash"]
+        if sig:
+            keys = _band_keys(page["site"], sig)
+            candidates = q(
+                f"SELECT DISTINCT p.url, p.minhash FROM bands b JOIN pages p ON p.id = b.page_id "
+                f"WHERE b.key IN ({','.join('?' * len(keys))}) AND b.page_id != ? LIMIT ?",
+                (*keys, page["id"], DUPES_MAX_CANDIDATES)).fetchall()
+            scores = similarities(sig, [c["minhash"] for c in candidates]) if candidates else []
+            near = sorted(((s, c["url"]) for s, c in zip(scores, candidates) if s >= DUPES_THRESHOLD),
+                          key=lambda x: (-x[0], x[1]))
+            out["near_duplicates"] = [{"url": u, "similarity": round(s, 3)} for s, u in near[:limit]]
+        return out
+
+    def site_report(self, site: str, limit: int = 100, max_pages: int = 50_000) -> dict:
+        """
+        Duplicate groups of one site, largest first: exact titles and
+        descriptions from the (site, key) indexes, and near-duplicate
+        clusters from the LSH buckets of its first max_pages pages.
+        """
+        self.flush()
+        site = site.lower().removeprefix("www.")
+        q = self.db.execute
+        out: dict = {"site": site, "pages": q("SELECT COUNT(*) FROM pages WHERE site = ?", (site,)).fetchone()[0]}
+        for field, text, column in (("duplicate_titles", "title", "title_key"),
+                                    ("duplicate_descriptions", "description", "description_key")):
+            groups = q(
+                f"SELECT {column} AS k, MIN({text}) AS text, COUNT(*) AS n FROM pages "
+                f"WHERE site = ? AND {column} IS NOT NULL GROUP BY {column} HAVING n > 1 "
+                f"ORDER BY n DESC LIMIT ?", (site, limit)).fetchall()
+            out[field] = [
+                {"text": g["text"], "pages": g["n"], "urls": [r["url"] for r in q(
+                    f"SELECT url FROM pages WHERE site = ? AND {column} = ? ORDER BY id LIMIT ?",
+                    (site, g["k"], limit))]}
+                for g in groups
+            ]
+        out["near_duplicate_clusters"] = self._clusters(site, limit, max_pages)
+        return out
+
+    def _clusters(self, site: str, limit: int, max_pages: int) -> list[dict]:
+        # union-find: each page is compared with the first page of every
+        # bucket it lands in and joined to it above the threshold
+        rows = self.db.execute("SELECT url, minhash FROM pages WHERE site = ? AND minhash IS NOT NULL "
+                               "ORDER BY id LIMIT ?", (site, max_pages)).fetchall()
+        parent = list(range(len(rows)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        first: dict[int, int] = {}
+        for i, r in enumerate(rows):
+            for k in _band_keys(site, r["minhash"]):
+                j = first.setdefault(k, i)
+                if j != i and find(i) != find(j) and similarity(r["minhash"], rows[j]["minhash"]) >= DUPES_THRESHOLD:
+                    parent[find(i)] = find(j)
+        groups: dict[int, list[str]] = {}
+        for i, r in enumerate(rows):
+            groups.setdefault(find(i), []).append(r["url"])
+        clusters = sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+        return [{"pages": len(g), "urls": g[:limit]} for g in clusters[:limit]]
+
+    def stats(self) -> dict:
+        self.flush()
+        return {"pages": self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+                "max_pages": DUPES_MAX_PAGES, "threshold": DUPES_THRESHOLD,
+                "bands": BANDS, "rows": ROWS}
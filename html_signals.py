@@ -0,0 +1,438 @@
+"""
+Single-pass extraction of the on-page SEO signals.
+
+SignalParser listens to html.parser token events and collects every field the
+analyzers report (title, meta description, h1s, canonical, robots, viewport,
+og:/twitter: tags, JSON-LD, word count) in one pass, without building a DOM.
+The same text goes through the AI agent detector (agents.py) as it is fed.
+
+It mirrors how BeautifulSoup's "html.parser" builder nests elements and
+groups text into strings, so the results match the soup queries the
+analyzers used before -- malformed markup included.
+"""
+import codecs, json, re
+from html.entities import html5
+from html.parser import HTMLParser
+
+from agents import detect_agents, matcher as agent_matcher
+
+# --- BeautifulSoup "html.parser" builder behaviour ------------------------
+_VOID = frozenset((
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed",
+    "frame", "hr", "image", "img", "input", "isindex", "keygen", "link",
+    "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr",
+))
+# text inside these becomes Script/Stylesheet/... strings, which get_text() skips
+_STRING_CONTAINERS = frozenset(("rt", "rp", "style", "script", "template"))
+_PRESERVE_WS = frozenset(("pre", "textarea"))
+# site chrome, left out of the collected body text (near-duplicate detection)
+_BOILERPLATE = frozenset(("nav", "header", "footer", "aside"))
+TEXT_MAX_CHARS = 60_000     # enough to tell pages apart; bounds the MinHash cost
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+_ENTITIES = {name.rstrip(";"): char for name, char in html5.items()}
+
+_OG      = re.compile(r"^og:", re.I)
+_TWITTER = re.compile(r"^twitter:", re.I)
+_JSONLD  = re.compile(r"application/ld\+json", re.I)
+
+# string kinds
+_TEXT, _CDATA, _OTHER = 0, 1, 2
+
+def _string(node: list | None) -> str | None:
+    """Tag.string: the only string below a chain of single-child elements."""
+    while node is not None and len(node) == 1:
+        child = node[0]
+        if isinstance(child, str):
+            return child
+        node = child
+    return None
+
+def _jsonld_types(data) -> list[str]:
+    types: list[str] = []
+    for d in (data if isinstance(data, list) else [data]):
+        t = d.get("@type") if isinstance(d, dict) else None
+        if isinstance(t, list): types += [str(x) for x in t]
+        elif t: types.append(str(t))
+    return types
+
+class SignalParser(HTMLParser):
+    """
+    Feed HTML text (all at once or in chunks), call close(), then result().
+
+    Elements are tracked on a stack of (name, node, h1 index) entries. Only
+    the first <title> and JSON-LD scripts keep a small child tree ("node"),
+    which is all Tag.string needs; everything else is counted on the fly.
+    """
+
+    def __init__(self, collect_links: bool = False, collect_text: bool = False) -> None:
+        super().__init__(convert_charrefs=False)
+        self._stack: list[tuple[str, list | None, int]] = []
+        self._open: dict[str, int] = {}
+        self._containers = 0
+        self._preserve = 0
+        self._boilerplate = 0
+        self._closed_void: list[str] = []
+        self._data: list[str] = []
+        self._open_h1: list[int] = []
+
+        self._title: list | None = None
+        self._desc: str | None = None
+        self._canonical_found = False
+        self._canonical: str | None = None
+        self._robots: str | None = None
+        self._jsonld: list[list] = []
+        self.h1: list[list[str]] = []
+        self.viewport = False
+        self.og_count = 0
+        self.twitter_count = 0
+        self.text_words = 0
+        self.head_done = False
+        self.first_h1_done = False
+        # raw (<a href>, lowercased rel) pairs in document order (crawler link graph)
+        self.links: list[tuple[str, str]] | None = [] if collect_links else None
+        # visible text outside _BOILERPLATE, up to TEXT_MAX_CHARS
+        self.text: list[str] | None = [] if collect_text else None
+        self._text_chars = 0
+        self._agents = agent_matcher().scanner()
+
+    @property
+    def head_complete(self) -> bool:
+        """</head> (or <body>) and the first </h1> have both been seen."""
+        return self.head_done and self.first_h1_done
+
+    # --- tokenizer events (same handling as BeautifulSoupHTMLParser) ------
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in _VOID:
+            self._end(tag)
+            self._closed_void.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.head_done = True
+        if tag in self._closed_void:
+            # redundant </br> etc. for a void element that is already closed
+            self._closed_void.remove(tag)
+        else:
+            self._end(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        code = int(name[1:], 16) if name.startswith(("x", "X")) else int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytes([code]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self._data.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        self._data.append(_ENTITIES.get(name, "&" + name))
+
+    def handle_comment(self, data):
+        self._flush()
+        self._data.append(data)
+        self._flush(_OTHER)
+
+    def handle_decl(self, data):
+        self._flush()
+        self._data.append(data[len("DOCTYPE "):])
+        self._flush(_OTHER)
+
+    def unknown_decl(self, data):
+        kind = _OTHER
+        if data.upper().startswith("CDATA["):
+            kind, data = _CDATA, data[len("CDATA["):]
+        self._flush()
+        self._data.append(data)
+        self._flush(kind)
+
+    def handle_pi(self, data):
+        self._flush()
+        self._data.append(data)
+        self._flush(_OTHER)
+
+    def feed(self, data):
+        self._agents.feed(data)
+        super().feed(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+        self._closed_void = []
+
+    # --- tree emulation ---------------------------------------------------
+    def _start(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._flush()
+        a: dict[str, str] = {}
+        for k, v in attrs:
+            a[k] = "" if v is None else v    # later duplicates win, as in bs4
+
+        parent = self._stack[-1][1] if self._stack else None
+        node = None
+        if parent is not None:
+            node = []
+            parent.append(node)
+        if tag == "title" and self._title is None:
+            node = self._title = node if node is not None else []
+        elif tag == "script" and _JSONLD.search(a.get("type") or ""):
+            node = node if node is not None else []
+            self._jsonld.append(node)
+
+        h1 = -1
+        if tag == "body":
+            self.head_done = True
+        elif tag == "h1":
+            h1 = len(self.h1)
+            self.h1.append([])
+            self._open_h1.append(h1)
+        elif tag == "meta":
+            name = a.get("name")
+            if name:
+                if self._desc is None and name == "description":
+                    self._desc = a.get("content", "")
+                if self._robots is None and name.lower() in ("robots", "googlebot"):
+                    self._robots = a.get("content") or ""
+                if name == "viewport":
+                    self.viewport = True
+        elif tag == "a" and self.links is not None:
+            href = a.get("href")
+            if href:
+                self.links.append((href, (a.get("rel") or "").lower()))
+        elif tag == "link" and not self._canonical_found:
+            rel = a.get("rel")
+            if rel and "canonical" in rel.lower():
+                self._canonical_found = True
+                self._canonical = a.get("href")
+
+        prop = a.get("property")
+        if prop is not None and _OG.search(prop):
+            self.og_count += 1
+        name = a.get("name")
+        if name is not None and _TWITTER.search(name):
+            self.twitter_count += 1
+
+        self._stack.append((tag, node, h1))
+        self._open[tag] = self._open.get(tag, 0) + 1
+        if tag in _STRING_CONTAINERS:
+            self._containers += 1
+        if tag in _PRESERVE_WS:
+            self._preserve += 1
+        if tag in _BOILERPLATE:
+            self._boilerplate += 1
+
+    def _end(self, tag: str) -> None:
+        # close the most recent open <tag> and everything opened after it;
+        # stray end tags are ignored
+        self._flush()
+        if not self._open.get(tag):
+            return
+        while self._stack:
+            name, _, h1 = self._stack.pop()
+            self._open[name] -= 1
+            if name in _STRING_CONTAINERS:
+                self._containers -= 1
+            if name in _PRESERVE_WS:
+                self._preserve -= 1
+            if name in _BOILERPLATE:
+                self._boilerplate -= 1
+            if h1 >= 0:
+                self._open_h1.pop()
+                if h1 == 0:
+                    self.first_h1_done = True
+            if name == tag:
+                break
+
+    def _flush(self, kind: int = _TEXT) -> None:
+        if not self._data:
+            return
+        s = "".join(self._data)
+        self._data = []
+        if not self._preserve and not s.strip(_ASCII_SPACES):
+            s = "\n" if "\n" in s else " "
+        node = self._stack[-1][1] if self._stack else None
+        if node is not None:
+            node.append(s)
+        if kind == _OTHER or (kind == _TEXT and self._containers):
+            return
+        self.text_words += len(s.split())
+        if self.text is not None and not self._boilerplate and self._text_chars < TEXT_MAX_CHARS:
+            self.text.append(s)
+            self._text_chars += len(s)
+        if self._open_h1:
+            piece = s.strip()
+            if piece:
+                for i in self._open_h1:
+                    self.h1[i].append(piece)
+
+    # --- output -----------------------------------------------------------
+    def result(self) -> dict:
+        """
+        Raw signals. canonical is the href as written; jsonld_count counts
+        every JSON-LD block and jsonld_valid only the ones that parsed.
+        """
+        title = (_string(self._title) or "").strip() if self._title is not None else ""
+        desc = self._desc or ""
+        robots = self._robots.lower() if self._robots else ""
+
+        jsonld_valid = 0
+        jsonld_types: list[str] = []
+        for node in self._jsonld:
+            try:
+                data = json.loads(_string(node) or "{}")
+            except Exception:
+                continue        # ignore malformed blocks
+            jsonld_valid += 1
+            jsonld_types += _jsonld_types(data)
+
+        return {
+            "title": title,
+            "meta_description": desc,
+            "h1": ["".join(pieces) for pieces in self.h1],
+            "canonical": self._canonical,
+            "robots": robots,
+            "noindex": "noindex" in robots,
+            "nofollow": "nofollow" in robots,
+            "viewport": self.viewport,
+            "og_count": self.og_count,
+            "twitter_count": self.twitter_count,
+            "jsonld_count": len(self._jsonld),
+            "jsonld_valid": jsonld_valid,
+            "jsonld_types": jsonld_types,
+            "text_words": self.text_words,
+            "ai_agents": self._agents.result(),
+        }
+
+# --- byte streams ----------------------------------------------------------
+SNIFF_BYTES = 1024      # prescan window for <meta charset>, as in the HTML spec
+
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+_META_CHARSET = re.compile(rb"""<meta[^>]*?charset\s*=\s*["']?\s*([\w.:-]+)""", re.I)
+
+def _codec(name: str | None) -> str | None:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def sniff_charset(prefix: bytes) -> str | None:
+    """Encoding declared by <meta charset> / http-equiv in the first SNIFF_BYTES."""
+    m = _META_CHARSET.search(prefix[:SNIFF_BYTES])
+    name = _codec(m.group(1).decode("ascii", "replace")) if m else None
+    # markup we could read as ASCII is not really UTF-16
+    return "utf-8" if name and name.startswith("utf-16") else name
+
+def detect_charset(prefix: bytes, declared: str | None = None) -> str:
+    """BOM, then the declared (Content-Type) charset, then <meta charset>, then UTF-8."""
+    return (next((name for bom, name in _BOMS if prefix.startswith(bom)), None)
+            or _codec(declared) or sniff_charset(prefix) or "utf-8")
+
+def decode_document(data: bytes, charset: str | None = None) -> str:
+    """A whole document as text, with the same charset rules as StreamingExtractor."""
+    return data.decode(detect_charset(data[:SNIFF_BYTES], charset), "replace")
+
+class StreamingExtractor:
+    """
+    Byte front end for SignalParser. Chunks go through an incremental
+    decoder straight into the parser as they arrive, so parsing overlaps the
+    download and the extractor holds neither the raw body nor the decoded
+    document (a caller that may re-parse the bytes elsewhere keeps its own).
+
+    Charset precedence: BOM, then the Content-Type charset, then a
+    <meta charset> sniffed from the first SNIFF_BYTES, then UTF-8.
+    """
+
+    def __init__(self, charset: str | None = None, collect_links: bool = False,
+                 collect_text: bool = False) -> None:
+        self.parser = SignalParser(collect_links, collect_text)
+        self.charset = _codec(charset)
+        self.bytes_read = 0
+        self._decoder = None
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> None:
+        self.bytes_read += len(chunk)
+        if self._decoder is None:
+            self._pending += chunk
+            if len(self._pending) < SNIFF_BYTES:
+                return
+            chunk, self._pending = self._pending, b""
+            self._start(chunk)
+        self.parser.feed(self._decoder.decode(chunk))
+
+    def _start(self, prefix: bytes) -> None:
+        self.charset = detect_charset(prefix, self.charset)
+        self._decoder = codecs.getincrementaldecoder(self.charset)(errors="replace")
+
+    def close(self) -> dict:
+        tail, self._pending = self._pending, b""
+        if self._decoder is None:
+            self._start(tail)
+        self.parser.feed(self._decoder.decode(tail, final=True))
+        self.parser.close()
+        return self.parser.result()
+
+def extract_signals(html: str) -> dict:
+    parser = SignalParser()
+    parser.feed(html)
+    parser.close()
+    return parser.result()
+
+def extract_signals_soup(html: str) -> dict:
+    """
+    Reference implementation on a BeautifulSoup tree: the queries the
+    analyzers ran before SignalParser. Kept for parity checks; not used on
+    the request path.
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = (soup.title.string or "").strip() if soup.title and soup.title.string else ""
+    desc  = (soup.find("meta", attrs={"name":"description"}) or {}).get("content","") or ""
+    h1s   = [h.get_text(strip=True) for h in soup.find_all("h1")]
+    can   = soup.find("link", rel=lambda v: v and "canonical" in v.lower())
+    robots_tag = soup.find("meta", attrs={"name": lambda v: v and v.lower() in ("robots","googlebot")})
+    robots = (robots_tag.get("content") or "").lower() if robots_tag else ""
+
+    jsonld_nodes = soup.find_all("script", attrs={"type": _JSONLD})
+    jsonld_valid = 0
+    jsonld_types: list[str] = []
+    for node in jsonld_nodes:
+        try:
+            data = json.loads(node.string or "{}")
+        except Exception:
+            continue
+        jsonld_valid += 1
+        jsonld_types += _jsonld_types(data)
+
+    return {
+        "title": title,
+        "meta_description": desc,
+        "h1": h1s,
+        "canonical": can.get("href") if can else None,
+        "robots": robots,
+        "noindex": "noindex" in robots,
+        "nofollow": "nofollow" in robots,
+        "viewport": bool(soup.find("meta", attrs={"name":"viewport"})),
+        "og_count": len(soup.find_all(attrs={"property": _OG})),
+        "twitter_count": len(soup.find_all(attrs={"name": _TWITTER})),
+        "jsonld_count": len(jsonld_nodes),
+        "jsonld_valid": jsonld_valid,
+        "jsonld_types": jsonld_types,
+        "text_words": len((soup.get_text(" ", strip=True) or "").split()),
+        "ai_agents": detect_agents(html),
+    }
@@ -0,0 +1,128 @@
+"""
+Per-request stage timings and process-wide counters, exposed as a
+Server-Timing header and in Prometheus text format.
+
+A request opens a timing scope with `request()`; code on the hot path
+calls `record(stage, seconds)` or wraps work in `stage(name)`. Each record
+lands in the scope (for Server-Timing) and in a latency histogram. Tasks
+spawned inside a scope inherit it through the context, so a coalesced
+fetch reports into the request that started it.
+
+METRICS=0 turns everything into no-ops. Values are per process; with
+several workers each one exposes its own.
+"""
+import os, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_ENABLED = os.getenv("METRICS", "1") not in ("0", "false", "no")
+
+# seconds; Prometheus "le" upper bounds (+Inf is implicit)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+_stages: dict[str, Histogram] = {}
+_counters: dict[tuple[str, str, str], int] = {}     # (metric, label, value) -> count
+_scope: ContextVar[dict | None] = ContextVar("timings", default=None)
+
+def record(name: str, seconds: float) -> None:
+    if not METRICS_ENABLED:
+        return
+    hist = _stages.get(name)
+    if hist is None:
+        hist = _stages[name] = Histogram()
+    hist.observe(seconds)
+    scope = _scope.get()
+    if scope is not None:
+        scope[name] = scope.get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name: str):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t)
+
+def count(metric: str, label: str, value: object) -> None:
+    if METRICS_ENABLED:
+        key = (metric, label, str(value))
+        _counters[key] = _counters.get(key, 0) + 1
+
+def note(key: str, value: str) -> None:
+    """Attach a description to the current scope (e.g. cache=hit)."""
+    scope = _scope.get()
+    if scope is not None:
+        scope[key] = value
+
+@contextmanager
+def request():
+    """Timing scope for one request; yields its stage dict (None when disabled)."""
+    if not METRICS_ENABLED:
+        yield None
+        return
+    start = time.perf_counter()
+    scope: dict = {"_start": start}
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+        record("total", time.perf_counter() - start)
+
+def server_timing(scope: dict | None) -> str | None:
+    """Server-Timing value for a scope: its stages so far plus total."""
+    if not scope:
+        return None
+    parts = []
+    for name, value in scope.items():
+        if name.startswith("_"):
+            continue
+        if isinstance(value, float):
+            parts.append(f"{name};dur={value * 1e3:.1f}")
+        else:
+            parts.append(f'{name};desc="{value}"')
+    parts.append(f"total;dur={(time.perf_counter() - scope['_start']) * 1e3:.1f}")
+    return ", ".join(parts)
+
+# ---- exposition ------------------------------------------------------------
+def _fmt(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(gauges: dict[str, float] | None = None) -> str:
+    """Prometheus text format (version 0.0.4)."""
+    lines = [
+        "# HELP seo_stage_seconds Time spent per analyze stage.",
+        "# TYPE seo_stage_seconds histogram",
+    ]
+    for name, hist in sorted(_stages.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), hist.counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else _fmt(bound)
+            lines.append(f'seo_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'seo_stage_seconds_sum{{stage="{name}"}} {_fmt(hist.sum)}')
+        lines.append(f'seo_stage_seconds_count{{stage="{name}"}} {hist.count}')
+    typed: set[str] = set()
+    for (metric, label, value), n in sorted(_counters.items()):
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f'{metric}{{{label}="{value}"}} {n}')
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
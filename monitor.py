@@ -0,0 +1,322 @@
+"""
+Scheduled monitoring: registered URLs are re-scanned through the analyze
+pipeline every `interval` seconds and their results kept as a time series.
+
+The schedule is the `next_due` column of the monitors table. Its index
+serves as the priority queue, so memory stays flat with hundreds of thousands
+of monitors and the schedule survives restarts. Due monitors are claimed
+in one UPDATE that pushes their `next_due` out by a lease. Several workers
+on one database therefore never scan the same URL twice, and a scan lost
+to a crash runs again once its lease lapses. Each interval is jittered
+so that monitors registered together drift apart.
+
+Snapshots are stored run-length encoded: a row per distinct result (score,
+status and a digest of the response body), with the time it was first and
+last seen and how many scans confirmed it. An unchanged page costs an
+UPDATE, not a row.
+"""
+import asyncio, os, random, sqlite3, threading, time
+from collections.abc import Awaitable, Callable
+
+MONITOR_DB           = os.getenv("MONITOR_DB", "monitors.sqlite3")
+MONITOR_CONCURRENCY  = int(os.getenv("MONITOR_CONCURRENCY", "16"))       # scans in flight, per process
+MONITOR_JITTER       = float(os.getenv("MONITOR_JITTER", "0.1"))         # +/- fraction of the interval
+MONITOR_MIN_INTERVAL = float(os.getenv("MONITOR_MIN_INTERVAL", "300"))
+MONITOR_LEASE        = float(os.getenv("MONITOR_LEASE", "600"))          # claimed but unfinished: rerun after
+MONITOR_RETENTION    = float(os.getenv("MONITOR_RETENTION_DAYS", "400")) * 86400
+MONITOR_IDLE_POLL    = 5.0       # longest sleep; other workers may register monitors
+_CLAIM_BATCH         = 256
+_PRUNE_EVERY         = 3600
+
+def _digest(etag: str | None) -> int | None:
+    # 60 bits of the response ETag: fits an SQLite integer, enough to spot a change
+    return int(etag.strip('"')[:15], 16) if etag else None
+
+def jittered(interval: float) -> float:
+    return interval * random.uniform(1 - MONITOR_JITTER, 1 + MONITOR_JITTER)
+
+# ---- persistent state ----------------------------------------------------
+class MonitorStore:
+    """SQLite-backed monitors (the schedule) and their snapshot runs."""
+
+    def __init__(self, path: str = MONITOR_DB) -> None:
+        self.path = path
+        self._local = threading.local()
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS monitors (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                interval REAL NOT NULL,
+                head_only INTEGER NOT NULL DEFAULT 0,
+                next_due REAL NOT NULL,
+                created REAL NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,      -- consecutive
+                last_run REAL,
+                last_status INTEGER,
+                last_score INTEGER,
+                last_digest INTEGER,
+                last_since INTEGER                        -- key (ts) of the open snapshot run
+            );
+            CREATE INDEX IF NOT EXISTS monitors_due ON monitors (next_due);
+            CREATE TABLE IF NOT EXISTS snapshots (
+                monitor_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,                      -- first seen
+                until INTEGER NOT NULL,                   -- last seen
+                scans INTEGER NOT NULL,
+                status INTEGER,
+                score INTEGER,
+                digest INTEGER,
+                PRIMARY KEY (monitor_id, ts)
+            ) WITHOUT ROWID;
+        """)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """
+        This thread's connection. The scheduler writes from the event loop and
+        the endpoints run in the threadpool; separate connections keep their
+        transactions apart.
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA busy_timeout=5000;
+            """)
+        return db
+
+    def _transaction(self, fn, *args):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(*args)
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return out
+
+    def register(self, urls: list[str], interval: float, head_only: bool) -> list[dict]:
+        """
+        Add monitors, first due somewhere in the next jitter window. A URL
+        already monitored keeps its place in the schedule; its interval and
+        mode are updated.
+        """
+        now = time.time()
+
+        def run() -> list[dict]:
+            out = []
+            for url in urls:
+                row = self.db.execute(
+                    "INSERT INTO monitors (url, interval, head_only, next_due, created) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                    "interval = excluded.interval, head_only = excluded.head_only "
+                    "RETURNING id, url, next_due",
+                    (url, interval, head_only, now + random.uniform(0, interval * MONITOR_JITTER), now),
+                ).fetchone()
+                out.append(dict(row))
+            return out
+
+        return self._transaction(run)
+
+    def get(self, monitor_id: int) -> dict | None:
+        row = self.db.execute("SELECT * FROM monitors WHERE id = ?", (monitor_id,)).fetchone()
+        return _monitor(row) if row else None
+
+    def monitors(self, offset: int = 0, limit: int = 100) -> list[dict]:
+        rows = self.db.execute("SELECT * FROM monitors ORDER BY id LIMIT ? OFFSET ?", (limit, offset))
+        return [_monitor(r) for r in rows]
+
+    def delete(self, monitor_id: int) -> bool:
+        def run() -> bool:
+            self.db.execute("DELETE FROM snapshots WHERE monitor_id = ?", (monitor_id,))
+            return self.db.execute("DELETE FROM monitors WHERE id = ?", (monitor_id,)).rowcount > 0
+        return self._transaction(run)
+
+    def claim(self, now: float, limit: int) -> list[sqlite3.Row]:
+        """Take up to `limit` due monitors, most overdue first, leasing them for MONITOR_LEASE."""
+        return self.db.execute(
+            "UPDATE monitors SET next_due = ? WHERE id IN ("
+            "  SELECT id FROM monitors WHERE next_due <= ? ORDER BY next_due LIMIT ?) "
+            "RETURNING id, url, interval, head_only",
+            (now + MONITOR_LEASE, now, limit),
+        ).fetchall()
+
+    def next_due(self) -> float | None:
+        return self.db.execute("SELECT MIN(next_due) FROM monitors").fetchone()[0]
+
+    def reschedule(self, monitor_id: int, due: float) -> None:
+        self.db.execute("UPDATE monitors SET next_due = ? WHERE id = ?", (due, monitor_id))
+
+    def record(self, monitor_id: int, now: float, next_due: float, status: int | None,
+               score: int | None = None, digest: int | None = None) -> None:
+        """Store one scan: extend the open snapshot run if nothing changed, else start a new one."""
+        ts = int(now)
+
+        def run() -> None:
+            m = self.db.execute(
+                "SELECT last_status, last_score, last_digest, last_since FROM monitors WHERE id = ?",
+                (monitor_id,)).fetchone()
+            if m is None:
+                return                  # deleted while scanning
+            since = m["last_since"]
+            same = (m["last_status"], m["last_score"], m["last_digest"]) == (status, score, digest)
+            # the open run may have been pruned; then a new one starts
+            if not (since is not None and same and self.db.execute(
+                    "UPDATE snapshots SET until = MAX(until, ?), scans = scans + 1 "
+                    "WHERE monitor_id = ? AND ts = ?", (ts, monitor_id, since)).rowcount):
+                since = max(ts, (since or 0) + 1)   # keys stay unique within a second
+                self.db.execute(
+                    "INSERT INTO snapshots (monitor_id, ts, until, scans, status, score, digest) "
+                    "VALUES (?, ?, ?, 1, ?, ?, ?)", (monitor_id, since, since, status, score, digest))
+            ok = score is not None
+            self.db.execute(
+                "UPDATE monitors SET next_due = ?, runs = runs + 1, "
+                "failures = CASE WHEN ? THEN 0 ELSE failures + 1 END, last_run = ?, "
+                "last_status = ?, last_score = ?, last_digest = ?, last_since = ? WHERE id = ?",
+                (next_due, ok, now, status, score, digest, since, monitor_id))
+
+        self._transaction(run)
+
+    def history(self, monitor_id: int, since: float | None = None, until: float | None = None,
+                limit: int = 1000) -> list[dict]:
+        """Snapshot runs overlapping [since, until], newest first."""
+        rows = self.db.execute(
+            "SELECT ts, until, scans, status, score, digest FROM snapshots "
+            "WHERE monitor_id = ? AND ts <= ? AND until >= ? ORDER BY ts DESC LIMIT ?",
+            (monitor_id, until if until is not None else 2 ** 62, since or 0, limit))
+        return [
+            {"from": r["ts"], "to": r["until"], "scans": r["scans"], "status": r["status"],
+             "score": r["score"], "digest": f"{r['digest']:015x}" if r["digest"] is not None else None}
+            for r in rows
+        ]
+
+    def prune(self, before: float) -> int:
+        return self.db.execute("DELETE FROM snapshots WHERE until < ?", (int(before),)).rowcount
+
+    def stats(self, now: float) -> dict:
+        q = self.db.execute
+        total = q("SELECT COUNT(*) FROM monitors").fetchone()[0]
+        due, oldest = q("SELECT COUNT(*), MIN(next_due) FROM monitors WHERE next_due <= ?", (now,)).fetchone()
+        failing = q("SELECT COUNT(*) FROM monitors WHERE failures > 0").fetchone()[0]
+        return {"monitors": total, "due": due, "failing": failing,
+                "lag": round(now - oldest, 1) if oldest is not None else 0.0}
+
+def _monitor(row: sqlite3.Row) -> dict:
+    m = dict(row)
+    m["head_only"] = bool(m["head_only"])
+    m["last_digest"] = f"{m['last_digest']:015x}" if m["last_digest"] is not None else None
+    del m["last_since"]
+    return m
+
+# ---- scheduler -----------------------------------------------------------
+Scan = Callable[[str, bool], Awaitable[dict]]
+
+class Scheduler:
+    """
+    Background task that runs due monitors, at most MONITOR_CONCURRENCY at
+    a time. `scan(url, head_only)` is the service's analyze pipeline and
+    returns its cache entry ({"payload", "response_etag", ...}).
+    """
+
+    def __init__(self, store: MonitorStore, scan: Scan) -> None:
+        self.store = store
+        self.scan = scan
+        self.scans = 0
+        self.errors = 0
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._inflight: dict[asyncio.Task, int] = {}     # scan task -> monitor id
+        self._wake = asyncio.Event()
+        self._pruned = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self) -> None:
+        """Re-read the schedule now (after a registration); callable from any thread."""
+        if self._loop is None:
+            self._wake.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def shutdown(self) -> None:
+        # _done empties _inflight as the cancelled scans finish: note their ids
+        # first (a scan that already finished has recorded its next run)
+        cancelled = [monitor_id for task, monitor_id in self._inflight.items() if task.cancel()]
+        tasks = [t for t in (self._task, *self._inflight) if t]
+        if self._task:
+            self._task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # cancelled scans are due again right away instead of after their lease
+        for monitor_id in cancelled:
+            self.store.reschedule(monitor_id, time.time())
+        self._inflight.clear()
+        self._task = self._loop = None
+
+    def stats(self) -> dict:
+        return {**self.store.stats(time.time()), "in_flight": len(self._inflight),
+                "concurrency": MONITOR_CONCURRENCY, "scans": self.scans, "errors": self.errors}
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            now = time.time()
+            if now - self._pruned > _PRUNE_EVERY:
+                self.store.prune(now - MONITOR_RETENTION)
+                self._pruned = now
+            free = MONITOR_CONCURRENCY - len(self._inflight)
+            if free > 0:
+                want = min(free, _CLAIM_BATCH)
+                claimed = self.store.claim(now, want)
+                for row in claimed:
+                    task = asyncio.create_task(
+                        self._scan(row["id"], row["url"], row["interval"], bool(row["head_only"])))
+                    self._inflight[task] = row["id"]
+                    task.add_done_callback(self._done)
+                if len(claimed) == want < free:
+                    continue                # a full batch and free slots: more may be due
+            # sleep until the next monitor is due, a scan finishes or someone registers
+            delay = MONITOR_IDLE_POLL
+            if len(self._inflight) < MONITOR_CONCURRENCY:
+                due = self.store.next_due()
+                if due is not None:
+                    delay = min(max(due - time.time(), 0.0), delay)
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except TimeoutError:
+                    pass
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._inflight.pop(task, None)
+        self._wake.set()
+
+    async def _scan(self, monitor_id: int, url: str, interval: float, head_only: bool) -> None:
+        try:
+            entry = await self.scan(url, head_only)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # HTTPException from the pipeline carries the upstream status
+            self.errors += 1
+            headers = getattr(e, "headers", None) or {}
+            if "Retry-After" in headers:
+                # our own backpressure (rate limit, open circuit, busy parser):
+                # try again later without recording a result
+                retry = float(headers["Retry-After"]) * random.uniform(1, 1 + MONITOR_JITTER)
+                self.store.reschedule(monitor_id, time.time() + min(retry, interval))
+                return
+            now = time.time()
+            self.store.record(monitor_id, now, now + jittered(interval), getattr(e, "status_code", None))
+            return
+        self.scans += 1
+        now = time.time()
+        payload = entry["payload"]
+        self.store.record(monitor_id, now, now + jittered(interval), payload["status"],
+                          payload["score"], _digest(entry.get("response_etag")))
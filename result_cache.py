@@ -0,0 +1,335 @@
+"""
+Result cache backends for /api/analyze.
+
+Entries are fresh for `ttl` seconds, then servable-but-stale for a further
+`stale` seconds while the caller revalidates in the background. Leases let
+one fetch fill a key while others wait for it; with the SQLite backend both
+the entries and the leases are shared by every worker process on the host.
+
+Pick the backend with RESULT_CACHE=memory (default) or RESULT_CACHE=sqlite.
+The memory backend is bounded by RESULT_CACHE_BYTES, the SQLite one by
+RESULT_CACHE_SIZE entries.
+
+The server calls the async methods (aget, aset, ...). For memory they run
+inline; the SQLite backend runs each call in a worker thread, so disk I/O
+and lock waits never stall the event loop.
+"""
+import asyncio, json, os, sqlite3, sys, threading, time, zlib
+from collections import OrderedDict
+from itertools import islice
+
+RESULT_CACHE       = os.getenv("RESULT_CACHE", "memory")
+RESULT_CACHE_PATH  = os.getenv("RESULT_CACHE_PATH", "results.sqlite3")
+RESULT_CACHE_SIZE  = int(os.getenv("RESULT_CACHE_SIZE", "50000"))    # entries (sqlite)
+RESULT_CACHE_TTL   = float(os.getenv("RESULT_CACHE_TTL", "900"))
+RESULT_CACHE_STALE = float(os.getenv("RESULT_CACHE_STALE", "3600"))  # served while revalidating
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES", str(256 * 1024 * 1024)))            # memory
+RESULT_CACHE_HOT_BYTES = int(os.getenv("RESULT_CACHE_HOT_BYTES", str(RESULT_CACHE_BYTES // 4)))  # kept live
+
+class ResultCache:
+    """Backend interface. Values are JSON-serializable dicts."""
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, stale: float = RESULT_CACHE_STALE) -> None:
+        self.ttl = ttl
+        self.stale = stale
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> tuple[dict, bool] | None:
+        """(value, fresh) or None when missing or past the stale window."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict) -> None:
+        raise NotImplementedError
+
+    def lease(self, key: str, seconds: float) -> bool:
+        """Try to become the one filler of `key` for up to `seconds`."""
+        raise NotImplementedError
+
+    def release(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Hit/miss counts of this process plus backend-specific sizes."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None}
+
+    # the event loop's entry points; backends that block override these
+
+    async def aget(self, key: str) -> tuple[dict, bool] | None:
+        return self.get(key)
+
+    async def aset(self, key: str, value: dict) -> None:
+        self.set(key, value)
+
+    async def alease(self, key: str, seconds: float) -> bool:
+        return self.lease(key, seconds)
+
+    async def arelease(self, key: str) -> None:
+        self.release(key)
+
+    async def astats(self) -> dict:
+        return self.stats()
+
+_STR_SIZE = sys.getsizeof("")      # str header; ASCII text adds a byte per char
+
+def _footprint(obj) -> int:
+    """Approximate bytes held by a JSON-like value, containers included."""
+    if isinstance(obj, str):
+        return _STR_SIZE + len(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(map(_footprint, obj.values()))
+    if isinstance(obj, list):
+        if obj and type(obj[0]) is str:
+            # lists in a payload hold strings (h1, jsonld_types, ...): sized in C
+            return sys.getsizeof(obj) + _STR_SIZE * len(obj) + sum(map(len, obj))
+        return sys.getsizeof(obj) + sum(map(_footprint, obj))
+    if obj is None or obj is True or obj is False:
+        return 0                    # shared singletons
+    return sys.getsizeof(obj)
+
+class MemoryCache(ResultCache):
+    """
+    Per-process cache bounded by bytes, not entries. Recently used values
+    stay live ("hot", sized by _footprint); past `max_hot` bytes the least
+    recently used are stored as zlib'd JSON ("cold") and inflated on their
+    next hit. Over `max_bytes` in total, the largest of the _EVICT_SAMPLE
+    coldest entries is dropped first, so one huge result costs its own
+    slot rather than dozens of small ones. Leases only coordinate within
+    the process.
+    """
+
+    _EVICT_SAMPLE = 8
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_BYTES, max_hot: int = RESULT_CACHE_HOT_BYTES,
+                 **kw) -> None:
+        super().__init__(**kw)
+        self.max_bytes = max_bytes
+        self.max_hot = min(max_hot, max_bytes)
+        self._hot: OrderedDict[str, tuple[float, dict, int]] = OrderedDict()   # key -> (created, value, size)
+        self._cold: OrderedDict[str, tuple[float, bytes]] = OrderedDict()     # key -> (created, zlib'd JSON)
+        self._hot_bytes = 0
+        self._cold_bytes = 0
+        self.evictions = 0
+        self.compressions = 0
+        self.inflations = 0
+        self._leases: dict[str, float] = {}
+
+    def get(self, key: str) -> tuple[dict, bool] | None:
+        hot = self._hot.get(key)
+        cold = self._cold.get(key) if hot is None else None
+        if hot is None and cold is None:
+            self.misses += 1
+            return None
+        created = (hot or cold)[0]
+        age = time.time() - created
+        if age > self.ttl + self.stale:
+            self._discard(key)
+            self.misses += 1
+            return None
+        if hot is not None:
+            self._hot.move_to_end(key)
+            value = hot[1]
+        else:
+            # back to the hot end; the coldest hot entries make room
+            self._discard(key)
+            value = json.loads(zlib.decompress(cold[1]))
+            self.inflations += 1
+            self._put(key, created, value)
+        self.hits += 1
+        return value, age <= self.ttl
+
+    def set(self, key: str, value: dict) -> None:
+        self._discard(key)
+        self._put(key, time.time(), value)
+
+    def _put(self, key: str, created: float, value: dict) -> None:
+        size = _footprint(value)
+        self._hot[key] = (created, value, size)
+        self._hot_bytes += size
+        while self._hot_bytes > self.max_hot and self._hot:
+            k, (c, v, s) = self._hot.popitem(last=False)
+            self._hot_bytes -= s
+            blob = zlib.compress(json.dumps(v, ensure_ascii=False, separators=(",", ":")).encode())
+            self._cold[k] = (c, blob)
+            self._cold_bytes += len(blob)
+            self.compressions += 1
+        while self._hot_bytes + self._cold_bytes > self.max_bytes and self._cold:
+            victim = max(islice(self._cold, self._EVICT_SAMPLE), key=lambda k: len(self._cold[k][1]))
+            self._discard(victim)
+            self.evictions += 1
+
+    def _discard(self, key: str) -> None:
+        hot = self._hot.pop(key, None)
+        if hot is not None:
+            self._hot_bytes -= hot[2]
+        cold = self._cold.pop(key, None)
+        if cold is not None:
+            self._cold_bytes -= len(cold[1])
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "backend": "memory",
+            "entries": len(self._hot) + len(self._cold),
+            "hot_entries": len(self._hot),
+            "cold_entries": len(self._cold),
+            "bytes": self._hot_bytes + self._cold_bytes,
+            "hot_bytes": self._hot_bytes,
+            "cold_bytes": self._cold_bytes,
+            "max_bytes": self.max_bytes,
+            "max_hot_bytes": self.max_hot,
+            "evictions": self.evictions,
+            "compressions": self.compressions,
+            "inflations": self.inflations,
+        }
+
+    def lease(self, key: str, seconds: float) -> bool:
+        now = time.time()
+        if self._leases.get(key, 0) > now:
+            return False
+        self._leases[key] = now + seconds
+        return True
+
+    def release(self, key: str) -> None:
+        self._leases.pop(key, None)
+
+    def clear(self) -> None:
+        self._hot.clear()
+        self._cold.clear()
+        self._hot_bytes = self._cold_bytes = 0
+        self._leases.clear()
+
+class SQLiteCache(ResultCache):
+    """
+    On-disk cache shared by all workers on the host (WAL mode, so readers
+    never block). Any SQLite error degrades to a miss rather than failing
+    the request. The file is opened on first use, one connection per
+    thread; the async methods run in asyncio's default executor.
+    """
+
+    _PRUNE_EVERY = 500     # sets between size/expiry sweeps
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, maxsize: int = RESULT_CACHE_SIZE, **kw) -> None:
+        super().__init__(**kw)
+        self.path = path
+        self.maxsize = maxsize
+        self._sets = 0
+        self._local = threading.local()
+        self._schema = threading.Lock()
+        self._ready = False
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=1.0)
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._schema:
+                if not self._ready:
+                    self._create(db)
+                    self._ready = True
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _create(db: sqlite3.Connection) -> None:
+        db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_created ON entries (created);
+            CREATE TABLE IF NOT EXISTS leases (
+                key TEXT PRIMARY KEY,
+                expires REAL NOT NULL
+            );
+        """)
+
+    def get(self, key: str) -> tuple[dict, bool] | None:
+        try:
+            row = self.db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            row = None
+        age = time.time() - row[1] if row is not None else None
+        if age is None or age > self.ttl + self.stale:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), age <= self.ttl
+
+    def set(self, key: str, value: dict) -> None:
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            self._sets += 1
+            if self._sets % self._PRUNE_EVERY == 0:
+                self._prune()
+        except sqlite3.Error:
+            pass
+
+    def _prune(self) -> None:
+        self.db.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl - self.stale,))
+        self.db.execute(
+            "DELETE FROM entries WHERE created < (SELECT created FROM entries "
+            "ORDER BY created DESC LIMIT 1 OFFSET ?)", (self.maxsize,))
+        self.db.execute("DELETE FROM leases WHERE expires < ?", (time.time(),))
+
+    def lease(self, key: str, seconds: float) -> bool:
+        now = time.time()
+        try:
+            self.db.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+            return self.db.execute(
+                "INSERT OR IGNORE INTO leases (key, expires) VALUES (?, ?)", (key, now + seconds),
+            ).rowcount == 1
+        except sqlite3.Error:
+            return True        # cannot coordinate; fetch rather than wait
+
+    def release(self, key: str) -> None:
+        try:
+            self.db.execute("DELETE FROM leases WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+
+    def clear(self) -> None:
+        self.db.execute("DELETE FROM entries")
+        self.db.execute("DELETE FROM leases")
+
+    def stats(self) -> dict:
+        try:
+            entries, size = self.db.execute(
+                "SELECT count(*), coalesce(sum(length(value)), 0) FROM entries").fetchone()
+        except sqlite3.Error:
+            entries = size = None
+        return {**super().stats(), "backend": "sqlite", "entries": entries, "bytes": size,
+                "max_entries": self.maxsize}
+
+    async def aget(self, key: str) -> tuple[dict, bool] | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: dict) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    async def alease(self, key: str, seconds: float) -> bool:
+        return await asyncio.to_thread(self.lease, key, seconds)
+
+    async def arelease(self, key: str) -> None:
+        await asyncio.to_thread(self.release, key)
+
+    async def astats(self) -> dict:
+        return await asyncio.to_thread(self.stats)
+
+def make_cache(kind: str = RESULT_CACHE) -> ResultCache:
+    if kind == "memory":
+        return MemoryCache()
+    if kind == "sqlite":
+        return SQLiteCache()
+    raise ValueError(f"Unknown RESULT_CACHE backend: {kind!r}")
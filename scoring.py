@@ -0,0 +1,201 @@
+"""
+SEO scoring rules, declared once and compiled two ways:
+
+- score(payload) -> (score, recommendations): a Python function generated
+  from RULES for single results (/api/analyze, /api/analyze_html, crawls);
+- score_columns(columns) -> (scores, hits): NumPy, re-scores a columnar
+  batch of stored extraction results in one call without re-fetching or
+  re-parsing anything.
+
+Rules in the same group are alternatives: the first one that matches
+applies and the rest of the group is skipped (title missing / short / long).
+Bump RULES_VERSION whenever a rule or the payload changes; memoized and
+cached results key on it.
+"""
+from typing import NamedTuple
+
+RULES_VERSION = 3           # 3: ai_agents in the payload
+
+class Rule(NamedTuple):
+    id: str
+    group: str
+    column: str
+    op: str                 # eq, ne, lt, gt, true, false
+    value: int
+    penalty: int
+    message: str            # str.format()ed with the row's columns
+    unless: str | None = None   # boolean column that disables the rule
+
+RULES: tuple[Rule, ...] = (
+    Rule("title_missing", "title", "title_length", "eq", 0, 15,
+         "Add a concise, descriptive <title> (30–60 characters)."),
+    Rule("title_short", "title", "title_length", "lt", 30, 8,
+         "Title is short; target 30–60 characters."),
+    Rule("title_long", "title", "title_length", "gt", 60, 5,
+         "Title is long; consider trimming to 60 characters or fewer."),
+    Rule("description_missing", "description", "meta_description_length", "eq", 0, 12,
+         "Add a meta description (70–160 characters)."),
+    Rule("description_short", "description", "meta_description_length", "lt", 70, 6,
+         "Meta description is short; expand toward 70–160 characters."),
+    Rule("description_long", "description", "meta_description_length", "gt", 160, 6,
+         "Meta description is long; trim toward 160 characters."),
+    Rule("h1_multiple", "h1", "multiple_h1", "true", 0, 6,
+         "Multiple H1s detected; keep a single primary H1."),
+    Rule("h1_missing", "h1", "h1_count", "eq", 0, 10,
+         "Add an H1 heading that matches page intent."),
+    Rule("canonical_missing", "canonical", "has_canonical", "false", 0, 6,
+         "Add a canonical link to prevent duplicate content issues."),
+    Rule("noindex", "noindex", "noindex", "true", 0, 40,
+         "robots meta contains 'noindex'; page will not be indexed."),
+    Rule("nofollow", "nofollow", "nofollow", "true", 0, 8,
+         "robots meta contains 'nofollow'; internal linking equity may be lost."),
+    Rule("viewport_missing", "viewport", "viewport", "false", 0, 6,
+         "Add a responsive viewport meta tag for mobile friendliness."),
+    Rule("og_missing", "og", "og_count", "eq", 0, 4,
+         "Add Open Graph tags for better social sharing previews."),
+    Rule("twitter_missing", "twitter", "twitter_count", "eq", 0, 2,
+         "Add Twitter Card tags for richer shares on X/Twitter."),
+    # a partial (head-only) scan may simply not have reached the JSON-LD
+    Rule("jsonld_missing", "jsonld", "jsonld_count", "eq", 0, 4,
+         "Add JSON-LD structured data relevant to the page content.", unless="partial"),
+    Rule("status_not_200", "status", "status", "ne", 200, 10,
+         "HTTP status is {status}; aim for 200 on canonical URL."),
+)
+
+# column -> (payload key, kind, default). kind: "num" as is, "bool" truth
+# value, "len" length of a list.
+COLUMNS: dict[str, tuple[str, str, int]] = {
+    "title_length":            ("title_length", "num", 0),
+    "meta_description_length": ("meta_description_length", "num", 0),
+    "h1_count":                ("h1", "len", 0),
+    "multiple_h1":             ("multiple_h1", "bool", 0),
+    "has_canonical":           ("canonical", "bool", 0),
+    "noindex":                 ("noindex", "bool", 0),
+    "nofollow":                ("nofollow", "bool", 0),
+    "viewport":                ("viewport", "bool", 0),
+    "og_count":                ("og_count", "num", 0),
+    "twitter_count":           ("twitter_count", "num", 0),
+    "jsonld_count":            ("jsonld_count", "num", 0),
+    "partial":                 ("partial", "bool", 0),
+    "status":                  ("status", "num", 200),
+}
+
+_OPS = {"eq": "{} == {}", "ne": "{} != {}", "lt": "{} < {}", "gt": "{} > {}",
+        "true": "{}", "false": "not {}"}
+
+def _expr(column: str, mode: str) -> str:
+    """
+    Source reading `column` from payload `p`. "fast" subscripts (KeyError
+    on an incomplete payload), "safe" falls back to defaults, "value" also
+    coerces to int for the columnar form.
+    """
+    key, kind, default = COLUMNS[column]
+    if mode == "fast":
+        return f"len(p[{key!r}])" if kind == "len" else f"p[{key!r}]"
+    get = f"p.get({key!r})" if kind != "num" else f"p.get({key!r}, {default})"
+    if kind == "len":
+        return f"len({get} or ())"
+    if mode == "value":
+        return f"int(bool({get}))" if kind == "bool" else f"int({get})"
+    return get
+
+def _compile(rules: tuple[Rule, ...], mode: str, fallback=None):
+    """
+    Generate straight-line source for the table: one if/elif chain per
+    group, so untaken branches cost nothing. Columns named in a message
+    are bound once up front. A "fast" scorer hands payloads with missing
+    keys to `fallback`.
+    """
+    fields = [c for c in COLUMNS if any("{" + c + "}" in r.message for r in rules)]
+    ref = {c: (c if c in fields else f"({_expr(c, mode)})") for c in COLUMNS}
+
+    body = [f"{c} = {_expr(c, mode)}" for c in fields]
+    body += ["s = 100", "r = []"]
+    prev = None
+    for i, rule in enumerate(rules):
+        cond = _OPS[rule.op].format(ref[rule.column], rule.value)
+        if rule.unless:
+            cond = f"({cond}) and not {ref[rule.unless]}"
+        names = ", ".join(f"{c}={c}" for c in fields if "{" + c + "}" in rule.message)
+        msg = f"M[{i}].format({names})" if names else f"M[{i}]"
+        kw = "elif" if rule.group == prev else "if"
+        body.append(f"{kw} {cond}: s -= {rule.penalty}; r.append({msg})")
+        prev = rule.group
+    body.append("return max(0, min(100, s)), r")
+    if fallback is None:
+        lines = ["def score(p):"] + ["    " + b for b in body]
+    else:
+        lines = ["def score(p):", "    try:"] + ["        " + b for b in body]
+        lines += ["    except KeyError:", "        return fallback(p)"]
+    namespace = {"M": [r.message for r in rules], "fallback": fallback}
+    exec(compile("\n".join(lines), f"<scoring rules: {mode}>", "exec"), namespace)
+    return namespace["score"]
+
+def _check(rules: tuple[Rule, ...]) -> None:
+    seen = set()
+    for i, rule in enumerate(rules):
+        if rule.column not in COLUMNS or (rule.unless and rule.unless not in COLUMNS):
+            raise ValueError(f"rule {rule.id}: unknown column")
+        if rule.op not in _OPS:
+            raise ValueError(f"rule {rule.id}: unknown op {rule.op!r}")
+        if rule.group in seen and rules[i - 1].group != rule.group:
+            raise ValueError(f"rule {rule.id}: group {rule.group!r} is not contiguous")
+        seen.add(rule.group)
+
+_check(RULES)
+# score(payload) -> (0–100 score, recommendation messages in rule order).
+# Payloads from this service carry every key and take the subscript path;
+# stored or hand-built ones missing keys fall back to defaults.
+score = _compile(RULES, "fast", fallback=_compile(RULES, "safe"))
+_row = eval(f"lambda p: ({', '.join(_expr(c, 'value') for c in COLUMNS)},)")
+
+# ---- columnar ----------------------------------------------------------------
+def to_columns(payloads) -> dict:
+    """Stored results -> {column: numpy array}, the input of score_columns."""
+    import numpy as np
+    table = np.array([_row(p) for p in payloads], dtype=np.int32).reshape(-1, len(COLUMNS))
+    return {c: table[:, i] for i, c in enumerate(COLUMNS)}
+
+def score_columns(columns: dict, rules: tuple[Rule, ...] = RULES):
+    """
+    Vectorized score for a batch. `columns` maps each COLUMNS name to an
+    equal-length array. Returns (scores int16[n], hits bool[n, len(rules)]);
+    recommendations(columns, hits, i) gives row i's messages.
+    Pass a modified `rules` table to try new weights over history.
+    """
+    import numpy as np
+    _check(rules)
+    n = len(next(iter(columns.values())))
+    hits = np.zeros((n, len(rules)), dtype=bool)
+    penalty = np.zeros(len(rules), dtype=np.int16)
+    taken: dict[str, np.ndarray] = {}
+    for i, rule in enumerate(rules):
+        col = np.asarray(columns[rule.column])
+        if rule.op == "eq":
+            cond = col == rule.value
+        elif rule.op == "ne":
+            cond = col != rule.value
+        elif rule.op == "lt":
+            cond = col < rule.value
+        elif rule.op == "gt":
+            cond = col > rule.value
+        elif rule.op == "true":
+            cond = col.astype(bool)
+        else:
+            cond = ~col.astype(bool)
+        if rule.unless:
+            cond &= ~np.asarray(columns[rule.unless]).astype(bool)
+        group = taken.get(rule.group)
+        if group is None:
+            taken[rule.group] = cond.copy()
+        else:
+            cond &= ~group
+            group |= cond
+        hits[:, i] = cond
+        penalty[i] = rule.penalty
+    scores = np.clip(100 - hits.astype(np.int16) @ penalty, 0, 100).astype(np.int16)
+    return scores, hits
+
+def recommendations(columns: dict, hits, i: int, rules: tuple[Rule, ...] = RULES) -> list[str]:
+    row = {c: int(v[i]) for c, v in columns.items()}
+    return [rules[j].message.format(**row) for j in hits[i].nonzero()[0]]
@@ -1,156 +1,253 @@
-from fastapi import FastAPI, HTTPException, Response
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, HttpUrl
-from bs4 import BeautifulSoup
-import httpx, socket, ipaddress, re, os, json
-from urllib.parse import urljoin
-from cachetools import TTLCache
-
-# --- std/3p imports -------------------------------------------------------
-app = FastAPI()
+import asyncio, functools, gzip, hashlib, ipaddress, json, math, os, socket, time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+from urllib.parse import urljoin, urlsplit
+
+from cachetools import LRUCache, TTLCache
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl, TypeAdapter, ValidationError
+
+import metrics
+from analysis import score_html
+from crawler import CRAWL_MAX_PAGES, Crawler, CrawlStore, normalize_url
+from duplicates import DUPES_ENABLED, DuplicateIndex, minhash
+from html_signals import StreamingExtractor
+from linkgraph import GRAPH_DEEP, report as link_report
+from monitor import MONITOR_MIN_INTERVAL, MonitorStore, Scheduler
+from result_cache import make_cache
+from scoring import RULES_VERSION, score as _score_and_recos
+from upstream_guard import HostGuard, Rejected
+
+if TYPE_CHECKING:       # loaded on first use, see _upstream_client / _parse_executor
+    import httpx
+    from upstream_transport import UpstreamTransport
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 NETLIFY_ORIGIN = os.getenv("NETLIFY_ORIGIN", "https://ai-seo-calculator.netlify.app")
 USER_AGENT     = "AI-SEO-Calculator/1.0 (+https://ai-seo-calculator.netlify.app)"
 
-cache = TTLCache(maxsize=1000, ttl=900)
+# Routes are collected here and mounted by create_app()
+router = APIRouter()
 
-# --- Paste-HTML analysis ----------------------------------------------------
-from pydantic import BaseModel
-import json, re
+# --- caching ---------------------------------------------------------------
+# One shared result cache (backend chosen by RESULT_CACHE, see result_cache.py)
+cache = make_cache()
+
+# --- upstream HTTP client ---------------------------------------------------
+# One pooled client per process, owned by the app lifespan. Keep-alive
+# connections are matched per origin, so repeat scans of the same host skip
+# the TCP/TLS handshake, HTTP/2 multiplexes on top of them, and the TLS
+# context (CA bundle) is loaded once instead of on every request. httpx is
+# imported with the first client, not with this module (cold start).
+
+UPSTREAM_MAX_CONNECTIONS  = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "60"))
+UPSTREAM_MAX_KEEPALIVE    = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_TIMEOUT          = float(os.getenv("UPSTREAM_TIMEOUT", "15"))
+UPSTREAM_CONNECT_TIMEOUT  = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", str(UPSTREAM_TIMEOUT)))
+UPSTREAM_POOL_TIMEOUT     = float(os.getenv("UPSTREAM_POOL_TIMEOUT", str(UPSTREAM_TIMEOUT)))
+UPSTREAM_HTTP2            = os.getenv("UPSTREAM_HTTP2", "1") not in ("0", "false", "no")
+UPSTREAM_DEADLINE         = float(os.getenv("UPSTREAM_DEADLINE", "20"))   # DNS + redirects + body, per fetch
+UPSTREAM_NEGATIVE_TTL     = float(os.getenv("UPSTREAM_NEGATIVE_TTL", "60"))
+
+_upstream: "httpx.AsyncClient | None" = None
+_upstream_transport: "UpstreamTransport | None" = None
+
+def _upstream_client() -> "httpx.AsyncClient":
+    """Shared client, created on first use (or by warm_up)."""
+    global _upstream, _upstream_transport
+    if _upstream is None or _upstream.is_closed:
+        import httpx
+        from upstream_transport import UpstreamTransport
+        _upstream_transport = UpstreamTransport(
+            _PinnedBackend(),
+            httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            http2=UPSTREAM_HTTP2,
+        )
+        _upstream = httpx.AsyncClient(
+            transport=_upstream_transport,
+            timeout=httpx.Timeout(
+                UPSTREAM_TIMEOUT,
+                connect=UPSTREAM_CONNECT_TIMEOUT,
+                pool=UPSTREAM_POOL_TIMEOUT,
+            ),
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+        )
+    return _upstream
+
+async def _close_upstream_client() -> None:
+    global _upstream, _upstream_transport
+    if _upstream is not None:
+        await _upstream.aclose()
+    _upstream, _upstream_transport = None, None
+
+def _upstream_pool_stats() -> dict:
+    """
+    Idle/active connections and queued requests, from the transport's own
+    counters. Call on the event loop, which is the only thread updating them.
+    """
+    stats = {
+        "open": _upstream is not None and not _upstream.is_closed,
+        "http2": UPSTREAM_HTTP2,
+        "max_connections": UPSTREAM_MAX_CONNECTIONS,
+        "max_keepalive": UPSTREAM_MAX_KEEPALIVE,
+        "idle": 0,
+        "active": 0,
+        "waiting": 0,
+        "hosts": {},
+    }
+    if stats["open"] and _upstream_transport is not None:
+        stats.update(_upstream_transport.stats())
+    return stats
+
+# ---- CPU offload ----------------------------------------------------------
+# Parsing a large page and scoring it is pure CPU; on the event loop it
+# stalls every other request. Big documents go to a process pool (threads
+# would still hold the GIL); small ones stay on the loop, where a pool
+# round-trip would cost more than the work. Submissions are bounded: when
+# the pool is saturated interactive requests get 503 + Retry-After, while
+# batch and crawl work waits for a slot.
+PARSE_WORKERS      = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))   # 0 = parse on the loop
+PARSE_QUEUE        = int(os.getenv("PARSE_QUEUE", str(max(1, PARSE_WORKERS) * 4)))  # running + waiting
+PARSE_INLINE_BYTES = int(os.getenv("PARSE_INLINE_BYTES", "131072"))  # at or below: parse on the loop
+PARSE_RETRY_AFTER  = int(os.getenv("PARSE_RETRY_AFTER", "1"))
+PARSE_START_METHOD = os.getenv("PARSE_START_METHOD") or None         # fork / forkserver / spawn
+
+_parse_pool: "ProcessPoolExecutor | None" = None
+_parse_slots = asyncio.Semaphore(PARSE_QUEUE)
+_parse_jobs = 0                     # holding a slot: running or waiting in the pool
+
+def _parse_executor() -> "ProcessPoolExecutor":
+    global _parse_pool
+    if _parse_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context(PARSE_START_METHOD),
+        )
+    return _parse_pool
+
+def _close_parse_executor() -> None:
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+    _parse_pool = None
+
+async def _offload(fn, *args, block: bool = False):
+    """
+    Run fn(*args) in the parse pool. With block=False a full queue raises
+    503 instead of waiting; block=True queues behind the running work.
+    """
+    if PARSE_WORKERS <= 0:
+        return fn(*args)
+    from concurrent.futures.process import BrokenProcessPool
+    if not block and _parse_slots.locked():
+        raise HTTPException(status_code=503, detail="Analyzer busy, retry shortly",
+                            headers={"Retry-After": str(PARSE_RETRY_AFTER)})
+    global _parse_jobs
+    async with _parse_slots:
+        _parse_jobs += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_parse_executor(), fn, *args)
+        except BrokenProcessPool:
+            # a worker died (OOM, signal); start a fresh pool for the next call
+            _close_parse_executor()
+            raise HTTPException(status_code=503, detail="Analyzer restarting, retry shortly",
+                                headers={"Retry-After": str(PARSE_RETRY_AFTER)})
+        finally:
+            _parse_jobs -= 1
+
+# ---- app factory -----------------------------------------------------------
+# Importing this module registers routes on `router` and loads nothing heavy:
+# httpx, the parse pool and bs4 (reference extractor only) load on first use.
+# Serverless entry points call create_app(); `server:app` builds the same app
+# on first access. WARMUP=1 pays the first-use costs at startup instead, for
+# long-running workers or platforms with an init phase.
+WARMUP = os.getenv("WARMUP", "0") not in ("0", "false", "no")
+
+_WARMUP_HTML = (
+    '<!doctype html><html><head><title>Warm-up</title>'
+    '<meta name="description" content="warm-up"><link rel="canonical" href="/">'
+    '<script type="application/ld+json">{"@type": "WebSite"}</script></head>'
+    '<body><h1>Warm-up</h1><p>text &amp; more</p></body></html>'
+)
 
+async def warm_up() -> None:
+    """Build the pooled upstream client and run one document through parse + score."""
+    _upstream_client()
+    score_html(_WARMUP_HTML, "https://example.com/")
+    if DUPES_ENABLED:
+        minhash(_WARMUP_HTML)           # numpy + the permutation table
+    if PARSE_WORKERS > 0:
+        # workers start (and, unless forked, import this module) on first submit
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_parse_executor(), _analyze_document, _WARMUP_HTML.encode(), "utf-8",
+                                   200, "https://example.com/", False, DUPES_ENABLED)
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    if app.state.warm_up:
+        await warm_up()
+    _crawls().resume_all()
+    _monitors().start()
+    try:
+        yield
+    finally:
+        await _monitors().shutdown()
+        await _crawls().shutdown()
+        await _close_dupes()
+        await _close_upstream_client()
+        _close_parse_executor()
+
+def create_app(warm: bool | None = None) -> FastAPI:
+    """The API app; `warm` overrides WARMUP."""
+    app = FastAPI(lifespan=_lifespan)
+    app.state.warm_up = WARMUP if warm is None else warm
+    app.include_router(router)
+    return app
+
+def __getattr__(name: str):
+    # module-level `app` for `uvicorn server:app`, built once on first access
+    global app
+    if name == "app":
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Paste-HTML analysis ----------------------------------------------------
 class AnalyzeHtmlIn(BaseModel):
     url: str | None = None
     html: str
 
-def _score_and_recos_onpage(payload: dict) -> tuple[int, list[str]]:
-    """Simple, transparent scoring with actionable recos."""
-    score = 100
-    recos = []
-
-    tlen = payload.get("title_length", 0)
-    dlen = payload.get("meta_description_length", 0)
-    h1s  = payload.get("h1", [])
-    multi_h1 = payload.get("multiple_h1", False)
-    canonical = payload.get("canonical")
-    noindex = payload.get("noindex", False)
-    nofollow = payload.get("nofollow", False)
-    viewport = payload.get("viewport", False)
-    ogc = payload.get("og_count", 0)
-    twc = payload.get("twitter_count", 0)
-    jsonld = payload.get("jsonld_count", 0)
-    status = int(payload.get("status", 200))
-
-    # Title
-    if tlen == 0: score -= 15; recos.append("Add a descriptive <title> (30–60 chars).")
-    elif tlen < 30: score -= 8; recos.append("Title is short; target 30–60 chars.")
-    elif tlen > 60: score -= 5; recos.append("Title is long; trim toward 60 chars.")
-
-    # Meta description
-    if dlen == 0: score -= 12; recos.append("Add a meta description (70–160 chars).")
-    elif dlen < 70: score -= 6; recos.append("Meta description is short; expand toward 70–160 chars.")
-    elif dlen > 160: score -= 6; recos.append("Meta description is long; trim toward 160 chars.")
-
-    # H1
-    if multi_h1: score -= 6; recos.append("Multiple H1s detected; keep a single primary H1.")
-    elif len(h1s) == 0: score -= 10; recos.append("Add an H1 heading that matches page intent.")
-
-    # Canonical
-    if not canonical: score -= 6; recos.append("Add a canonical link to prevent duplicate content issues.")
-
-    # Robots
-    if noindex: score -= 40; recos.append("robots meta contains 'noindex'; page won’t be indexed.")
-    if nofollow: score -= 8;  recos.append("robots meta contains 'nofollow'; link equity may be lost.")
-
-    # Mobile
-    if not viewport: score -= 6; recos.append("Add a responsive viewport meta tag for mobile.")
-
-    # Social preview
-    if ogc == 0: score -= 4; recos.append("Add Open Graph tags for better social shares.")
-    if twc == 0: score -= 2; recos.append("Add Twitter Card tags for richer shares.")
-
-    # Structured data
-    if jsonld == 0: score -= 4; recos.append("Add JSON-LD structured data relevant to the page.")
-
-    # HTTP status
-    if status != 200: score -= 10; recos.append(f"HTTP status is {status}; aim for 200 on the canonical URL.")
-
-    return max(0, min(100, score)), recos
-
-def _analyze_html_core(html: str, base_url: str | None = None) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
-
-    title = (soup.title.string or "").strip() if soup.title and soup.title.string else ""
-    desc  = (soup.find("meta", attrs={"name":"description"}) or {}).get("content","") or ""
-    h1s   = [h.get_text(strip=True) for h in soup.find_all("h1")]
-    can   = soup.find("link", rel=lambda v: v and "canonical" in v.lower())
-    canonical = can.get("href") if can else None
-    if canonical and base_url:
-        canonical = urljoin(base_url, canonical)
-
-    robots_tag = soup.find("meta", attrs={"name": lambda v: v and v.lower() in ("robots","googlebot")})
-    robots = (robots_tag.get("content") or "").lower() if robots_tag else ""
-    noindex = "noindex" in robots
-    nofollow = "nofollow" in robots
-
-    viewport = bool(soup.find("meta", attrs={"name":"viewport"}))
-    og_count = len(soup.find_all(attrs={"property": re.compile(r"^og:", re.I)}))
-    twitter_count = len(soup.find_all(attrs={"name": re.compile(r"^twitter:", re.I)}))
-
-    jsonld_nodes = soup.find_all("script", attrs={"type": re.compile(r"application/ld\+json", re.I)})
-    jsonld_types = []
-    for node in jsonld_nodes:
-        try:
-            data = json.loads(node.string or "{}")
-            if isinstance(data, list):
-                for d in data:
-                    t = d.get("@type") if isinstance(d, dict) else None
-                    if isinstance(t, list): jsonld_types += [str(x) for x in t]
-                    elif t: jsonld_types.append(str(t))
-            elif isinstance(data, dict):
-                t = data.get("@type")
-                if isinstance(t, list): jsonld_types += [str(x) for x in t]
-                elif t: jsonld_types.append(str(t))
-        except Exception:
-            pass
-
-    # word count (simple, no new deps)
-    text_words = len((soup.get_text(" ", strip=True) or "").split())
+# Results are memoized by content: the same HTML + base URL under the same
+# scoring rules always gives the same payload, so repeat submissions (CI
+# gates, CMS previews) cost a hash. Entries are the serialized response
+# bytes, bounded by total size.
 
-    payload = {
-        "ok": True,
-        "status": 200,                       # HTML came from user, not fetched
-        "final_url": base_url or None,
+HTML_MEMO_BYTES = int(os.getenv("HTML_MEMO_BYTES", str(64 * 1024 * 1024)))
+_HASH_SLICE     = 1 << 20    # chars encoded per hash update
 
-        "title": title,
-        "title_length": len(title),
-        "meta_description": desc,
-        "meta_description_length": len(desc),
-        "h1": h1s,
-        "multiple_h1": len(h1s) > 1,
-        "canonical": canonical,
-
-        "robots": robots or None,
-        "noindex": noindex,
-        "nofollow": nofollow,
-        "viewport": viewport,
-        "og_count": og_count,
-        "twitter_count": twitter_count,
-        "jsonld_count": len(jsonld_nodes),
-        "jsonld_types": jsonld_types,
-
-        "text_words": text_words,
-        "score": 0,
-        "recommendations": [],
-    }
+_html_memo: LRUCache = LRUCache(maxsize=HTML_MEMO_BYTES, getsizeof=len)
+_html_memo_stats = {"hits": 0, "misses": 0}
 
-    score, recos = _score_and_recos_onpage(payload)
-    payload["score"] = score
-    payload["recommendations"] = recos
-    return payload
+def _html_key(html: str, base_url: str | None) -> str:
+    # hashed in slices so a large paste is never copied whole into bytes
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{RULES_VERSION}\0{base_url or ''}\0".encode("utf-8", "surrogatepass"))
+    for i in range(0, len(html), _HASH_SLICE):
+        h.update(html[i:i + _HASH_SLICE].encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
 
-@app.post("/api/analyze_html")
-def analyze_html(body: AnalyzeHtmlIn):
+@router.post("/api/analyze_html")
+async def analyze_html(body: AnalyzeHtmlIn):
     """
     Fallback when remote fetch fails or user prefers privacy.
     Returns the same shape as /api/analyze so the UI can render identically.
@@ -158,135 +255,40 @@ def analyze_html(body: AnalyzeHtmlIn):
     html = (body.html or "").strip()
     if not html:
         raise HTTPException(status_code=400, detail="Missing HTML.")
-    data = _analyze_html_core(html, base_url=(body.url or None))
-    return JSONResponse(content=data)
-# --- caching ---------------------------------------------------------------
-from cachetools import TTLCache
-cache = TTLCache(maxsize=1000, ttl=900)
-
-# --- std/3p imports -------------------------------------------------------
-from fastapi import FastAPI, HTTPException, Response
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, HttpUrl
-from bs4 import BeautifulSoup
-import httpx, socket, ipaddress, re, os, json
-
-
-NETLIFY_ORIGIN = os.getenv("NETLIFY_ORIGIN", "https://ai-seo-calculator.netlify.app")
-USER_AGENT     = "AI-SEO-Calculator/1.0 (+https://ai-seo-calculator.netlify.app)"
-
-app = FastAPI()
-
-# --- Paste-HTML analysis ----------------------------------------------------
-from urllib.parse import urljoin
-import json, re
-
-class AnalyzeHtmlIn(BaseModel):
-    url: str | None = None
-    html: str
-
-def _score_and_recos_onpage(payload: dict) -> tuple[int, list[str]]:
-    score = 100
-    recos = []
-    tlen = payload.get("title_length", 0)
-    dlen = payload.get("meta_description_length", 0)
-    h1s  = payload.get("h1", [])
-    multi_h1 = payload.get("multiple_h1", False)
-    canonical = payload.get("canonical")
-    noindex = payload.get("noindex", False)
-    nofollow = payload.get("nofollow", False)
-    viewport = payload.get("viewport", False)
-    ogc = payload.get("og_count", 0)
-    twc = payload.get("twitter_count", 0)
-    jsonld = payload.get("jsonld_count", 0)
-    status = int(payload.get("status", 200))
-    if tlen == 0: score -= 15; recos.append("Add a descriptive <title> (30–60 chars).")
-    elif tlen < 30: score -= 8; recos.append("Title is short; target 30–60 chars.")
-    elif tlen > 60: score -= 5; recos.append("Title is long; trim toward 60 chars.")
-    if dlen == 0: score -= 12; recos.append("Add a meta description (70–160 chars).")
-    elif dlen < 70: score -= 6; recos.append("Meta description is short; expand toward 70–160 chars.")
-    elif dlen > 160: score -= 6; recos.append("Meta description is long; trim toward 160 chars.")
-    if multi_h1: score -= 6; recos.append("Multiple H1s detected; keep a single primary H1.")
-    elif len(h1s) == 0: score -= 10; recos.append("Add an H1 heading that matches page intent.")
-    if not canonical: score -= 6; recos.append("Add a canonical link to prevent duplicate content issues.")
-    if noindex: score -= 40; recos.append("robots meta contains 'noindex'; page won’t be indexed.")
-    if nofollow: score -= 8;  recos.append("robots meta contains 'nofollow'; link equity may be lost.")
-    if not viewport: score -= 6; recos.append("Add a responsive viewport meta tag for mobile.")
-    if ogc == 0: score -= 4; recos.append("Add Open Graph tags for better social shares.")
-    if twc == 0: score -= 2; recos.append("Add Twitter Card tags for richer shares.")
-    if jsonld == 0: score -= 4; recos.append("Add JSON-LD structured data relevant to the page.")
-    if status != 200: score -= 10; recos.append(f"HTTP status is {status}; aim for 200 on the canonical URL.")
-    return max(0, min(100, score)), recos
-
-def _analyze_html_core(html: str, base_url: str | None = None) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
-    title = (soup.title.string or "").strip() if soup.title and soup.title.string else ""
-    desc  = (soup.find("meta", attrs={"name":"description"}) or {}).get("content","") or ""
-    h1s   = [h.get_text(strip=True) for h in soup.find_all("h1")]
-    can   = soup.find("link", rel=lambda v: v and "canonical" in v.lower())
-    canonical = can.get("href") if can else None
-    if canonical and base_url:
-        canonical = urljoin(base_url, canonical)
-    robots_tag = soup.find("meta", attrs={"name": lambda v: v and v.lower() in ("robots","googlebot")})
-    robots = (robots_tag.get("content") or "").lower() if robots_tag else ""
-    noindex = "noindex" in robots
-    nofollow = "nofollow" in robots
-    viewport = bool(soup.find("meta", attrs={"name":"viewport"}))
-    og_count = len(soup.find_all(attrs={"property": re.compile(r"^og:", re.I)}))
-    twitter_count = len(soup.find_all(attrs={"name": re.compile(r"^twitter:", re.I)}))
-    jsonld_nodes = soup.find_all("script", attrs={"type": re.compile(r"application/ld\+json", re.I)})
-    jsonld_types = []
-    for node in jsonld_nodes:
-        try:
-            data = json.loads(node.string or "{}")
-            if isinstance(data, list):
-                for d in data:
-                    t = d.get("@type") if isinstance(d, dict) else None
-                    if isinstance(t, list): jsonld_types += [str(x) for x in t]
-                    elif t: jsonld_types.append(str(t))
-            elif isinstance(data, dict):
-                t = data.get("@type")
-                if isinstance(t, list): jsonld_types += [str(x) for x in t]
-                elif t: jsonld_types.append(str(t))
-        except Exception:
-            pass
-    text_words = len((soup.get_text(" ", strip=True) or "").split())
-    payload = {
-        "ok": True,
-        "status": 200,
-        "final_url": base_url or None,
-        "title": title,
-        "title_length": len(title),
-        "meta_description": desc,
-        "meta_description_length": len(desc),
-        "h1": h1s,
-        "multiple_h1": len(h1s) > 1,
-        "canonical": canonical,
-        "robots": robots or None,
-        "noindex": noindex,
-        "nofollow": nofollow,
-        "viewport": viewport,
-        "og_count": og_count,
-        "twitter_count": twitter_count,
-        "jsonld_count": len(jsonld_nodes),
-        "jsonld_types": jsonld_types,
-        "text_words": text_words,
-        "score": 0,
-        "recommendations": [],
+    with metrics.request() as timing:
+        with metrics.stage("hash"):
+            key = _html_key(html, body.url)
+        hit = _html_memo.get(key)
+        if hit is not None:
+            _html_memo_stats["hits"] += 1
+            metrics.count("seo_html_memo_total", "result", "hit")
+            metrics.note("cache", "hit")
+            response = Response(content=hit, media_type="application/json")
+        else:
+            _html_memo_stats["misses"] += 1
+            metrics.count("seo_html_memo_total", "result", "miss")
+            metrics.note("cache", "miss")
+            with metrics.stage("parse"):
+                if len(html) <= PARSE_INLINE_BYTES:
+                    data = score_html(html, body.url or None)
+                else:
+                    data = await _offload(score_html, html, body.url or None)
+            response = JSONResponse(content=data)
+            if len(response.body) <= HTML_MEMO_BYTES:
+                _html_memo[key] = response.body
+        if timing is not None:
+            response.headers["Server-Timing"] = metrics.server_timing(timing)
+        return response
+
+@router.get("/api/analyze_html/stats")
+def analyze_html_stats():
+    return {
+        **_html_memo_stats,
+        "entries": len(_html_memo),
+        "bytes": _html_memo.currsize,
+        "max_bytes": HTML_MEMO_BYTES,
+        "rules_version": RULES_VERSION,
     }
-    score, recos = _score_and_recos_onpage(payload)
-    payload["score"] = score
-    payload["recommendations"] = recos
-    return payload
-
-@app.post("/api/analyze_html")
-def analyze_html(body: AnalyzeHtmlIn):
-    html = (body.html or "").strip()
-    if not html:
-        raise HTTPException(status_code=400, detail="Missing HTML.")
-    data = _analyze_html_core(html, base_url=(body.url or None))
-    return JSONResponse(content=data)
 
 # ---- basic SSRF guard: block private IPs/localhost ------------------------
 _PRIVATE = (
@@ -300,17 +302,98 @@ _PRIVATE = (
     ipaddress.ip_network("fe80::/10"),
 )
 
-def _resolve_and_block(host: str):
+# Lookups run on the loop's resolver threadpool (never on the event loop
+# itself), are capped by a semaphore, coalesced per host and cached.
+# getaddrinfo does not expose record TTLs, so cache lifetimes are config caps.
+DNS_CACHE_TTL       = float(os.getenv("DNS_CACHE_TTL", "300"))
+DNS_NEGATIVE_TTL    = float(os.getenv("DNS_NEGATIVE_TTL", "30"))
+DNS_MAX_CONCURRENCY = int(os.getenv("DNS_MAX_CONCURRENCY", "32"))
+
+_dns_cache    = TTLCache(maxsize=10_000, ttl=DNS_CACHE_TTL)      # host -> vetted IPs
+_dns_negative = TTLCache(maxsize=10_000, ttl=DNS_NEGATIVE_TTL)   # host -> True
+_dns_inflight: dict[str, asyncio.Future] = {}
+_dns_slots = asyncio.Semaphore(DNS_MAX_CONCURRENCY)
+
+def _is_private(ip: str) -> bool:
+    addr = ipaddress.ip_address(ip.split("%", 1)[0])
+    if addr.version == 6 and addr.ipv4_mapped:
+        addr = addr.ipv4_mapped
+    return any(addr in net for net in _PRIVATE)
+
+async def _lookup(host: str) -> tuple[str, ...]:
+    loop = asyncio.get_running_loop()
+    async with _dns_slots:
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    return tuple(dict.fromkeys(sockaddr[0] for *_, sockaddr in infos))
+
+async def _resolve_and_block(host: str) -> tuple[str, ...]:
+    """Resolve host (cached), reject private addresses and return the vetted IPs."""
+    host = host.strip("[]").lower()
     try:
-        infos = socket.getaddrinfo(host, None)
-        for fam, *_ , sockaddr in infos:
-            ip = ipaddress.ip_address(sockaddr[0] if fam == socket.AF_INET else sockaddr[0])
-            if any(ip in net for net in _PRIVATE):
-                raise HTTPException(status_code=400, detail="Private IPs not allowed")
-    except socket.gaierror:
-        raise HTTPException(status_code=400, detail="Host cannot be resolved")
+        ips: tuple[str, ...] | None = (str(ipaddress.ip_address(host)),)
+    except ValueError:
+        ips = _dns_cache.get(host)
+    if ips is None:
+        if host in _dns_negative:
+            raise HTTPException(status_code=400, detail="Host cannot be resolved")
+        task = _dns_inflight.get(host)
+        if task is None:
+            task = asyncio.ensure_future(_lookup(host))
+            _dns_inflight[host] = task
+            task.add_done_callback(lambda _t, h=host: _dns_inflight.pop(h, None))
+        try:
+            # shield: one cancelled caller must not cancel the lookup for the rest
+            ips = await asyncio.shield(task)
+        except (socket.gaierror, UnicodeError):
+            ips = ()
+        if not ips:
+            _dns_negative[host] = True
+            raise HTTPException(status_code=400, detail="Host cannot be resolved")
+        _dns_cache[host] = ips
+    if any(_is_private(ip) for ip in ips):
+        raise HTTPException(status_code=400, detail="Private IPs not allowed")
+    return ips
+
+class _PinnedBackend:
+    """
+    httpcore.AsyncNetworkBackend for the upstream pool (same interface, not
+    subclassed, so httpcore is only imported with the client). Every new connection (including
+    each redirect hop) goes through _resolve_and_block and dials the vetted
+    IP directly, so the socket layer never re-resolves the name and a DNS
+    answer cannot change between the check and the connect. TLS still uses
+    the original hostname for SNI and certificate checks.
+    """
+    def __init__(self) -> None:
+        import httpcore
+        self._inner = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        import httpcore
+        error: Exception | None = None
+        for ip in await _resolve_and_block(host):
+            try:
+                return await self._inner.connect_tcp(
+                    ip, port, timeout=timeout,
+                    local_address=local_address, socket_options=socket_options,
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        import httpcore
+        raise httpcore.ConnectError("Unix sockets are not allowed upstream")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
 
 # ---- output model ---------------------------------------------------------
+class AgentOut(BaseModel):
+    vendor: str
+    category: str               # ai_assistant | live_chat
+    confidence: float           # 0-1
+    evidence: list[str]         # "kind:pattern" of each signature found
+
 class AnalyzeOut(BaseModel):
     ok: bool
     status: int
@@ -335,205 +418,864 @@ class AnalyzeOut(BaseModel):
     jsonld_count: int
     jsonld_types: list[str]
 
+    # chatbot / AI assistant widgets on the page (agents.py)
+    ai_agents: list[AgentOut] = []
+
     # evaluation
     score: int
     recommendations: list[str]
 
-@app.get("/api/health")
+    # head-only scan that stopped before the end of the document
+    partial: bool = False
+
+# ---- encoded responses ----------------------------------------------------
+# /api/analyze bodies are validated against AnalyzeOut and serialized once,
+# when the result is stored, and kept here keyed by their ETag (a hash of
+# the bytes), so a cache hit costs a dict lookup instead of validation and
+# JSON encoding. Another worker's entry is encoded on its first hit here.
+# gzip/brotli variants are built on first request and kept with the entry.
+RESPONSE_MEMO_BYTES = int(os.getenv("RESPONSE_MEMO_BYTES", str(32 * 1024 * 1024)))
+COMPRESS_MIN_BYTES  = int(os.getenv("COMPRESS_MIN_BYTES", "512"))   # smaller bodies go as-is
+
+_analyze_out = TypeAdapter(AnalyzeOut)
+
+class _Encoded:
+    __slots__ = ("body", "etag", "gzip", "br")
+
+    def __init__(self, body: bytes, etag: str) -> None:
+        self.body = body
+        self.etag = etag
+        self.gzip: bytes | None = None
+        self.br: bytes | None = None
+
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip or b"") + len(self.br or b"")
+
+_responses: LRUCache = LRUCache(maxsize=RESPONSE_MEMO_BYTES, getsizeof=_Encoded.size)
+
+def _encode(payload: dict) -> _Encoded:
+    body = _analyze_out.dump_json(_analyze_out.validate_python(payload))
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    enc = _responses.get(etag)
+    if enc is None:
+        enc = _responses[etag] = _Encoded(body, etag)
+    return enc
+
+def _encoded(entry: dict) -> _Encoded:
+    enc = _responses.get(entry.get("response_etag"))
+    return enc if enc is not None else _encode(entry["payload"])
+
+def _accepts(header: str, coding: str) -> bool:
+    for part in header.lower().split(","):
+        name, _, params = part.partition(";")
+        if name.strip() == coding:
+            q = params.replace(" ", "").removeprefix("q=")
+            try:
+                return not params or float(q) > 0
+            except ValueError:
+                return False
+    return False
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:             # optional: gzip only
+        return None
+    return brotli
+
+def _negotiate(enc: _Encoded, accept_encoding: str) -> tuple[bytes, str | None]:
+    """Body and Content-Encoding for a request's Accept-Encoding."""
+    if len(enc.body) < COMPRESS_MIN_BYTES or not accept_encoding:
+        return enc.body, None
+    if enc.br is None and _accepts(accept_encoding, "br") and (brotli := _brotli()):
+        enc.br = brotli.compress(enc.body, quality=11)
+        _responses[enc.etag] = enc      # re-account the size
+    if enc.br is not None and _accepts(accept_encoding, "br"):
+        return enc.br, "br"
+    if _accepts(accept_encoding, "gzip"):
+        if enc.gzip is None:
+            enc.gzip = gzip.compress(enc.body, mtime=0)
+            _responses[enc.etag] = enc
+        return enc.gzip, "gzip"
+    return enc.body, None
+
+def _variant_etag(etag: str, coding: str | None) -> str:
+    # each encoding is its own representation, so its own strong validator
+    return f'{etag[:-1]}-{coding}"' if coding else etag
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    """If-None-Match (weak comparison) against any encoding of this body."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == etag or (tag.startswith(etag[:-1] + "-") and tag.endswith('"')):
+            return True
+    return False
+
+@router.get("/api/health")
 def health(): 
     return {"ok": True}
 
-# ---- scoring heuristics ---------------------------------------------------
-def _score_and_recos(payload: dict) -> tuple[int, list[str]]:
-    score = 100
-    recos: list[str] = []
-    tlen = payload["title_length"]
-    dlen = payload["meta_description_length"]
-
-    # Title
-    if tlen == 0:
-        score -= 15; recos.append("Add a concise, descriptive <title> (30–60 characters).")
-    elif tlen < 30:
-        score -= 8;  recos.append("Title is short; target 30–60 characters.")
-    elif tlen > 60:
-        score -= 5;  recos.append("Title is long; consider trimming to 60 characters or fewer.")
-
-    # Meta description
-    if dlen == 0:
-        score -= 12; recos.append("Add a meta description (70–160 characters).")
-    elif dlen < 70:
-        score -= 6;  recos.append("Meta description is short; expand toward 70–160 characters.")
-    elif dlen > 160:
-        score -= 6;  recos.append("Meta description is long; trim toward 160 characters.")
-
-    # H1
-    if payload["multiple_h1"]:
-        score -= 6;  recos.append("Multiple H1s detected; keep a single primary H1.")
-    elif len(payload["h1"]) == 0:
-        score -= 10; recos.append("Add an H1 heading that matches page intent.")
-
-    # Canonical
-    if not payload["canonical"]:
-        score -= 6;  recos.append("Add a canonical link to prevent duplicate content issues.")
-
-    # Robots
-    if payload["noindex"]:
-        score -= 40; recos.append("robots meta contains 'noindex'; page will not be indexed.")
-    if payload["nofollow"]:
-        score -= 8;  recos.append("robots meta contains 'nofollow'; internal linking equity may be lost.")
-
-    # Mobile
-    if not payload["viewport"]:
-        score -= 6;  recos.append("Add a responsive viewport meta tag for mobile friendliness.")
-
-    # Social preview
-    if payload["og_count"] == 0:
-        score -= 4;  recos.append("Add Open Graph tags for better social sharing previews.")
-    if payload["twitter_count"] == 0:
-        score -= 2;  recos.append("Add Twitter Card tags for richer shares on X/Twitter.")
-
-    # Structured data
-    if payload["jsonld_count"] == 0:
-        score -= 4;  recos.append("Add JSON-LD structured data relevant to the page content.")
-
-    # Status
-    if payload["status"] != 200:
-        score -= 10; recos.append(f"HTTP status is {payload['status']}; aim for 200 on canonical URL.")
-
-    return max(0, min(100, score)), recos
+@router.get("/api/upstream/stats")
+async def upstream_stats():
+    return {**_upstream_pool_stats(), "guard": _hosts.stats(), "failures_cached": len(_failures)}
+
+@router.get("/api/cache/stats")
+async def cache_stats():
+    """Result cache hit rate and size (hits/misses are this worker's)."""
+    return await cache.astats()
+
+@router.get("/api/metrics")
+async def metrics_endpoint():
+    """Prometheus exposition: stage latency histograms, cache and upstream counters."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    pool = _upstream_pool_stats()
+    cached = await cache.astats()
+    gauges = {
+        "seo_result_cache_entries": cached["entries"] or 0,
+        "seo_result_cache_bytes": cached["bytes"] or 0,
+        "seo_upstream_connections_idle": pool["idle"],
+        "seo_upstream_connections_active": pool["active"],
+        "seo_upstream_requests_waiting": pool["waiting"],
+        "seo_parse_jobs_in_flight": _parse_jobs,
+        "seo_html_memo_bytes": _html_memo.currsize,
+        "seo_response_memo_bytes": _responses.currsize,
+        "seo_dns_cache_entries": len(_dns_cache),
+    }
+    return Response(content=metrics.render(gauges), media_type="text/plain; version=0.0.4")
 
 # ---- main analyzer --------------------------------------------------------
-@app.get("/api/analyze", response_model=AnalyzeOut)
-async def analyze(url: HttpUrl, response: Response):
-    key_in = str(url).rstrip("/")
-    if key_in in cache:
-        # honor client/proxy cache on hits too
-        response.headers["Cache-Control"] = "public, max-age=900"
-        return cache[key_in]
+# Concurrent misses for one URL share a single fetch: within the process via
+# _flights, across workers via a cache lease (the losers poll the cache for
+# the winner's result). Stale entries are served while one background fetch
+# refreshes them.
+#
+# Cache entries are {"payload", "etag", "last_modified", "sha256",
+# "response_etag"}. A refresh sends the upstream validators (etag,
+# last_modified) and keeps the stored payload on a 304, or on a 200 whose
+# body hashes the same (servers that ignore conditionals). response_etag
+# names the encoded response body in _responses.
+
+FLIGHT_LEASE = UPSTREAM_DEADLINE + UPSTREAM_TIMEOUT   # a crashed filler's lease lapses after this
+FLIGHT_POLL  = 0.05
+
+_flights: dict[str, asyncio.Task] = {}
+
+# Per-host rate limit + circuit breaker (upstream_guard.py), and failed URLs
+# remembered for UPSTREAM_NEGATIVE_TTL so a broken page is not refetched
+# on every scan: cache key -> (status, detail)
+_hosts = HostGuard()
+_failures = TTLCache(maxsize=10_000, ttl=UPSTREAM_NEGATIVE_TTL)
+
+def _cache_key(url: str) -> str:
+    # entries built under older scoring rules or payload fields are never served
+    return f"v{RULES_VERSION}:" + (normalize_url(url) or url).rstrip("/")
+
+async def _cached(url: str, head_only: bool = False, fresh: bool = False) -> dict | None:
+    """
+    Cache entry for url; a stale hit is returned and refreshed in the
+    background, or with fresh=True counted as a miss (the caller's fetch
+    revalidates it).
+    """
+    key_in = _cache_key(url)
+    # a full result also answers a head-only request
+    for key in ((key_in, "head:" + key_in) if head_only else (key_in,)):
+        hit = await cache.aget(key)
+        if hit is not None:
+            entry, is_fresh = hit
+            if not is_fresh:
+                if fresh:
+                    continue
+                _flight(url, key.startswith("head:"), block=True)
+            result = "hit" if is_fresh else "stale"
+            metrics.count("seo_result_cache_total", "result", result)
+            metrics.note("cache", result)
+            return entry
+    metrics.count("seo_result_cache_total", "result", "miss")
+    metrics.note("cache", "miss")
+    return None
+
+def _flight(url: str, head_only: bool, block: bool) -> asyncio.Task:
+    """The in-process fetch task for (url, mode), started if none is running."""
+    key = ("head:" if head_only else "") + _cache_key(url)
+    task = _flights.get(key)
+    if task is None:
+        task = asyncio.create_task(_fill(url, key, head_only, block))
+        _flights[key] = task
+        # retrieve the exception so unawaited revalidations do not warn
+        task.add_done_callback(lambda t: (_flights.pop(key, None), t.cancelled() or t.exception()))
+    return task
+
+async def _fill(url: str, key: str, head_only: bool, block: bool) -> dict:
+    """Fetch under the cross-worker lease, or wait for the worker holding it."""
+    deadline = time.monotonic() + FLIGHT_LEASE
+    # a head-only fetch that reached the end of the page is stored as full
+    keys = (key.removeprefix("head:"), key)
+    while not await cache.alease(key, FLIGHT_LEASE):
+        await asyncio.sleep(FLIGHT_POLL)
+        for k in keys:
+            hit = await cache.aget(k)
+            if hit is not None and hit[1]:
+                return hit[0]
+        if time.monotonic() > deadline:
+            break                       # holder is stuck; fetch ourselves
+    try:
+        prior = await cache.aget(key)
+        return await _fetch_url(url, head_only, block=block, prior=prior and prior[0])
+    except HTTPException as e:
+        # Errors with Retry-After are our own backpressure (parse pool, rate
+        # limit, open circuit), not something wrong with this URL
+        if not e.headers:
+            _failures[_cache_key(url)] = (e.status_code, e.detail)
+        raise
+    finally:
+        await cache.arelease(key)
+
+@router.get("/api/analyze", response_model=AnalyzeOut)
+async def analyze(url: HttpUrl, request: Request, head_only: bool = False):
+    """
+    head_only=true stops reading once </head> and the first <h1> have been
+    parsed; the result is flagged partial and cached apart from full scans
+    (a cached full scan still answers a head-only request).
 
-    # Pre-fetch SSRF guard on requested host
-    host = re.sub(r"^https?://", "", str(url)).split("/")[0]
-    _resolve_and_block(host)
+    The body is sent pre-encoded (see _encoded); If-None-Match with the
+    current ETag gets a 304.
+    """
+    with metrics.request() as timing:
+        enc = _encoded(await _analyze_entry(str(url), head_only))
+        # help client/proxies reuse (hits included)
+        headers = {"Cache-Control": "public, max-age=900", "Vary": "Accept-Encoding"}
+        body, coding = _negotiate(enc, request.headers.get("accept-encoding", ""))
+        headers["ETag"] = _variant_etag(enc.etag, coding)
+        if coding:
+            headers["Content-Encoding"] = coding
+        if timing is not None:
+            headers["Server-Timing"] = metrics.server_timing(timing)
+        if _etag_matches(request.headers.get("if-none-match"), enc.etag):
+            metrics.count("seo_analyze_responses_total", "encoding", "not_modified")
+            return Response(status_code=304, headers=headers)
+        metrics.count("seo_analyze_responses_total", "encoding", coding or "identity")
+        return Response(body, media_type="application/json", headers=headers)
+
+async def _analyze_url(url: str, head_only: bool = False, links: list[tuple[str, str]] | None = None,
+                       *, block: bool = False) -> dict:
+    """
+    Cache lookup + coalesced fetch + analysis for one validated URL; raises
+    HTTPException. When `links` is a list the page is always fetched and the
+    list is filled with its (absolute <a href>, rel) pairs (crawler). block=True
+    waits for a parse slot instead of failing with 503 (batch and crawl work).
+    """
+    if links is not None:
+        return (await _fetch_url(url, head_only, links, block=block))["payload"]
+    return (await _analyze_entry(url, head_only, block=block))["payload"]
 
-    headers = {"User-Agent": USER_AGENT}
-    limits = httpx.Limits(max_keepalive_connections=20, max_connections=60)
+async def _analyze_entry(url: str, head_only: bool = False, *, block: bool = False,
+                         fresh: bool = False) -> dict:
+    """
+    Cache entry for url: a hit, or the result of the (coalesced) fetch.
+    fresh=True waits for the revalidation of a stale entry (monitoring).
+    """
+    hit = await _cached(url, head_only, fresh)
+    if hit is not None:
+        return hit
+    failed = _failures.get(_cache_key(url))
+    if failed is not None:
+        metrics.count("seo_failure_cache_total", "result", "hit")
+        metrics.note("cache", "negative")
+        raise HTTPException(status_code=failed[0], detail=failed[1])
+    # shielded: a caller that goes away does not cancel the others' fetch
+    return await asyncio.shield(_flight(url, head_only, block))
+
+async def _fetch_url(url: str, head_only: bool = False, links: list[tuple[str, str]] | None = None,
+                     *, block: bool = False, prior: dict | None = None) -> dict:
+    """
+    Fetch + analysis; stores the entry under the input and final URLs and
+    returns it. `prior` is the expiring cache entry being revalidated, if any.
+    The host's rate limit and circuit breaker are checked first; DNS,
+    redirects and the download then share one UPSTREAM_DEADLINE.
+    """
+    import httpx     # loaded by _upstream_client
+    host = (urlsplit(url).hostname or "").lower()
+    try:
+        await _hosts.admit(host)
+    except Rejected as e:
+        metrics.count("seo_upstream_rejected_total", "reason", e.reason)
+        status, detail = ((429, "Too many requests to this host") if e.reason == "rate_limited"
+                          else (503, "Upstream host failing, retry later"))
+        raise HTTPException(status_code=status, detail=detail,
+                            headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+    client = _upstream_client()
+    extensions = {"trace": _upstream_trace()} if metrics.METRICS_ENABLED else None
+    headers = {}
+    if prior and prior["etag"]:
+        headers["If-None-Match"] = prior["etag"]
+    if prior and prior["last_modified"]:
+        headers["If-Modified-Since"] = prior["last_modified"]
 
     try:
-        async with httpx.AsyncClient(
-            timeout=httpx.Timeout(15.0),
-            follow_redirects=True,
-            headers=headers,
-            http2=True,
-            limits=limits,
-        ) as client:
-            async with client.stream("GET", str(url)) as r:
+        async with asyncio.timeout(UPSTREAM_DEADLINE):
+            # Pre-fetch SSRF guard on requested host; warms the DNS cache that the
+            # pinned connection below dials from
+            with metrics.stage("dns"):
+                await _resolve_and_block(host)
+
+            async with client.stream("GET", url, headers=headers, extensions=extensions) as r:
+                metrics.count("seo_upstream_responses_total", "status", r.status_code)
+                if r.status_code >= 500:
+                    _hosts.failure(host)
+                else:
+                    _hosts.success(host)
+                etag, last_modified = r.headers.get("etag"), r.headers.get("last-modified")
+                if r.status_code == 304 and prior:
+                    # unchanged upstream: keep the analysis, restart its TTL
+                    return await _store(url, str(r.url), prior["payload"], etag or prior["etag"],
+                                  last_modified or prior["last_modified"], prior["sha256"])
                 try:
                     r.raise_for_status()
                 except httpx.HTTPStatusError:
                     raise HTTPException(status_code=r.status_code, detail="Upstream error")
 
-                # Post-redirect SSRF check on final host
-                _resolve_and_block(r.url.host)
+                # Redirect hops were vetted by _PinnedBackend as each connection
+                # opened; this re-check of the final host is a cache hit
+                await _resolve_and_block(r.url.host)
 
                 # Bail on non-HTML
                 ct = (r.headers.get("content-type") or "").lower()
                 if ct and "html" not in ct:
                     raise HTTPException(status_code=415, detail=f"Non-HTML content-type: {ct}")
 
-                # Stream with size cap
+                # Stream with size cap. Small documents are decoded and parsed
+                # on the loop as chunks arrive, overlapping the download; once a
+                # document outgrows PARSE_INLINE_BYTES (or says so up front in
+                # Content-Length) it is parsed in the pool from the raw bytes.
+                # Those are only kept while the pool may still need them: an
+                # inline parse holds at most PARSE_INLINE_BYTES of them, and
+                # none without a pool. Head-only scans start inline and stop
+                # as soon as the head (and first <h1>) is seen; one that gets
+                # past PARSE_INLINE_BYTES without that reads the rest and
+                # goes to the pool as a full scan. A revalidation buffers
+                # first: an unchanged body is not parsed.
                 limit = 2_500_000
-                buf = bytearray()
+                inline = head_only or PARSE_WORKERS <= 0
+                if not inline:
+                    declared = r.headers.get("content-length", "")
+                    inline = not declared.isdigit() or int(declared) <= PARSE_INLINE_BYTES
+                if prior and prior["sha256"] and not head_only:
+                    inline = False
+                collect_text = DUPES_ENABLED and not head_only
+                stream = StreamingExtractor(r.charset_encoding, collect_links=links is not None,
+                                            collect_text=collect_text)
+                digest = hashlib.sha256()
+                handoff = PARSE_WORKERS > 0         # inline may still move to the pool
+                raw = bytearray() if not inline or handoff else None
+                size = 0
+                partial = False
+                parse_time = 0.0
+                t_body = time.perf_counter()
                 async for chunk in r.aiter_bytes():
-                    buf += chunk
-                    if len(buf) > limit:
+                    size += len(chunk)
+                    if size > limit:
                         raise HTTPException(status_code=504, detail="Response too large (2.5MB limit)")
-                html = buf.decode(r.encoding or "utf-8", errors="replace")
-
-        soup = BeautifulSoup(html, "html.parser")
-
-        # basics
-        title = (soup.title.string or "").strip() if soup.title and soup.title.string else ""
-        desc  = (soup.find("meta", attrs={"name":"description"}) or {}).get("content","") or ""
-        h1s   = [h.get_text(strip=True) for h in soup.find_all("h1")]
-        can   = soup.find("link", rel=lambda v: v and "canonical" in v.lower())
-        canonical = can.get("href") if can else None
-
-        # robots meta (robots or googlebot)
-        robots_tag   = soup.find("meta", attrs={"name": lambda v: v and v.lower() in ("robots","googlebot")})
-        robots       = (robots_tag.get("content") or "").lower() if robots_tag else ""
-        noindex      = "noindex" in robots
-        nofollow     = "nofollow" in robots
-
-        # viewport
-        viewport = bool(soup.find("meta", attrs={"name":"viewport"}))
-
-        # social tags
-        og_count      = len(soup.find_all(attrs={"property": re.compile(r"^og:", re.I)}))
-        twitter_count = len(soup.find_all(attrs={"name": re.compile(r"^twitter:", re.I)}))
-
-        # JSON-LD
-        jsonld_nodes = soup.find_all("script", attrs={"type": re.compile(r"application/ld\+json", re.I)})
-        jsonld_count = 0
-        jsonld_types: list[str] = []
-        for node in jsonld_nodes:
-            try:
-                data = json.loads(node.string or "{}")
-                jsonld_count += 1
-                if isinstance(data, list):
-                    for d in data:
-                        t = d.get("@type") if isinstance(d, dict) else None
-                        if isinstance(t, list): jsonld_types += [str(x) for x in t]
-                        elif t: jsonld_types.append(str(t))
-                elif isinstance(data, dict):
-                    t = data.get("@type")
-                    if isinstance(t, list): jsonld_types += [str(x) for x in t]
-                    elif t: jsonld_types.append(str(t))
-            except Exception:
-                # ignore malformed blocks
-                continue
-
-        # build payload for scoring
-        payload = {
-            "ok": True,
-            "status": int(r.status_code),
-            "final_url": str(r.url),
-            "title": title,
-            "title_length": len(title),
-            "meta_description": desc,
-            "meta_description_length": len(desc),
-            "h1": h1s,
-            "multiple_h1": len(h1s) > 1,
-            "canonical": canonical,
-            "robots": robots or None,
-            "noindex": noindex,
-            "nofollow": nofollow,
-            "viewport": viewport,
-            "og_count": og_count,
-            "twitter_count": twitter_count,
-            "jsonld_count": jsonld_count,
-            "jsonld_types": jsonld_types,
-            "score": 0,                 # temp, replaced below
-            "recommendations": [],      # temp, replaced below
-        }
+                    if raw is not None:
+                        raw += chunk
+                    digest.update(chunk)
+                    if not inline:
+                        continue
+                    t = time.perf_counter()
+                    stream.feed(chunk)
+                    parse_time += time.perf_counter() - t
+                    if head_only and stream.parser.head_complete:
+                        # leaving the block closes the stream; the rest is never read
+                        partial = True
+                        break
+                    if size > PARSE_INLINE_BYTES and handoff:
+                        inline = False
+                metrics.record("download", time.perf_counter() - t_body - parse_time)
+    except TimeoutError:
+        _hosts.failure(host)
+        metrics.count("seo_upstream_responses_total", "status", "deadline")
+        raise HTTPException(status_code=504, detail=f"Upstream deadline exceeded ({UPSTREAM_DEADLINE:g}s)")
+    except httpx.RequestError as e:
+        if isinstance(e, httpx.TransportError):     # timeouts, refused/reset connections
+            _hosts.failure(host)
+        metrics.count("seo_upstream_responses_total", "status", "error")
+        raise HTTPException(status_code=504, detail=f"Timeout or network error: {e}")
 
+    status, final_url = int(r.status_code), str(r.url)
+    sha256 = None if partial else digest.hexdigest()
+    text, text_sig = None, None
+    if inline:
+        # one pass over the document collected every signal
+        t = time.perf_counter()
+        sig = stream.close()
+        if collect_text:
+            text = "".join(stream.parser.text)      # hashed on the index thread
+        metrics.record("parse", parse_time + time.perf_counter() - t)
+        if links is not None:
+            links.extend((urljoin(final_url, href), rel) for href, rel in stream.parser.links)
+        payload = _url_payload(sig, status, final_url, partial)
+    elif prior and sha256 == prior["sha256"] and final_url == prior["payload"]["final_url"]:
+        payload = prior["payload"]          # same bytes, same analysis (and already indexed)
+        collect_text = False
+    else:
+        # parse + score in one stage; in the pool it includes the hand-off
+        args = (bytes(raw), r.charset_encoding, status, final_url, links is not None, collect_text)
+        with metrics.stage("parse"):
+            if size <= PARSE_INLINE_BYTES or PARSE_WORKERS <= 0:
+                payload, found, text_sig = _analyze_document(*args)
+            else:
+                payload, found, text_sig = await _offload(_analyze_document, *args, block=block)
+        if links is not None:
+            links.extend(found)
+    if collect_text:
+        _index_page(normalize_url(final_url) or final_url, payload["title"], payload["meta_description"],
+                    text, text_sig)
+
+    return await _store(url, final_url, payload, etag, last_modified, sha256)
+
+# httpcore trace events -> stages; one tracer per fetch (redirect hops add up)
+_TRACE_STAGES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "receive_response_headers": "ttfb",
+}
+
+def _upstream_trace():
+    started: dict[str, float] = {}
+
+    async def trace(event: str, info: dict) -> None:
+        name, _, phase = event.rpartition(".")
+        if phase == "started":
+            started[name] = time.perf_counter()
+        elif name in started:           # complete / failed
+            stage = _TRACE_STAGES.get(name.rpartition(".")[2])
+            t = started.pop(name)
+            if stage:
+                metrics.record(stage, time.perf_counter() - t)
+    return trace
+
+async def _store(url: str, final_url: str, payload: dict, etag: str | None,
+                 last_modified: str | None, sha256: str | None) -> dict:
+    # cache by input and final URLs; a head-only scan that reached the end
+    # of the document is a full result
+    prefix = "head:" if payload["partial"] else ""
+    entry = {"payload": payload, "etag": etag, "last_modified": last_modified, "sha256": sha256,
+             "response_etag": _encode(payload).etag}
+    for key in {_cache_key(url), _cache_key(final_url)}:
+        await cache.aset(prefix + key, entry)
+    return entry
+
+def _url_payload(sig: dict, status: int, final_url: str, partial: bool = False) -> dict:
+    """Scored /api/analyze payload from extracted page signals."""
+    title = sig["title"]
+    desc  = sig["meta_description"]
+    h1s   = sig["h1"]
+
+    # build payload for scoring
+    payload = {
+        "ok": True,
+        "status": status,
+        "final_url": final_url,
+        "title": title,
+        "title_length": len(title),
+        "meta_description": desc,
+        "meta_description_length": len(desc),
+        "h1": h1s,
+        "multiple_h1": len(h1s) > 1,
+        "canonical": sig["canonical"],
+        "robots": sig["robots"] or None,
+        "noindex": sig["noindex"],
+        "nofollow": sig["nofollow"],
+        "viewport": sig["viewport"],
+        "og_count": sig["og_count"],
+        "twitter_count": sig["twitter_count"],
+        "jsonld_count": sig["jsonld_valid"],   # only blocks that parse
+        "jsonld_types": sig["jsonld_types"],
+        "ai_agents": sig["ai_agents"],
+        "score": 0,                 # temp, replaced below
+        "recommendations": [],      # temp, replaced below
+        "partial": partial,
+    }
+
+    with metrics.stage("score"):
         score, recos = _score_and_recos(payload)
-        payload["score"] = score
-        payload["recommendations"] = recos
+    payload["score"] = score
+    payload["recommendations"] = recos
+    return payload
 
-        # cache by input and final URLs
-        key_final = str(r.url).rstrip("/")
-        cache[key_in] = payload
-        cache[key_final] = payload
+def _analyze_document(data: bytes, charset: str | None, status: int, final_url: str,
+                      collect_links: bool = False, collect_text: bool = False
+                      ) -> tuple[dict, list[tuple[str, str]], bytes | None]:
+    """Parse pool entry point: raw body -> (payload, (absolute link, rel) pairs, text MinHash)."""
+    stream = StreamingExtractor(charset, collect_links=collect_links, collect_text=collect_text)
+    stream.feed(data)
+    sig = stream.close()
+    links = [(urljoin(final_url, href), rel) for href, rel in stream.parser.links] if collect_links else []
+    text_sig = minhash("".join(stream.parser.text)) if collect_text else None
+    return _url_payload(sig, status, final_url), links, text_sig
 
-        # help client/proxies reuse
-        response.headers["Cache-Control"] = "public, max-age=900"
-        return payload
+# ---- batch analysis -------------------------------------------------------
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))   # fetches in flight
+BATCH_PER_HOST    = int(os.getenv("BATCH_PER_HOST", "8"))       # fetches per host
+BATCH_MAX_URLS    = int(os.getenv("BATCH_MAX_URLS", "50000"))
 
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=504, detail=f"Timeout or network error: {e}")
+_http_url = TypeAdapter(HttpUrl)
+
+class AnalyzeBatchIn(BaseModel):
+    urls: list[str]
+
+async def _batch_lines(request: Request) -> list[str]:
+    """
+    Split an NDJSON / plain-text upload into lines chunk by chunk. The body is
+    drained before the response starts because StreamingResponse listens on
+    the same receive channel for client disconnects.
+    """
+    lines: list[str] = []
+    tail = b""
+    async for chunk in request.stream():
+        *done, tail = (tail + chunk).split(b"\n")
+        lines += [line.decode("utf-8", "replace") for line in done]
+        if len(lines) > BATCH_MAX_URLS:
+            break
+    if tail:
+        lines.append(tail.decode("utf-8", "replace"))
+    return lines
+
+def _batch_url(line: str) -> str:
+    # bare URL, JSON string or {"url": ...} object
+    line = line.strip()
+    if line[:1] in ('"', "{"):
+        item = json.loads(line)
+        line = item.get("url", "") if isinstance(item, dict) else str(item)
+    return line
+
+async def _run_batch(urls: list[str], head_only: bool) -> AsyncIterator[bytes]:
+    """
+    Analyze URLs with a global and a per-host concurrency cap, yielding one
+    NDJSON line per distinct URL as soon as its result (or error) is ready.
+    Cache hits are answered without taking a fetch slot.
+    """
+    out: asyncio.Queue = asyncio.Queue()
+    window = asyncio.Semaphore(BATCH_CONCURRENCY * 4)   # tasks created ahead of the fetch slots
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    hosts: dict[str, list] = {}                         # host -> [semaphore, users]
+    tasks: set[asyncio.Task] = set()
+
+    def emit(line: dict) -> None:
+        out.put_nowait(json.dumps(line, ensure_ascii=False).encode() + b"\n")
+
+    async def run(index: int, url: str) -> None:
+        host = urlsplit(url).hostname or ""
+        entry = hosts.setdefault(host, [asyncio.Semaphore(BATCH_PER_HOST), 0])
+        entry[1] += 1
+        try:
+            # take the host slot first so a queue of same-host URLs does not
+            # sit on global slots other hosts could use
+            async with entry[0], slots:
+                emit({"index": index, "url": url, "result": await _analyze_url(url, head_only, block=True)})
+        except HTTPException as e:
+            emit({"index": index, "url": url, "error": {"status": e.status_code, "detail": e.detail}})
+        except Exception as e:
+            emit({"index": index, "url": url, "error": {"status": 500, "detail": f"Internal error: {type(e).__name__}"}})
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                hosts.pop(host, None)
+            window.release()
+
+    async def feed() -> None:
+        seen: set[str] = set()
+        index = -1
+        try:
+            for raw in urls:
+                if not raw.strip():
+                    continue
+                index += 1
+                if index >= BATCH_MAX_URLS:
+                    emit({"index": index, "error": {"status": 413, "detail": f"Batch limited to {BATCH_MAX_URLS} URLs"}})
+                    break
+                try:
+                    url = str(_http_url.validate_python(_batch_url(raw)))
+                except ValueError:      # bad JSON line or ValidationError
+                    emit({"index": index, "url": raw.strip(), "error": {"status": 422, "detail": "Invalid URL"}})
+                    continue
+                key = _cache_key(url)
+                if key in seen:
+                    continue
+                seen.add(key)
+                hit = await _cached(url, head_only)
+                if hit is not None:
+                    emit({"index": index, "url": url, "result": hit["payload"]})
+                    continue
+                await window.acquire()
+                task = asyncio.create_task(run(index, url))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(set(tasks))
+        finally:
+            out.put_nowait(None)
+
+    producer = asyncio.create_task(feed())
+    try:
+        while (line := await out.get()) is not None:
+            yield line
+    finally:
+        # client went away or the stream finished: stop outstanding work
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+@router.post("/api/analyze/batch")
+async def analyze_batch(request: Request, head_only: bool = False):
+    """
+    Body: {"urls": [...]} as JSON, or an NDJSON / newline-separated upload
+    (bare URLs, JSON strings or {"url": ...}). Responds with NDJSON, one line per
+    distinct URL in completion order: {"index", "url", "result"} or
+    {"index", "url", "error": {"status", "detail"}}.
+    """
+    ctype = (request.headers.get("content-type") or "").lower()
+    if "json" in ctype and "ndjson" not in ctype:
+        try:
+            body = AnalyzeBatchIn.model_validate_json(await request.body())
+        except ValidationError:
+            raise HTTPException(status_code=400, detail="Expected {\"urls\": [...]}")
+        urls = body.urls
+    else:
+        urls = await _batch_lines(request)
+    return StreamingResponse(_run_batch(urls, head_only), media_type="application/x-ndjson")
+
+# ---- site crawls -----------------------------------------------------------
+# Frontier and results are kept in SQLite by crawler.CrawlStore, so a crawl
+# of any size runs in constant memory and resumes after a restart.
+_crawler: Crawler | None = None
+
+def _crawls() -> Crawler:
+    global _crawler
+    if _crawler is None:
+        _crawler = Crawler(CrawlStore(), _upstream_client, functools.partial(_analyze_url, block=True), USER_AGENT)
+    return _crawler
+
+class CrawlIn(BaseModel):
+    url: HttpUrl
+    max_pages: int = Field(1000, ge=1, le=CRAWL_MAX_PAGES)
+    use_sitemap: bool = True
+    follow_links: bool = True
+    max_depth: int = Field(5, ge=0, le=100)
+    head_only: bool = False
+
+def _crawl_or_404(crawl_id: int) -> dict:
+    crawl = _crawls().store.get(crawl_id)
+    if crawl is None:
+        raise HTTPException(status_code=404, detail="Unknown crawl")
+    return crawl
+
+@router.post("/api/crawl", status_code=202)
+async def crawl_start(body: CrawlIn):
+    """Start a background crawl from the site's sitemaps and/or same-site links."""
+    root = normalize_url(str(body.url))
+    await _resolve_and_block(urlsplit(root).hostname or "")
+    opts = body.model_dump(exclude={"url"})
+    return {"id": _crawls().start(root, opts), "url": root}
+
+@router.get("/api/crawl/{crawl_id}")
+def crawl_status(crawl_id: int):
+    """Crawl progress; `summary` is the site-level aggregate (live while running)."""
+    crawl = _crawl_or_404(crawl_id)
+    if crawl["summary"] is None:
+        crawl["summary"] = _crawls().store.summary(crawl_id)
+    return crawl
+
+@router.get("/api/crawl/{crawl_id}/pages")
+def crawl_pages(crawl_id: int, offset: int = Query(0, ge=0),
+                limit: int = Query(100, ge=1, le=1000), detail: bool = False):
+    _crawl_or_404(crawl_id)
+    return {"offset": offset, "pages": _crawls().store.pages(crawl_id, offset, limit, detail)}
+
+@router.get("/api/crawl/{crawl_id}/links")
+def crawl_links(crawl_id: int, limit: int = Query(100, ge=1, le=1000),
+                deep: int = Query(GRAPH_DEEP, ge=1, le=100)):
+    """
+    Internal link graph of the crawl: pages ranked by link equity (PageRank
+    over followed links), orphan pages and pages more than `deep` clicks
+    from the root. Computed on request, so it is live while crawling.
+    """
+    crawl = _crawl_or_404(crawl_id)
+    urls, graph = _crawls().store.link_graph(crawl_id)
+    root = urls.index(crawl["root"]) if crawl["root"] in urls else -1
+    return link_report(graph, urls, root, limit, deep)
+
+@router.post("/api/crawl/{crawl_id}/cancel")
+async def crawl_cancel(crawl_id: int):
+    crawl = _crawl_or_404(crawl_id)
+    if crawl["status"] in ("queued", "running"):
+        await _crawls().cancel(crawl_id)
+    return _crawl_or_404(crawl_id)
+
+# ---- monitoring -------------------------------------------------------------
+# Registered URLs are re-scanned on a jittered schedule by monitor.Scheduler
+# through the same coalesced, cached pipeline as /api/analyze; a cached
+# result still fresh at scan time is reused, a stale one is revalidated.
+MONITOR_MAX_REGISTER = int(os.getenv("MONITOR_MAX_REGISTER", "10000"))   # URLs per request
+
+_monitor: Scheduler | None = None
+
+def _monitors() -> Scheduler:
+    global _monitor
+    if _monitor is None:
+        _monitor = Scheduler(MonitorStore(), functools.partial(_analyze_entry, block=True, fresh=True))
+    return _monitor
+
+class MonitorIn(BaseModel):
+    urls: list[HttpUrl] = Field(min_length=1, max_length=MONITOR_MAX_REGISTER)
+    interval: float = Field(86400, ge=MONITOR_MIN_INTERVAL, description="seconds between scans")
+    head_only: bool = False
+
+def _monitor_or_404(monitor_id: int) -> dict:
+    monitor = _monitors().store.get(monitor_id)
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Unknown monitor")
+    return monitor
+
+@router.post("/api/monitors", status_code=201)
+def monitor_register(body: MonitorIn):
+    """
+    Monitor URLs: each is scanned once per `interval` (+/- jitter), first
+    within the next jitter window. Registering a monitored URL again
+    updates its interval and mode.
+    """
+    urls = list(dict.fromkeys(normalize_url(str(u)) or str(u) for u in body.urls))
+    monitors = _monitors().store.register(urls, body.interval, body.head_only)
+    _monitors().wake()
+    return {"monitors": monitors}
+
+@router.get("/api/monitors")
+def monitor_list(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    return {"offset": offset, "monitors": _monitors().store.monitors(offset, limit)}
+
+@router.get("/api/monitors/stats")
+def monitor_stats():
+    """Schedule health: monitors due now, how late the oldest is (lag, s), scans in flight."""
+    return _monitors().stats()
+
+@router.get("/api/monitors/{monitor_id}")
+def monitor_status(monitor_id: int):
+    return _monitor_or_404(monitor_id)
+
+@router.delete("/api/monitors/{monitor_id}")
+def monitor_delete(monitor_id: int):
+    if not _monitors().store.delete(monitor_id):
+        raise HTTPException(status_code=404, detail="Unknown monitor")
+    return {"deleted": monitor_id}
+
+@router.get("/api/monitors/{monitor_id}/history")
+def monitor_history(monitor_id: int, since: float | None = None, until: float | None = None,
+                    limit: int = Query(1000, ge=1, le=10000)):
+    """
+    Score history as runs of identical results, newest first: `from`/`to`
+    are the first and last scan (Unix seconds) that saw this score, status
+    and body digest, `scans` how many scans did. Failed scans have a status
+    and no score.
+    """
+    monitor = _monitor_or_404(monitor_id)
+    return {"id": monitor_id, "url": monitor["url"],
+            "runs": _monitors().store.history(monitor_id, since, until, limit)}
+
+# ---- duplicate content ----------------------------------------------------
+# Every fetched page (full scans; head-only scans stop before the body) is
+# added to duplicates.DuplicateIndex: exact title / description keys per
+# site plus a MinHash of its body text, bucketed by LSH.
+#
+# The index and its SQLite connection belong to one thread of their own:
+# fetches queue pages to it without waiting (MinHash of inline-parsed text
+# included) and the endpoints await their queries there, so neither the
+# hashing nor the writes run on the event loop. Past DUPES_BACKLOG queued
+# pages, new ones are skipped rather than held in memory.
+DUPES_BACKLOG = int(os.getenv("DUPES_BACKLOG", "1000"))
+
+_dupe_index: DuplicateIndex | None = None
+_dupe_thread: "ThreadPoolExecutor | None" = None
+_dupe_backlog = 0
+
+def _dupes() -> DuplicateIndex:
+    """The index; only called on the index thread."""
+    global _dupe_index
+    if _dupe_index is None:
+        _dupe_index = DuplicateIndex()
+    return _dupe_index
+
+def _dupes_submit(fn, *args):
+    global _dupe_thread
+    if _dupe_thread is None:
+        from concurrent.futures import ThreadPoolExecutor
+        # import numpy here rather than on that thread: a parse worker forked
+        # while it held the import lock would hang on its own first import
+        minhash("warm up")
+        _dupe_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dupes")
+    return _dupe_thread.submit(fn, *args)
+
+def _index_page(url: str, title: str, description: str, text: str | None, sig: bytes | None) -> None:
+    """Queue a page for the index; text (when given) is hashed there."""
+    global _dupe_backlog
+    if _dupe_backlog >= DUPES_BACKLOG:
+        metrics.count("seo_dupes_skipped_total", "reason", "backlog")
+        return
+
+    def run() -> None:
+        t = time.perf_counter()
+        _dupes().add(url, title, description, minhash(text) if text is not None else sig)
+        metrics.record("index", time.perf_counter() - t)
+
+    def done(future) -> None:
+        global _dupe_backlog
+        _dupe_backlog -= 1
+        future.exception()              # retrieved: a failed add is not fatal
+
+    _dupe_backlog += 1
+    # the callback runs on the index thread; hop back to the loop for the counter
+    loop = asyncio.get_running_loop()
+    _dupes_submit(run).add_done_callback(lambda f: loop.call_soon_threadsafe(done, f))
+
+async def _dupes_query(method: str, *args):
+    """DuplicateIndex.<method>(*args) on the index thread, after the pages queued before it."""
+    if not DUPES_ENABLED:
+        raise HTTPException(status_code=404, detail="Duplicate index disabled")
+    return await asyncio.wrap_future(_dupes_submit(lambda: getattr(_dupes(), method)(*args)))
+
+async def _close_dupes() -> None:
+    global _dupe_thread
+    if _dupe_thread is not None:
+        await asyncio.wrap_future(_dupe_thread.submit(lambda: _dupe_index and _dupe_index.flush()))
+        _dupe_thread.shutdown(wait=True)
+    _dupe_thread = None
+
+@router.get("/api/duplicates")
+async def duplicates_page(url: HttpUrl, limit: int = Query(100, ge=1, le=1000)):
+    """
+    Pages of url's site with the same title, the same meta description, or
+    body text at least DUPES_THRESHOLD similar (estimated Jaccard over
+    5-word shingles). url must have been analyzed before.
+    """
+    result = await _dupes_query("duplicates", normalize_url(str(url)) or str(url), limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Page not indexed; analyze it first")
+    return result
+
+@router.get("/api/duplicates/site")
+async def duplicates_site(host: str, limit: int = Query(100, ge=1, le=1000)):
+    """Duplicate title / description groups and near-duplicate clusters of one site."""
+    return await _dupes_query("site_report", host, limit)
 
-from pydantic import BaseModel
+@router.get("/api/duplicates/stats")
+async def duplicates_stats():
+    return {**await _dupes_query("stats"), "backlog": _dupe_backlog}
 
+# ---- suggestions ------------------------------------------------------------
 class SuggestIn(BaseModel):
     title: str = ""
     meta_description: str = ""
@@ -547,7 +1289,7 @@ class SuggestOut(BaseModel):
     jsonld_org: str | None = None
     jsonld_website: str | None = None
 
-@app.post("/api/suggest", response_model=SuggestOut)
+@router.post("/api/suggest", response_model=SuggestOut)
 def suggest(body: SuggestIn):
     # Heuristic title
     head = (body.h1[0] if body.h1 else body.title).strip()
@@ -583,7 +1325,6 @@ def suggest(body: SuggestIn):
           "query-input":"required name=search_term_string"
         }
     }
-    import json
     return {
       "title_suggestion": title,
       "meta_suggestion": meta,
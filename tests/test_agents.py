@@ -0,0 +1,97 @@
+"""
+AI agent detection: built-in signatures, token boundaries, overlapping and
+prefix patterns, chunked scanning, a brute-force reference on random
+documents, and extra signatures from AGENT_SIGNATURES.
+"""
+import json, random, re
+
+import pytest
+
+import agents
+from agents import SIGNATURES, AgentMatcher, Signature, detect_agents
+from html_signals import StreamingExtractor, extract_signals
+
+INTERCOM = ('<script>window.intercomSettings = {app_id: "x"};</script>'
+            '<script src="https://widget.intercom.io/widget/x"></script>')
+
+def reference(signatures, html: str) -> set[Signature]:
+    """Every signature with an occurrence after a non-word character (or at the start)."""
+    text = "\n" + html
+    return {s for s in signatures if re.search(r"[^A-Za-z0-9_]" + re.escape(s.pattern), text)}
+
+def test_intercom():
+    (agent,) = detect_agents(INTERCOM)
+    assert agent == {"vendor": "Intercom", "category": "live_chat", "confidence": 0.97,
+                     "evidence": ["global:intercomSettings", "src:widget.intercom.io"]}
+
+def test_most_certain_first():
+    html = INTERCOM + '<div id="drift-frame-controller"></div>'
+    assert [(a["vendor"], a["confidence"]) for a in detect_agents(html)] == [("Intercom", 0.97), ("Drift", 0.5)]
+
+@pytest.mark.parametrize("html, found", [
+    ("drift.load()", ["Drift"]),
+    ("<script>drift.load('x')</script>", ["Drift"]),
+    ("xdrift.load()", []),                        # inside a longer identifier
+    ("my_intercomSettings = 1", []),
+    ("<script>var Tawk_API = {};</script>", ["Tawk.to"]),
+    ("TAWK_API", []),                             # case-sensitive
+    ("<p>no widgets here</p>", []),
+    ("", []),
+])
+def test_token_boundaries(html, found):
+    assert [a["vendor"] for a in detect_agents(html)] == found
+
+def test_prefix_and_overlapping_patterns():
+    m = AgentMatcher([Signature("A", "x", "src", "ab.c"), Signature("B", "x", "global", "ab.cd"),
+                      Signature("C", "x", "marker", "cd.e"), Signature("D", "x", "marker", "b.c")])
+    # "ab.cd" also reports its prefix "ab.c"; "cd.e" starts inside it after a boundary;
+    # "b.c" starts inside a word, so it does not count
+    assert [a["vendor"] for a in m.detect(" ab.cd.e")] == ["A", "B", "C"]
+    assert m.detect("zab.cd") == []
+
+def test_fed_in_chunks():
+    html = "<html>" + INTERCOM + "<df-messenger></df-messenger>" + " drift.load()" * 3
+    expected = detect_agents(html)
+    for size in (1, 2, 5, 17):
+        scan = agents.matcher().scanner()
+        for i in range(0, len(html), size):
+            scan.feed(html[i:i + size])
+        assert scan.result() == expected
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_brute_force(seed):
+    rng = random.Random(f"agents:{seed}")
+    noise = ["<div>", " ", "x", "_", ".", "'", "\n", "word", "=", "/", "<script>", "a-b"]
+    patterns = [s.pattern for s in SIGNATURES]
+    parts = []
+    for _ in range(rng.randint(1, 30)):
+        if rng.random() < 0.3:
+            p = rng.choice(patterns)
+            parts.append(p[:rng.randint(1, len(p))] if rng.random() < 0.3 else p)   # sometimes cut short
+        else:
+            parts.append(rng.choice(noise))
+    html = "".join(parts)
+    found = {(a["vendor"], e) for a in detect_agents(html) for e in a["evidence"]}
+    assert found == {(s.vendor, f"{s.kind}:{s.pattern}") for s in reference(SIGNATURES, html)}
+
+def test_in_the_payload():
+    html = f"<title>t</title>{INTERCOM}"
+    assert [a["vendor"] for a in extract_signals(html)["ai_agents"]] == ["Intercom"]
+    stream = StreamingExtractor("utf-8")
+    for i in range(0, len(html), 7):
+        stream.feed(html[i:i + 7].encode())
+    assert stream.close()["ai_agents"] == extract_signals(html)["ai_agents"]
+
+def test_bad_signature():
+    with pytest.raises(ValueError):
+        AgentMatcher([Signature("X", "x", "script", "x.js")])
+    with pytest.raises(ValueError):
+        AgentMatcher([Signature("X", "x", "src", "")])
+
+def test_extra_signatures(tmp_path, monkeypatch):
+    path = tmp_path / "agents.json"
+    path.write_text(json.dumps([["Acme Bot", "ai_assistant", "src", "cdn.acme.example/bot.js"]]))
+    monkeypatch.setattr(agents, "AGENT_SIGNATURES", str(path))
+    monkeypatch.setattr(agents, "_matcher", None)
+    html = '<script src="https://cdn.acme.example/bot.js"></script>' + INTERCOM
+    assert [a["vendor"] for a in detect_agents(html)] == ["Intercom", "Acme Bot"]
@@ -0,0 +1,125 @@
+"""
+bulk.py on small dumps: a tarball and a gzipped WARC (encoded, chunked,
+skipped and broken records), in process and through the CLI with workers,
+and --resume.
+"""
+import gzip, io, json, os, subprocess, sys, tarfile, zlib
+
+import pytest
+
+import bulk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def page(title: str) -> bytes:
+    return (f"<html><head><title>{title}</title><meta name=description content='About {title}'>"
+            f"</head><body><h1>{title}</h1><p>words here</p></body></html>").encode()
+
+@pytest.fixture
+def tarball(tmp_path):
+    path = tmp_path / "site.tar.gz"
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in (("index.html", page("Home")), ("blog/post.htm", page("Post")),
+                           ("style.css", b"body {}"), ("big.html", page("Big") + b" " * 2000)):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+def warc_record(kind: str, uri: str, block: bytes, content_type: str = "application/http; msgtype=response") -> bytes:
+    head = (f"WARC/1.0\r\nWARC-Type: {kind}\r\nWARC-Target-URI: {uri}\r\n"
+            f"WARC-Record-ID: <urn:uuid:{abs(hash(uri + kind)):x}>\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(block)}\r\n\r\n").encode()
+    # one gzip member per record, as crawlers write them
+    return gzip.compress(head + block + b"\r\n\r\n")
+
+def http(status: int, body: bytes, *headers: str) -> bytes:
+    lines = [f"HTTP/1.1 {status} X", *headers, f"Content-Length: {len(body)}"]
+    return "\r\n".join(lines).encode() + b"\r\n\r\n" + body
+
+@pytest.fixture
+def warc(tmp_path):
+    html = "Content-Type: text/html; charset=utf-8"
+    body = page("Chunked")
+    chunked = f"{len(body):x}".encode() + b"\r\n" + body + b"\r\n0\r\n\r\n"
+    records = [
+        warc_record("warcinfo", "", b"software: test", "application/warc-fields"),
+        warc_record("request", "https://example.com/", b"GET / HTTP/1.1\r\n\r\n", "application/http; msgtype=request"),
+        warc_record("response", "https://example.com/", http(200, page("Plain"), html)),
+        warc_record("response", "https://example.com/gz", http(200, gzip.compress(page("Gzipped")), html,
+                                                               "Content-Encoding: gzip")),
+        warc_record("response", "https://example.com/chunked",
+                    http(200, chunked, html, "Transfer-Encoding: chunked").replace(
+                        f"Content-Length: {len(chunked)}".encode(), b"X-Was-Chunked: 1")),
+        warc_record("response", "https://example.com/missing", http(404, page("Not found"), html)),
+        warc_record("response", "https://example.com/data.json", http(200, b"{}", "Content-Type: application/json")),
+        warc_record("response", "https://example.com/broken", http(200, b"not deflate", html,
+                                                                   "Content-Encoding: deflate")),
+        warc_record("response", "https://example.com/garbled", b"garbage with no status line"),
+        warc_record("response", "https://example.com/last", http(200, page("Last"), html)),
+    ]
+    path = tmp_path / "crawl.warc.gz"
+    path.write_bytes(b"".join(records))
+    return str(path)
+
+def read_jsonl(path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_tarball(tarball, tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_BYTES", 1000)
+    out = tmp_path / "out.jsonl"
+    stats = bulk.run([tarball], str(out), workers=0, base_url="https://example.com/")
+    assert (stats["written"], stats["errors"]) == (3, 1)
+    records = read_jsonl(out)
+    assert [r["index"] for r in records] == [0, 1, 2]
+    assert [r["url"] for r in records] == ["https://example.com/index.html",
+                                           "https://example.com/blog/post.htm", "https://example.com/big.html"]
+    assert [r["result"]["title"] for r in records[:2]] == ["Home", "Post"]
+    assert records[0]["result"]["status"] == 200 and records[0]["result"]["score"] > 0
+    assert records[2]["error"] == "Document too large (1000 byte limit)"
+
+def test_warc(warc, tmp_path):
+    out = tmp_path / "out.jsonl"
+    stats = bulk.run([warc], str(out), workers=0)
+    records = read_jsonl(out)
+    results = {r["url"]: r.get("result", {}).get("title") or r["error"] for r in records}
+    assert list(results) == ["https://example.com/", "https://example.com/gz", "https://example.com/chunked",
+                             "https://example.com/broken", "https://example.com/garbled",
+                             "https://example.com/last"]
+    assert [results[u] for u in list(results)[:3]] == ["Plain", "Gzipped", "Chunked"]
+    assert results["https://example.com/last"] == "Last"
+    # broken records are reported, not dropped
+    assert results["https://example.com/broken"].startswith("Unreadable WARC record (error: ")
+    assert results["https://example.com/garbled"].startswith("Unreadable WARC record (")
+    assert (stats["written"], stats["errors"]) == (6, 2)
+
+def test_resume(tarball, warc, tmp_path):
+    out = tmp_path / "out.jsonl"
+    bulk.run([warc, tarball], str(out), workers=0)
+    full = out.read_bytes()
+    lines = full.splitlines(keepends=True)
+    out.write_bytes(b"".join(lines[:5]) + lines[5][:10])      # a run cut short mid-line
+    stats = bulk.run([warc, tarball], str(out), workers=0, resume=True)
+    assert stats["skipped"] == 5
+    assert out.read_bytes() == full
+
+def test_cli_with_workers(tarball, warc, tmp_path):
+    out = tmp_path / "out.jsonl"
+    env = {k: v for k, v in os.environ.items() if k != "RESULT_CACHE"}
+    proc = subprocess.run([sys.executable, "-m", "bulk", warc, tarball, "--out", str(out), "--workers", "2"],
+                          cwd=tmp_path, env={**env, "PYTHONPATH": ROOT, "BULK_BATCH_DOCS": "2"},
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    stats = json.loads(proc.stderr.strip().splitlines()[-1])
+    records = read_jsonl(out)
+    assert [r["index"] for r in records] == list(range(9))      # 6 WARC records, 3 pages in the tarball
+    assert (stats["written"], stats["errors"]) == (9, 2)
+    # the workers only import the analyzer: no cache or store files appear
+    assert sorted(os.listdir(tmp_path)) == sorted(["crawl.warc.gz", "site.tar.gz", "out.jsonl"])
+
+def test_http_response_decodings():
+    body = page("x")
+    assert bulk._http_response(http(200, zlib.compress(body), "Content-Encoding: deflate"))[2] == body
+    status, headers, got = bulk._http_response(http(301, b"", "Location: /y"))
+    assert (status, headers["location"], got) == (301, "/y", b"")
@@ -0,0 +1,200 @@
+"""
+CrawlStore frontier and leases, shared by several workers (one store per
+worker on the same database), and a small crawl end to end.
+"""
+import asyncio, threading
+
+import httpx
+import pytest
+
+import crawler
+from crawler import ACTIVE, DONE, QUEUED, Crawler, CrawlStore, normalize_url
+
+OPTS = {"max_pages": 1000, "use_sitemap": False, "follow_links": True, "max_depth": 5, "head_only": False}
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "crawls.sqlite3")
+
+def states(store: CrawlStore, crawl_id: int) -> dict[str, int]:
+    return {r["url"]: r["state"] for r in store.db.execute(
+        "SELECT url, state FROM pages WHERE crawl_id = ?", (crawl_id,))}
+
+def hammer(fn, threads: int = 8) -> list:
+    """Run fn() in `threads` threads at once; their results, concatenated."""
+    out: list = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def run() -> None:
+        start.wait()
+        got = fn()
+        with lock:
+            out.extend(got)
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return out
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM", "http://example.com/"),
+    ("https://example.com:443/a?utm_source=x&b=1#frag", "https://example.com/a?b=1"),
+    ("http://example.com:8080/a", "http://example.com:8080/a"),
+    ("http://user:pw@example.com/", "http://example.com/"),
+    ("mailto:someone@example.com", None),
+    ("http://[::1", None),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+def test_normalize_relative():
+    assert normalize_url("../b?gclid=1", "https://example.com/a/c") == "https://example.com/b"
+
+def test_claim_shallowest_first(path):
+    store = CrawlStore(path)
+    crawl_id = store.create("https://example.com/", OPTS, "w1")
+    store.add(crawl_id, [("https://example.com/deep", 2), ("https://example.com/", 0),
+                         ("https://example.com/a", 1), ("https://example.com/b", 1)], 10)
+    order = [store.claim(crawl_id) for _ in range(5)]
+    assert order == [("https://example.com/", 0), ("https://example.com/a", 1),
+                     ("https://example.com/b", 1), ("https://example.com/deep", 2), None]
+
+def test_concurrent_claims_never_share_a_page(path):
+    urls = [(f"https://example.com/{i}", 0) for i in range(400)]
+    store = CrawlStore(path)
+    crawl_id = store.create("https://example.com/", OPTS, "w1")
+    store.add(crawl_id, urls, len(urls))
+
+    def drain() -> list:
+        worker = CrawlStore(path)           # a worker process has its own store
+        got = []
+        while (claimed := worker.claim(crawl_id)) is not None:
+            got.append(claimed)
+        return got
+
+    claimed = hammer(drain)
+    assert sorted(claimed) == sorted(urls)
+    assert set(states(store, crawl_id).values()) == {ACTIVE}
+
+def test_concurrent_adds_respect_the_limit(path):
+    store = CrawlStore(path)
+    crawl_id = store.create("https://example.com/", OPTS, "w1")
+    counter = iter(range(10**6))
+    lock = threading.Lock()
+
+    def add() -> list:
+        worker = CrawlStore(path)
+        for _ in range(20):
+            with lock:
+                batch = [(f"https://example.com/{next(counter)}", 1) for _ in range(10)]
+            worker.add(crawl_id, batch, 250)
+        return []
+
+    hammer(add)
+    assert len(states(store, crawl_id)) == 250
+    assert store.get(crawl_id)["discovered"] == 250
+
+def test_lease_blocks_other_workers(path):
+    a, b = CrawlStore(path), CrawlStore(path)
+    crawl_id = a.create("https://example.com/", OPTS, "a")
+    a.add(crawl_id, [("https://example.com/", 0), ("https://example.com/x", 1)], 10)
+    assert a.acquire(crawl_id, "a")
+    assert a.claim(crawl_id) == ("https://example.com/", 0)
+
+    # a's lease is live: b neither takes the crawl nor requeues a's page
+    assert not b.acquire(crawl_id, "b")
+    assert b.orphaned() == []
+    assert states(a, crawl_id)["https://example.com/"] == ACTIVE
+
+    # a stops renewing: once the lease lapses b adopts the crawl and the
+    # page a had in flight is queued again
+    a.db.execute("UPDATE crawls SET lease = 0 WHERE id = ?", (crawl_id,))
+    assert b.orphaned() == [crawl_id]
+    assert b.acquire(crawl_id, "b")
+    assert states(b, crawl_id)["https://example.com/"] == QUEUED
+    assert not a.renew(crawl_id, "a")
+    assert b.renew(crawl_id, "b")
+
+def test_release_and_cancel(path):
+    store = CrawlStore(path)
+    crawl_id = store.create("https://example.com/", OPTS, "a")
+    assert store.acquire(crawl_id, "a")
+    store.release(crawl_id, "a")
+    assert store.orphaned() == [crawl_id]
+    store.set_status(crawl_id, "cancelled")
+    assert store.orphaned() == []
+    assert not store.acquire(crawl_id, "b")
+
+# ---- end to end -----------------------------------------------------------
+
+SITE = {
+    "/": ["/a", "/b", "https://other.example/x"],
+    "/a": ["/b", "/c", "/a#top"],
+    "/b": ["/", "/c?utm_source=feed"],
+    "/c": ["/d"],
+    "/d": [],
+}
+
+def site_client() -> httpx.AsyncClient:
+    # robots.txt and sitemaps: not found, so everything is allowed
+    return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+
+def fake_analyze(calls: list):
+    async def analyze(url: str, head_only: bool, links: list | None) -> dict:
+        calls.append(url)
+        await asyncio.sleep(0)
+        path = httpx.URL(url).path
+        if links is not None:
+            links.extend((httpx.URL(url).join(href).__str__(), "") for href in SITE[path])
+        return {"status": 200, "score": 50 + len(path), "recommendations": ["Add a title."], "nofollow": False}
+    return analyze
+
+def test_crawl_end_to_end(path, monkeypatch):
+    monkeypatch.setattr(crawler, "CRAWL_DELAY", 0.0)
+    calls: list[str] = []
+
+    async def main() -> tuple[int, Crawler]:
+        client = site_client()
+        first = Crawler(CrawlStore(path), lambda: client, fake_analyze(calls), "test")
+        second = Crawler(CrawlStore(path), lambda: client, fake_analyze(calls), "test")
+        crawl_id = first.start("https://example.com/", OPTS)
+        # a second worker starting up leaves the crawl to its owner
+        second.resume_all()
+        await asyncio.sleep(0)
+        await asyncio.gather(*first.tasks.values())
+        await second.shutdown()
+        await client.aclose()
+        return crawl_id, first
+
+    crawl_id, first = asyncio.run(main())
+    expected = [f"https://example.com{p}" for p in SITE]
+    assert sorted(calls) == sorted(expected)
+    crawl = first.store.get(crawl_id)
+    assert crawl["status"] == "done" and crawl["owner"] is None
+    assert set(states(first.store, crawl_id).values()) == {DONE}
+    assert crawl["discovered"] == len(SITE)
+
+def test_adopts_crawl_of_a_dead_worker(path, monkeypatch):
+    monkeypatch.setattr(crawler, "CRAWL_DELAY", 0.0)
+    store = CrawlStore(path)
+    crawl_id = store.create("https://example.com/", OPTS, "dead")
+    store.add(crawl_id, [("https://example.com/", 0)], OPTS["max_pages"])
+    store.mark_seeded(crawl_id)
+    assert store.claim(crawl_id) == ("https://example.com/", 0)    # in flight when it died
+    store.db.execute("UPDATE crawls SET lease = 0 WHERE id = ?", (crawl_id,))
+    calls: list[str] = []
+
+    async def main() -> None:
+        client = site_client()
+        worker = Crawler(CrawlStore(path), lambda: client, fake_analyze(calls), "test")
+        worker.resume_all()
+        while worker.store.get(crawl_id)["status"] != "done":
+            await asyncio.sleep(0.01)
+        await worker.shutdown()
+        await client.aclose()
+
+    asyncio.run(main())
+    assert sorted(calls) == sorted(f"https://example.com{p}" for p in SITE)
@@ -0,0 +1,111 @@
+"""
+MinHash similarity, the DuplicateIndex (exact keys, LSH near-duplicates,
+re-indexing, eviction), and the server queueing pages to the index thread.
+"""
+import asyncio, random, threading
+
+import pytest
+
+import server
+from duplicates import DUPES_THRESHOLD, DuplicateIndex, minhash, similarity
+
+_VOCAB = [f"w{i}" for i in range(3000)]
+
+def words(seed: int, n: int = 400) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(_VOCAB) for _ in range(n)]
+
+def edited(text: list[str], every: int) -> str:
+    return " ".join("changed" if i % every == 0 else w for i, w in enumerate(text))
+
+@pytest.fixture
+def index(tmp_path):
+    return DuplicateIndex(str(tmp_path / "duplicates.sqlite3"))
+
+def test_minhash_similarity():
+    text = words(1)
+    sig = minhash(" ".join(text))
+    assert len(sig) == 128 * 4
+    assert similarity(sig, minhash(" ".join(text).upper())) == 1.0
+    assert similarity(sig, minhash(edited(text, 100))) >= DUPES_THRESHOLD
+    assert similarity(sig, minhash(" ".join(words(2)))) < 0.2
+    assert minhash(" -- ") is None
+
+def test_exact_duplicates_stay_within_a_site(index):
+    index.add("https://a.example/1", "Same Title", "One", None)
+    index.add("https://a.example/2", "same  title", "Two", None)
+    index.add("https://www.a.example/3", "Other", "One", None)
+    index.add("https://b.example/1", "Same Title", "One", None)
+    dup = index.duplicates("https://a.example/1")
+    assert dup["duplicate_title"] == ["https://a.example/2"]
+    assert dup["duplicate_description"] == ["https://www.a.example/3"]
+    assert index.duplicates("https://a.example/missing") is None
+
+def test_near_duplicates_and_clusters(index):
+    text = words(1)
+    index.add("https://a.example/orig", "A", "a", minhash(" ".join(text)))
+    index.add("https://a.example/copy", "B", "b", minhash(edited(text, 100)))
+    index.add("https://a.example/other", "C", "c", minhash(" ".join(words(2))))
+    index.add("https://b.example/copy", "D", "d", minhash(" ".join(text)))
+    near = index.duplicates("https://a.example/orig")["near_duplicates"]
+    assert [n["url"] for n in near] == ["https://a.example/copy"]
+    report = index.site_report("a.example")
+    assert report["pages"] == 3
+    assert report["near_duplicate_clusters"] == [
+        {"pages": 2, "urls": ["https://a.example/orig", "https://a.example/copy"]}]
+
+def test_reindex_replaces_the_signature(index):
+    text = words(1)
+    index.add("https://a.example/1", "A", "a", minhash(" ".join(text)))
+    index.add("https://a.example/2", "B", "b", minhash(" ".join(text)))
+    index.flush()
+    index.add("https://a.example/2", "B", "b", minhash(" ".join(words(3))))
+    assert index.duplicates("https://a.example/1")["near_duplicates"] == []
+    assert index.db.execute("SELECT COUNT(*) FROM bands").fetchone()[0] == 2 * 16
+
+def test_evict_oldest(index):
+    for i in range(30):
+        index.add(f"https://a.example/{i}", f"T{i}", "", minhash(" ".join(words(i, 50))))
+    assert index.evict(max_pages=20) == 10
+    assert index.stats()["pages"] == 20
+    assert index.duplicates("https://a.example/0") is None
+    assert index.db.execute("SELECT COUNT(*) FROM bands").fetchone()[0] == 20 * 16
+
+# ---- server: the index thread -----------------------------------------------
+
+class SpyIndex(DuplicateIndex):
+    threads: set[int] = set()
+
+    def add(self, *args) -> None:
+        self.threads.add(threading.get_ident())
+        super().add(*args)
+
+def test_server_indexes_off_the_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "_dupe_index", SpyIndex(str(tmp_path / "duplicates.sqlite3")))
+    text = " ".join(words(1))
+
+    async def main() -> dict:
+        for i in range(3):
+            server._index_page(f"https://a.example/{i}", "Same", f"d{i}", text, None)
+        # queued behind the adds, so it sees all three
+        found = await server._dupes_query("duplicates", "https://a.example/0")
+        await server._close_dupes()
+        return found
+
+    found = asyncio.run(main())
+    assert found["duplicate_title"] == ["https://a.example/1", "https://a.example/2"]
+    assert {n["url"] for n in found["near_duplicates"]} == {"https://a.example/1", "https://a.example/2"}
+    assert SpyIndex.threads and threading.get_ident() not in SpyIndex.threads
+    assert server._dupe_backlog == 0
+
+def test_server_skips_pages_past_the_backlog(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "_dupe_index", DuplicateIndex(str(tmp_path / "duplicates.sqlite3")))
+    monkeypatch.setattr(server, "DUPES_BACKLOG", 0)
+
+    async def main() -> dict:
+        server._index_page("https://a.example/", "T", "d", "some words here", None)
+        stats = await server._dupes_query("stats")
+        await server._close_dupes()
+        return stats
+
+    assert asyncio.run(main())["pages"] == 0
@@ -0,0 +1,196 @@
+"""
+SignalParser (extract_signals) against the BeautifulSoup reference
+(extract_signals_soup): hand-written pages, seeded fuzz documents built from
+tricky fragments, mutated pages, text fed to the parser in pieces, bytes
+fed to StreamingExtractor in arbitrary chunks, and the bench corpus.
+"""
+import random
+
+import pytest
+
+from bench.corpus import _MALFORMED, PROFILES, document
+from html_signals import SignalParser, StreamingExtractor, extract_signals, extract_signals_soup
+
+FUZZ_DOCS = 200
+
+PAGE = """<!DOCTYPE html><html lang=en><head><meta charset=utf-8>
+<title>Rust &amp; Python: a practical comparison</title>
+<meta name="description" content="Which one to pick for a new service, with benchmarks &mdash; and caveats.">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<meta name="robots" content="index, follow">
+<link rel="canonical" href="/compare">
+<meta property="og:title" content="x"><meta property="og:type" content="website">
+<meta name="twitter:card" content="summary">
+<script type="application/ld+json">{"@context": "https://schema.org", "@type": "Article", "name": "x"}</script>
+<script type="application/ld+json">{"@type": "Broken", </script>
+</head><body><header><nav><a href="/">Home</a></nav></header>
+<h1>Rust &amp; Python</h1><div class=c><h2>Speed</h2><p>naïve café über 日本語 words here</p></div>
+<p>Tom & Jerry &copy &#x110000; &bogus;</p><pre>  keep   spaces </pre>
+<footer>© 2024</footer></body></html>"""
+
+PAGES = {
+    "page": PAGE,
+    "empty": "",
+    "text-only": "just some words, no markup",
+    "no-head": "<h1>Title</h1><title>late title</title><meta name=description content=late>",
+    "nested-title": "<title>a <b>bold</b> title</title>",
+    "two-h1": "<h1>one</h1><div><h1>two <span>spans</span></h1></div>",
+    "noindex": '<meta name="GoogleBot" content="NoIndex, NoFollow">',
+    "unclosed": "<html><head><title>unclosed<body><h1>x",
+    "comment": "<title>t</title><!-- <h1>hidden</h1> --><h1>shown</h1>",
+    "unterminated-comment": "<title>t</title><!-- <h1>never closed</h1>",
+    "script-markup": "<script>document.write('<h1>no</h1><title>no</title>')</script><h1>yes</h1>",
+    "jsonld-graph": '<script type="application/ld+json">[{"@type": ["A", "B"]}, {"@graph": []}]</script>',
+}
+
+# markup the parser has special cases for: void elements, implicit closes,
+# string containers, entities, comments/declarations and broken attributes
+_FRAGMENTS = (
+    "<div><p>unclosed paragraph", "</span></div>", "<b><i>crossed</b></i>", "<p class=>x",
+    '<a href="/x>broken quote</a>', "Tom & Jerry &copy &#x110000; &bogus;", "<br/></br>",
+    "<img src=x alt='a\"b'>", "<h2>heading<h3>nested</h2></h3>", "<!-- unterminated comment ->",
+    "<table><td>cell</table>", "<li>item<li>item", "<<p>>", "<p =x>",
+    "<title>A &amp; B</title>", "<title></title>", "<title>x<b>y</b></title>",
+    '<meta name="description" content="d &quot;q&quot;">', "<meta name=DESCRIPTION content=up>",
+    '<meta name="robots" content="NOINDEX, nofollow">', '<meta name="googlebot" content="noindex">',
+    '<link rel="Canonical" href="/c">', "<link rel=canonical>", "<meta name=viewport>",
+    '<meta property="og:title" content=x>', '<meta name="twitter:card" content=s>',
+    '<script type="application/ld+json">{"@type": ["A", "B"]}</script>',
+    '<script type="application/ld+json">[{"@graph": [{"@type": "C"}]}]</script>',
+    '<script type="application/ld+json">{bad</script>', "<script>var x = '<h1>no</h1>';</script>",
+    "<style>h1 {}</style>", "<h1>one <em>two</em></h1>", "<h1></h1>", "<h1>  spaced   out </h1>",
+    "<p>text &nbsp; words</p>", "<!-- c -->", "<![CDATA[x]]>", "<?pi x?>", "&#169; &#x27; &amp",
+    "<textarea><h1>t</h1></textarea>", "<noscript><h1>n</h1></noscript>", "<svg><title>s</title></svg>",
+    "<head>", "</head>", "<body>", "<html>", "</html>", "words here", "\n", "<div>", "</div>",
+    # AI agent signatures, whole and cut by the fragments around them
+    '<script src="https://widget.intercom.io/widget/x"></script>', "<script>window.intercomSettings = {}</script>",
+    "<df-messenger agent-id=x></df-messenger>", "Tawk_", "API.onLoad", "xdrift.load()", " drift.load()",
+)
+
+def fuzz_document(seed: int) -> str:
+    rng = random.Random(f"fuzz:{seed}")
+    return "".join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(1, 40)))
+
+def mutate(text: str, seed: int) -> str:
+    """Random cuts, stray syntax characters and pasted spans."""
+    rng = random.Random(f"mutate:{seed}")
+    chars = list(text)
+    for _ in range(rng.randint(1, 8)):
+        i = rng.randrange(len(chars))
+        op = rng.random()
+        if op < 0.4:
+            del chars[i:i + rng.randint(1, 20)]
+        elif op < 0.7:
+            chars.insert(i, rng.choice("<>\"'=/&; !-"))
+        else:
+            j = rng.randrange(len(chars))
+            chars[i:i] = chars[j:j + rng.randint(1, 30)]
+    return "".join(chars)
+
+def split(data, rng: random.Random, largest: int) -> list:
+    """data cut into pieces of 1..largest items."""
+    pieces, pos = [], 0
+    while pos < len(data):
+        size = rng.randint(1, largest)
+        pieces.append(data[pos:pos + size])
+        pos += size
+    return pieces
+
+def parse_pieces(pieces: list[str]) -> dict:
+    parser = SignalParser()
+    for piece in pieces:
+        parser.feed(piece)
+    parser.close()
+    return parser.result()
+
+@pytest.mark.parametrize("name", list(PAGES))
+def test_pages(name):
+    assert extract_signals(PAGES[name]) == extract_signals_soup(PAGES[name])
+
+def test_page_fields():
+    sig = extract_signals(PAGE)
+    assert sig["title"] == "Rust & Python: a practical comparison"
+    assert sig["h1"] == ["Rust & Python"]
+    assert sig["canonical"] == "/compare"
+    assert (sig["og_count"], sig["twitter_count"]) == (2, 1)
+    assert (sig["jsonld_count"], sig["jsonld_valid"], sig["jsonld_types"]) == (2, 1, ["Article"])
+
+@pytest.mark.parametrize("seed", range(FUZZ_DOCS))
+def test_fuzzed_fragments(seed):
+    html = fuzz_document(seed)
+    assert extract_signals(html) == extract_signals_soup(html)
+
+@pytest.mark.parametrize("seed", range(FUZZ_DOCS))
+def test_mutated_page(seed):
+    html = mutate(PAGE, seed)
+    assert extract_signals(html) == extract_signals_soup(html)
+
+@pytest.mark.parametrize("largest", [1, 3, 64])
+def test_fed_in_pieces(largest):
+    # piece edges land inside tags, attribute values, entities and comments
+    for seed in range(0, FUZZ_DOCS, 10):
+        html = fuzz_document(seed) + PAGE
+        pieces = split(html, random.Random(f"{seed}:{largest}"), largest)
+        assert parse_pieces(pieces) == extract_signals_soup(html)
+
+# ---- StreamingExtractor: bytes in arbitrary chunks -----------------------
+
+def stream_pieces(pieces: list[bytes], charset: str | None = None) -> dict:
+    extractor = StreamingExtractor(charset)
+    for piece in pieces:
+        extractor.feed(piece)
+    return extractor.close()
+
+@pytest.mark.parametrize("largest", [1, 7, 4096])
+def test_streamed_bytes(largest):
+    # chunk edges also split multi-byte UTF-8 characters
+    for seed in range(0, FUZZ_DOCS, 10):
+        html = PAGE + fuzz_document(seed)
+        pieces = split(html.encode(), random.Random(f"bytes:{seed}:{largest}"), largest)
+        assert stream_pieces(pieces) == extract_signals_soup(html)
+
+@pytest.mark.parametrize("charset, declared", [
+    ("utf-8", None), ("windows-1252", "windows-1252"), ("windows-1252", None),
+    ("shift_jis", "shift_jis"), ("shift_jis", None), ("utf-16", None),
+])
+def test_streamed_charsets(charset, declared):
+    # Content-Type charset, else <meta charset>, else the BOM (utf-16)
+    meta = "" if charset == "utf-16" else f'<meta charset="{charset}">'
+    text = "naïve café" if charset == "windows-1252" else "日本語 ページ"
+    html = (f"<html><head>{meta}<title>{text}</title>"
+            f'<meta name="description" content="{text}"></head><body><h1>{text}</h1></body></html>')
+    data = html.encode(charset)
+    expected = extract_signals_soup(data.decode(charset))
+    assert expected["title"] == text
+    for largest in (1, 3, 64):
+        pieces = split(data, random.Random(f"{charset}:{largest}"), largest)
+        assert stream_pieces(pieces, declared) == expected
+
+# ---- bench corpus ----------------------------------------------------------
+
+@pytest.mark.parametrize("profile", list(PROFILES))
+def test_corpus(profile):
+    html = document(profile).decode()
+    assert extract_signals(html) == extract_signals_soup(html)
+
+@pytest.mark.parametrize("seed", range(0, FUZZ_DOCS, 4))
+def test_mutated_corpus_pages(seed):
+    html = mutate(document("small", seed % 4).decode(), seed)
+    assert extract_signals(html) == extract_signals_soup(html)
+
+@pytest.mark.parametrize("seed", range(0, FUZZ_DOCS, 4))
+def test_corpus_fragments(seed):
+    # the corpus' own broken markup mixed with the parser's special cases
+    rng = random.Random(f"corpus:{seed}")
+    html = "".join(rng.choice(_MALFORMED + _FRAGMENTS) for _ in range(rng.randint(1, 40)))
+    assert extract_signals(html) == extract_signals_soup(html)
+
+# HTMLParser rescans an unterminated comment on every feed, so the malformed
+# profile only gets network-sized chunks
+@pytest.mark.parametrize("profile, largest", [
+    ("small", 1), ("small", 7), ("medium", 1), ("medium", 4096), ("malformed", 4096), ("malformed", 65536),
+])
+def test_chunked_corpus(profile, largest):
+    data = document(profile)
+    pieces = split(data, random.Random(f"{profile}:{largest}"), largest)
+    assert stream_pieces(pieces) == extract_signals_soup(data.decode())
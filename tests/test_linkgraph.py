@@ -0,0 +1,84 @@
+"""
+LinkGraph on small graphs: edge merging, PageRank against a dense
+reference, click depths, the site report, and the graph a crawl stores.
+"""
+import numpy as np
+import pytest
+
+from crawler import CrawlStore
+from linkgraph import LinkGraph, passes_equity, report
+
+def dense_pagerank(n: int, edges: list[tuple[int, int]], damping: float = 0.85) -> np.ndarray:
+    """Stationary vector of the Google matrix, built explicitly."""
+    m = np.zeros((n, n))
+    for s, d in set(edges):
+        m[d, s] = 1.0
+    out = m.sum(axis=0)
+    m[:, out == 0] = 1.0 / n            # dangling pages link everywhere
+    m[:, out > 0] /= out[out > 0]
+    google = damping * m + (1 - damping) / n
+    values, vectors = np.linalg.eig(google)
+    v = np.real(vectors[:, np.argmax(np.real(values))])
+    return v / v.sum()
+
+@pytest.mark.parametrize("rel, passes", [
+    ("", True), ("noopener", True), ("nofollow", False), ("noopener ugc", False), ("sponsored", False),
+])
+def test_passes_equity(rel, passes):
+    assert passes_equity(rel) is passes
+
+def test_edges_merged():
+    # self-link dropped; the duplicate 0->1 passes equity because one copy does
+    g = LinkGraph(3, [0, 0, 0, 1, 2], [1, 1, 0, 2, 0], [False, True, True, False, True])
+    assert g.edges == 3
+    assert g.indptr.tolist() == [0, 1, 2, 3]
+    assert g.indices.tolist() == [1, 2, 0]
+    assert g.follow.tolist() == [True, False, True]
+    assert g.in_degree().tolist() == [1, 1, 1]
+    assert g.in_degree(followed_only=True).tolist() == [1, 1, 0]
+
+def test_pagerank_matches_dense_reference():
+    # a hub, a cycle, a dangling page and a page nothing links to
+    edges = [(0, 1), (0, 2), (0, 3), (1, 0), (2, 0), (2, 1), (3, 4), (4, 3), (5, 0), (1, 6)]
+    src, dst = zip(*edges)
+    rank = LinkGraph(7, src, dst, [True] * len(edges)).pagerank()
+    assert rank.sum() == pytest.approx(1.0)
+    assert rank == pytest.approx(dense_pagerank(7, edges), abs=1e-8)
+
+def test_pagerank_ignores_nofollow():
+    rank = LinkGraph(3, [0, 1, 0], [1, 0, 2], [True, True, False]).pagerank()
+    assert rank == pytest.approx(dense_pagerank(3, [(0, 1), (1, 0)]), abs=1e-8)
+    # no equity reaches page 2: the teleport share plus its own spread rank
+    assert rank[2] == pytest.approx(0.05 / (1 - 0.85 / 3))
+    assert LinkGraph(0, [], [], []).pagerank().tolist() == []
+
+def test_depths():
+    g = LinkGraph(6, [0, 0, 1, 2, 3, 5], [1, 2, 3, 3, 4, 0], [True, False, True, True, True, True])
+    # nofollow links still count as clicks; nothing reaches page 5
+    assert g.depths(0).tolist() == [0, 1, 1, 2, 3, -1]
+    assert g.depths(4).tolist() == [-1, -1, -1, -1, 0, -1]
+    assert g.depths(9).tolist() == [-1] * 6
+
+def test_report():
+    urls = [f"/{i}" for i in range(6)]
+    g = LinkGraph(6, [0, 1, 2, 3, 3], [1, 2, 3, 0, 4], [True] * 5)
+    r = report(g, urls, root=0, deep=2)
+    assert (r["pages"], r["links"], r["followed_links"]) == (6, 5, 5)
+    assert r["depth_histogram"] == {"0": 1, "1": 1, "2": 1, "3": 1, "4": 1}
+    assert (r["max_depth"], r["unreachable"], r["orphans"], r["deep_pages"]) == (4, 1, 1, 2)
+    assert [p["url"] for p in r["orphan_pages"]] == ["/5"]
+    assert [(p["url"], p["depth"]) for p in r["deep_page_list"]] == [("/4", 4), ("/3", 3)]
+    assert sum(p["equity"] for p in r["top_pages"]) == pytest.approx(6, abs=0.01)
+
+def test_graph_from_a_crawl(tmp_path):
+    store = CrawlStore(str(tmp_path / "crawls.sqlite3"))
+    crawl_id = store.create("https://example.com/", {}, "w")
+    urls = ["https://example.com/", "https://example.com/a", "https://example.com/b"]
+    store.add(crawl_id, [(u, 0) for u in urls], 10)
+    store.save_links(crawl_id, urls[0], [(urls[1], True), (urls[2], False), ("https://elsewhere/", True)])
+    store.save_links(crawl_id, urls[1], [(urls[0], True), (urls[1], True)])
+    nodes, g = store.link_graph(crawl_id)
+    assert nodes == urls
+    assert g.indptr.tolist() == [0, 2, 3, 3]
+    assert g.indices.tolist() == [1, 2, 0]
+    assert g.follow.tolist() == [True, False, True]
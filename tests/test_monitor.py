@@ -0,0 +1,149 @@
+"""
+MonitorStore schedule and snapshot runs, endpoints writing from threads
+while the scheduler writes from the loop, and Scheduler wake-up and
+shutdown.
+"""
+import asyncio, threading, time
+
+import pytest
+
+import monitor
+from monitor import MonitorStore, Scheduler
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "monitors.sqlite3")
+
+def due(store: MonitorStore, monitor_id: int) -> float:
+    return store.db.execute("SELECT next_due FROM monitors WHERE id = ?", (monitor_id,)).fetchone()[0]
+
+def test_register_keeps_the_schedule(path):
+    store = MonitorStore(path)
+    (first,) = store.register(["https://example.com/"], 3600, False)
+    (again,) = store.register(["https://example.com/"], 7200, True)
+    assert again == first
+    m = store.get(first["id"])
+    assert (m["interval"], m["head_only"]) == (7200, True)
+
+def test_claim_leases_due_monitors(path):
+    store = MonitorStore(path)
+    ids = [m["id"] for m in store.register([f"https://example.com/{i}" for i in range(5)], 3600, False)]
+    store.reschedule(ids[0], 10**10)
+    now = time.time() + 3600 * monitor.MONITOR_JITTER
+    claimed = [r["id"] for r in store.claim(now, 10)]
+    assert sorted(claimed) == ids[1:]
+    assert all(due(store, i) == now + monitor.MONITOR_LEASE for i in claimed)
+    assert store.claim(now, 10) == []
+
+def test_concurrent_claims_never_share_a_monitor(path):
+    MonitorStore(path).register([f"https://example.com/{i}" for i in range(300)], 0.0, False)
+    got, lock = [], threading.Lock()
+    start = threading.Barrier(6)
+
+    def drain() -> None:
+        store = MonitorStore(path)          # a worker process has its own store
+        start.wait()
+        while rows := store.claim(time.time(), 7):
+            with lock:
+                got.extend(r["id"] for r in rows)
+
+    threads = [threading.Thread(target=drain) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(got) == list(range(1, 301))
+
+def test_snapshot_runs(path):
+    store = MonitorStore(path)
+    (m,) = store.register(["https://example.com/"], 3600, False)
+    for ts, score in ((1000, 80), (2000, 80), (3000, 60), (4000, None)):
+        store.record(m["id"], ts, ts + 3600, 200 if score else 503, score, 0xABC if score else None)
+    runs = store.history(m["id"])
+    assert [(r["from"], r["to"], r["scans"], r["score"]) for r in runs] == [
+        (4000, 4000, 1, None), (3000, 3000, 1, 60), (1000, 2000, 2, 80)]
+    assert store.history(m["id"], since=2500, until=3500)[0]["from"] == 3000
+    assert store.get(m["id"])["failures"] == 1
+    assert store.delete(m["id"]) and store.history(m["id"]) == []
+
+def test_threads_and_loop_share_a_store(path):
+    # the endpoints run in the threadpool on the same store the scheduler
+    # writes to from the loop; their transactions must not collide
+    store = MonitorStore(path)
+    (m,) = store.register(["https://example.com/"], 3600, False)
+    errors: list[Exception] = []
+
+    def endpoint(i: int) -> None:
+        try:
+            for j in range(20):
+                (new,) = store.register([f"https://example.com/{i}/{j}"], 3600, False)
+                store.delete(new["id"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=endpoint, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for ts in range(300):
+        store.record(m["id"], ts, ts + 3600, 200, ts % 3)
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert store.get(m["id"])["runs"] == 300
+
+def test_wake_from_another_thread(path, monkeypatch):
+    monkeypatch.setattr(monitor, "MONITOR_IDLE_POLL", 30.0)
+    monkeypatch.setattr(monitor, "MONITOR_JITTER", 0.0)     # due as soon as registered
+    store = MonitorStore(path)
+    scanned = []
+
+    async def scan(url: str, head_only: bool) -> dict:
+        scanned.append(url)
+        return {"payload": {"status": 200, "score": 90}, "response_etag": '"abc"'}
+
+    async def main() -> float:
+        scheduler = Scheduler(store, scan)
+        scheduler.start()
+        await asyncio.sleep(0.05)           # idle: nothing registered yet
+
+        def register() -> None:             # as the sync endpoint does
+            store.register(["https://example.com/"], 3600, False)
+            scheduler.wake()
+
+        t = time.monotonic()
+        await asyncio.to_thread(register)
+        while not scanned:
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - t
+        await scheduler.shutdown()
+        return elapsed
+
+    assert asyncio.run(main()) < 5
+    assert scanned[0] == "https://example.com/"
+
+def test_shutdown_reschedules_cancelled_scans(path, monkeypatch):
+    monkeypatch.setattr(monitor, "MONITOR_JITTER", 0.0)
+    store = MonitorStore(path)
+    ids = [m["id"] for m in store.register([f"https://example.com/{i}" for i in range(3)], 3600, False)]
+    started = []
+
+    async def scan(url: str, head_only: bool) -> dict:
+        started.append(url)
+        if url.endswith("/0"):
+            return {"payload": {"status": 200, "score": 90}}
+        await asyncio.Event().wait()        # still running at shutdown
+
+    async def main() -> float:
+        scheduler = Scheduler(store, scan)
+        scheduler.start()
+        while len(started) < 3:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        before = time.time()
+        await scheduler.shutdown()
+        return before
+
+    before = asyncio.run(main())
+    # the two cancelled scans are due now, not after MONITOR_LEASE
+    assert all(before <= due(store, i) <= time.time() for i in ids[1:])
+    assert store.get(ids[0])["runs"] == 1
@@ -0,0 +1,54 @@
+"""
+Result cache backends: freshness windows, leases, and the SQLite backend's
+async calls running off the event loop.
+"""
+import asyncio, os, threading
+
+from result_cache import MemoryCache, SQLiteCache, make_cache
+
+def test_default_backend_is_memory():
+    assert isinstance(make_cache(), MemoryCache)
+
+def test_sqlite_opens_on_first_use(tmp_path):
+    path = tmp_path / "results.sqlite3"
+    cache = SQLiteCache(str(path))
+    assert not os.path.exists(path)
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == ({"v": 1}, True)
+
+def test_freshness_windows():
+    cache = MemoryCache(ttl=-1, stale=60)
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == ({"v": 1}, False)        # stale, still served
+    cache = MemoryCache(ttl=-1, stale=-1)
+    cache.set("k", {"v": 1})
+    assert cache.get("k") is None
+
+def test_leases_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    a, b = SQLiteCache(path), SQLiteCache(path)
+    assert a.lease("k", 60)
+    assert not b.lease("k", 60)
+    a.release("k")
+    assert b.lease("k", 60)
+
+def test_sqlite_async_calls_leave_the_loop(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "results.sqlite3"))
+    threads = set()
+    get = cache.get
+
+    def spy(key):
+        threads.add(threading.get_ident())
+        return get(key)
+
+    cache.get = spy
+
+    async def main():
+        await cache.aset("k", {"v": 1})
+        assert await cache.alease("k", 60)
+        hit = await cache.aget("k")
+        await cache.arelease("k")
+        return hit, (await cache.astats())["entries"]
+
+    assert asyncio.run(main()) == (({"v": 1}, True), 1)
+    assert threads and threading.get_ident() not in threads
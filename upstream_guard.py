@@ -0,0 +1,122 @@
+"""
+Per-host admission control for upstream fetches.
+
+Each host gets a token bucket, which spaces out our requests to it, and a
+circuit breaker. After UPSTREAM_BREAKER_FAILURES consecutive timeouts,
+network errors or 5xx responses the breaker opens and requests fail at
+once for UPSTREAM_BREAKER_COOLDOWN seconds. A single trial request then
+decides whether it closes again. Rejections raise `Rejected` with a
+retry-after hint; mapping that to an HTTP response is the caller's job.
+"""
+import asyncio, os, time
+from cachetools import LRUCache
+
+UPSTREAM_HOST_RATE       = float(os.getenv("UPSTREAM_HOST_RATE", "5"))       # requests/s per host; 0 = off
+UPSTREAM_HOST_BURST      = float(os.getenv("UPSTREAM_HOST_BURST", "10"))
+UPSTREAM_HOST_MAX_WAIT   = float(os.getenv("UPSTREAM_HOST_MAX_WAIT", "5"))   # longer queue: reject
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))  # consecutive
+UPSTREAM_BREAKER_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason            # "rate_limited" | "circuit_open"
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Reservation-style bucket: callers take a token now and sleep off any debt."""
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def reserve(self, max_wait: float) -> float | None:
+        """Seconds to wait for a token, or None (nothing reserved) if over max_wait."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+class CircuitBreaker:
+    __slots__ = ("failures", "opened", "trial")
+
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened = 0.0       # monotonic time the circuit opened; 0 = closed
+        self.trial = 0.0        # start of the half-open trial request, if one is out
+
+    def check(self, cooldown: float) -> float:
+        """0 if a request may go out, else seconds until the next trial."""
+        if not self.opened:
+            return 0.0
+        now = time.monotonic()
+        left = self.opened + cooldown - now
+        if left > 0:
+            return left
+        # half-open: one trial at a time (a trial that never reported expires)
+        if self.trial and now - self.trial < cooldown:
+            return cooldown - (now - self.trial)
+        self.trial = now
+        return 0.0
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened = self.trial = 0.0
+
+    def failure(self, threshold: int) -> None:
+        self.failures += 1
+        if self.trial or self.failures >= threshold:
+            self.opened = time.monotonic()
+            self.trial = 0.0
+
+class HostGuard:
+    def __init__(self, rate: float = UPSTREAM_HOST_RATE, burst: float = UPSTREAM_HOST_BURST,
+                 max_wait: float = UPSTREAM_HOST_MAX_WAIT, failures: int = UPSTREAM_BREAKER_FAILURES,
+                 cooldown: float = UPSTREAM_BREAKER_COOLDOWN) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.threshold = failures
+        self.cooldown = cooldown
+        # host -> (bucket, breaker); idle hosts age out
+        self._hosts: LRUCache = LRUCache(maxsize=10_000)
+
+    def _host(self, host: str) -> tuple[TokenBucket, CircuitBreaker]:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = (TokenBucket(self.rate, self.burst), CircuitBreaker())
+        return state
+
+    async def admit(self, host: str) -> None:
+        """Wait for this host's rate limit; raise Rejected if the breaker is open or the queue too long."""
+        bucket, breaker = self._host(host)
+        retry = breaker.check(self.cooldown)
+        if retry:
+            raise Rejected("circuit_open", retry)
+        if self.rate <= 0:
+            return
+        wait = bucket.reserve(self.max_wait)
+        if wait is None:
+            raise Rejected("rate_limited", (1 - bucket.tokens) / self.rate)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def success(self, host: str) -> None:
+        self._host(host)[1].success()
+
+    def failure(self, host: str) -> None:
+        self._host(host)[1].failure(self.threshold)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        open_hosts = {host: round(max(0.0, b.opened + self.cooldown - now), 1)
+                      for host, (_, b) in self._hosts.items() if b.opened}
+        return {"hosts": len(self._hosts), "open_circuits": open_hosts,
+                "rate": self.rate, "burst": self.burst}
@@ -0,0 +1,176 @@
+"""
+httpx transport for upstream fetches, built on httpcore's public API.
+
+The connection pool is created here rather than inside
+httpx.AsyncHTTPTransport, so the network backend (server._PinnedBackend)
+is passed to its constructor instead of patched onto a private attribute.
+The transport also keeps its own counters for /api/upstream/stats: open
+connections per host (counted by the backend as sockets open and close)
+and requests per host, waiting for a connection or running on one. Nothing
+reads httpcore internals. Counters are only touched on the event loop.
+
+Imported with the first upstream client, not with server.py (cold start).
+"""
+from collections import Counter
+
+import httpcore
+import httpx
+
+def _mapped(exc: Exception) -> Exception:
+    """The httpx exception for an httpcore one (the two share class names)."""
+    for cls in type(exc).__mro__:
+        if cls.__module__.startswith("httpcore"):
+            mapped = getattr(httpx, cls.__name__, None)
+            if isinstance(mapped, type) and issubclass(mapped, httpx.HTTPError):
+                return mapped(str(exc))
+    return exc
+
+class _CountedStream:
+    """httpcore.AsyncNetworkStream that gives back its count exactly once on close."""
+
+    def __init__(self, inner, counts: Counter, host: str, token: list) -> None:
+        self._inner = inner
+        self._open = counts
+        self._host = host
+        self._token = token         # shared with the TLS stream wrapping this one
+
+    def _release(self) -> None:
+        if self._token:
+            self._token.clear()
+            self._open[self._host] -= 1
+            if self._open[self._host] <= 0:
+                del self._open[self._host]
+
+    async def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        return await self._inner.read(max_bytes, timeout)
+
+    async def write(self, buffer: bytes, timeout: float | None = None) -> None:
+        await self._inner.write(buffer, timeout)
+
+    async def aclose(self) -> None:
+        self._release()
+        await self._inner.aclose()
+
+    async def start_tls(self, ssl_context, server_hostname=None, timeout=None):
+        try:
+            inner = await self._inner.start_tls(ssl_context, server_hostname, timeout)
+        except BaseException:
+            self._release()         # the backend closed the socket
+            raise
+        return _CountedStream(inner, self._open, self._host, self._token)
+
+    def get_extra_info(self, info: str):
+        return self._inner.get_extra_info(info)
+
+class _CountingBackend:
+    """Wraps a network backend; counts the connections it has open per host."""
+
+    def __init__(self, inner) -> None:
+        self._inner = inner
+        self.open: Counter = Counter()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        stream = await self._inner.connect_tcp(host, port, timeout=timeout, local_address=local_address,
+                                               socket_options=socket_options)
+        self.open[host] += 1
+        return _CountedStream(stream, self.open, host, [True])
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, inner, done) -> None:
+        self._inner = inner
+        self._done = done
+
+    async def __aiter__(self):
+        try:
+            async for part in self._inner:
+                yield part
+        except Exception as e:
+            mapped = _mapped(e)
+            if mapped is e:
+                raise
+            raise mapped from e
+
+    async def aclose(self) -> None:
+        self._done()
+        await self._inner.aclose()
+
+class UpstreamTransport(httpx.AsyncBaseTransport):
+    """AsyncHTTPTransport equivalent (no proxies) over a pool we own."""
+
+    def __init__(self, backend, limits: httpx.Limits, http2: bool = False) -> None:
+        self._backend = _CountingBackend(backend)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=self._backend,
+        )
+        self.waiting: Counter = Counter()   # host -> requests not yet on a connection
+        self.running: Counter = Counter()   # host -> requests sent on a connection
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.raw_host.decode("ascii")
+        state = [self.waiting]          # the counter this request is in
+        self.waiting[host] += 1
+        outer = request.extensions.get("trace")
+
+        def leave() -> None:
+            if state:
+                counter = state.pop()
+                counter[host] -= 1
+                if counter[host] <= 0:
+                    del counter[host]
+
+        async def trace(event: str, info: dict) -> None:
+            # sending the request line means the pool handed us a connection
+            if state and state[0] is self.waiting and event.endswith("send_request_headers.started"):
+                leave()
+                state.append(self.running)
+                self.running[host] += 1
+            if outer is not None:
+                await outer(event, info)
+
+        req = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host,
+                             port=request.url.port, target=request.url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions={**request.extensions, "trace": trace},
+        )
+        try:
+            resp = await self._pool.handle_async_request(req)
+        except BaseException as e:
+            leave()
+            mapped = _mapped(e) if isinstance(e, Exception) else e
+            if mapped is e:
+                raise
+            raise mapped from e
+        return httpx.Response(status_code=resp.status, headers=resp.headers,
+                              stream=_ResponseStream(resp.stream, leave), extensions=resp.extensions)
+
+    async def aclose(self) -> None:
+        await self._pool.aclose()
+
+    def stats(self) -> dict:
+        """
+        Connections and requests per host. A connection counts as active
+        while a request runs on it; with HTTP/2 several requests share one.
+        """
+        hosts, totals = {}, {"idle": 0, "active": 0, "waiting": sum(self.waiting.values())}
+        for host in self._backend.open.keys() | self.running.keys() | self.waiting.keys():
+            conns = self._backend.open[host]
+            active = min(conns, self.running[host])
+            hosts[host] = {"idle": conns - active, "active": active, "waiting": self.waiting[host]}
+            totals["idle"] += conns - active
+            totals["active"] += active
+        return {**totals, "hosts": hosts}